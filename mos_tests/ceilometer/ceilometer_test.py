@@ -12,12 +12,25 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
+import logging
 import os
+import subprocess
+import sys
 
 import pytest
-
 from tempest_lib.cli import output_parser as parser
 
+from mos_tests.functions.api_bench import format_results
+from mos_tests.functions.api_bench import Query
+from mos_tests.functions.api_bench import RestClient
+from mos_tests.functions.api_bench import run_queries
+from mos_tests import settings
+
+logger = logging.getLogger(__name__)
+
+SCRIPT_NAME = 'mongo-generator.py'
+
 
 def scripts_dir_path():
     return os.path.join(
@@ -25,19 +38,76 @@ def scripts_dir_path():
         'scripts/')
 
 
+def datasets_dir_path():
+    return os.path.join(
+        os.path.dirname(os.path.abspath(__file__)),
+        '../../temp/ceilometer_datasets')
+
+
+def build_dataset(script_path, *args):
+    """Generate dataset on test host (or reuse already generated one)
+
+    :returns: path to dataset directory
+    """
+    output = subprocess.check_output(
+        [sys.executable, script_path, '--export_dir', datasets_dir_path()] +
+        list(args))
+    return output.strip().splitlines()[-1]
+
+
+def load_dataset(remote, dataset_path):
+    """Upload dataset and generator to controller and load dataset"""
+    dataset_name = os.path.basename(dataset_path)
+    remote.upload(scripts_dir_path() + SCRIPT_NAME,
+                  '/root/{0}'.format(SCRIPT_NAME))
+    remote.upload(dataset_path, '/root/{0}'.format(dataset_name))
+    cmd = 'python /root/{0} --load /root/{1}'.format(SCRIPT_NAME,
+                                                     dataset_name)
+    remote.check_call(cmd)
+
+
+def api_queries(since):
+    """Return mix of Ceilometer API v2 queries
+
+    :param since: start of time range for filtered queries
+    """
+
+    def filters(**kwargs):
+        params = {'q.field': [], 'q.op': [], 'q.value': []}
+        for key, (op, value) in sorted(kwargs.items()):
+            params['q.field'].append(key)
+            params['q.op'].append(op)
+            params['q.value'].append(value)
+        return params
+
+    since = since.isoformat()
+    return [
+        Query('meter-list', '/v2/meters', {'limit': 100}),
+        Query('sample-list', '/v2/samples', {'limit': 100}),
+        Query('sample-list-limit-1000', '/v2/samples', {'limit': 1000}),
+        Query('sample-list-by-meter-and-time', '/v2/samples',
+              dict(filters(meter=('eq', 'cpu_util'),
+                           timestamp=('ge', since)), limit=100)),
+        Query('resource-list', '/v2/resources', {'limit': 100}),
+        Query('statistics-by-time', '/v2/meters/cpu_util/statistics',
+              filters(timestamp=('ge', since))),
+        Query('event-list', '/v2/events', {'limit': 100}),
+    ]
+
+
 @pytest.mark.testrail_id('631854')
 def test_limits_feature(env):
     """Test case for Ceilometer mandatory limits feature. (QA-2039)
     Actions:
-    1. Generate data in MongoDB with a help of 'mongo-generator.py';
+    1. Generate data with a help of 'mongo-generator.py' on test host and
+        load it to MongoDB;
     2. Run 'ceilometer meter-list' and check that number of items == 100;
     3. Run 'ceilometer sample-list' and check that number of items == 100;
     4. Run 'ceilometer resource-list' and check that number of items == 100;
     5. Run 'ceilometer event-list --no-traits' and check that number
         of items == 100;
     """
-    script_name = 'mongo-generator.py'
-    script_path = scripts_dir_path() + script_name
+    script_path = scripts_dir_path() + SCRIPT_NAME
 
     set_env = 'source /root/openrc && '
     ceil_meter_list = set_env + 'ceilometer meter-list'
@@ -45,12 +115,13 @@ def test_limits_feature(env):
     ceil_res_list = set_env + 'ceilometer resource-list'
     ceil_event_list = set_env + 'ceilometer event-list --no-traits'
 
+    dataset_path = build_dataset(script_path, '--users', '1',
+                                 '--projects', '1',
+                                 '--resources_per_user_project', '200',
+                                 '--samples_per_user_project', '1000')
+
     with env.get_nodes_by_role('controller')[0].ssh() as remote:
-        remote.upload(script_path, '/root/{0}'.format(script_name))
-        cmd = ('python /root/{0} --users 1 --projects 1 '
-               '--resources_per_user_project 200 '
-               '--samples_per_user_project 1000').format(script_name)
-        remote.check_call(cmd)
+        load_dataset(remote, dataset_path)
         ceil_meter_list_out = remote.check_call(ceil_meter_list)['stdout']
         ceil_sample_list_out = remote.check_call(ceil_sample_list)['stdout']
         ceil_res_list_out = remote.check_call(ceil_res_list)['stdout']
@@ -67,3 +138,41 @@ def test_limits_feature(env):
                    len(ceil_sample_list_out),
                    len(ceil_res_list_out),
                    len(ceil_event_list_out)))
+
+
+def test_api_query_latency(env, os_conn):
+    """Benchmark of Ceilometer API queries at increasing data volumes
+
+    Actions:
+    1. Generate dataset of next volume from CEILOMETER_BENCH_SAMPLES and
+        load it to MongoDB;
+    2. Call Ceilometer API with mix of queries at several concurrency
+        levels and collect latencies;
+    3. Repeat for all volumes, report latency percentiles and throughput
+        per query, volume and concurrency;
+    4. Check that all queries were successful.
+    """
+    script_path = scripts_dir_path() + SCRIPT_NAME
+    client = RestClient.from_os_conn(os_conn, 'metering')
+    results = []
+    total_samples = 0
+    with env.get_nodes_by_role('controller')[0].ssh() as remote:
+        for samples in settings.CEILOMETER_BENCH_SAMPLES:
+            # Different seeds make different documents ids
+            dataset_path = build_dataset(
+                script_path, '--users', '1', '--projects', '1',
+                '--resources_per_user_project', '200',
+                '--samples_per_user_project', str(samples),
+                '--seed', str(samples))
+            load_dataset(remote, dataset_path)
+            total_samples += samples
+            since = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
+            results.extend(run_queries(
+                client, api_queries(since),
+                concurrency_levels=settings.CEILOMETER_BENCH_CONCURRENCY,
+                tags={'samples': total_samples}))
+
+    logger.info('Ceilometer API benchmark:\n{0}'.format(
+        format_results(results)))
+    failed = [x.format() for x in results if x.errors]
+    assert not failed, 'Some queries failed:\n{0}'.format('\n'.join(failed))
@@ -1,17 +1,17 @@
 # https://github.com/vitalygusev/ceilo-scripts/blob/master/mongo-generator.py
 
 import argparse
-import copy
 import datetime
+import gzip
+import hashlib
 import itertools
+import json
 import multiprocessing
+import os
 import random
+import time
 import uuid
 
-from oslo_config import cfg
-
-from ceilometer.storage import impl_mongodb
-
 
 metadata = {"state_description": "scheduling",
             "event_type": "compute.instance.create.start",
@@ -63,65 +63,114 @@ sample_dict = {"counter_name": "instance",
                "counter_type": "gauge"}
 
 
-def create_resources(resources_count=5000):
-    return [str(uuid.uuid4()) for _ in xrange(resources_count)]
+# Datasets are generated for fixed time and shifted to current time on load
+EXPORT_END_TIMESTAMP = datetime.datetime(2016, 1, 1)
+TIMESTAMP_FIELDS = ('timestamp', 'recorded_at', 'first_sample_timestamp',
+                    'last_sample_timestamp')
+MANIFEST = 'manifest.json'
+# Must be increased on any change of generated documents, so datasets
+# exported by previous version are not reused
+DATASET_VERSION = 1
+COLLECTIONS = ('meter', 'resource')
+# Ids of datasets are fixed, so their first characters are replaced with
+# random salt on each load to load dataset into the same db several times
+ID_FIELDS = {'meter': ('_id', 'message_id', 'resource_id'),
+             'resource': ('_id',)}
 
 
-def record_samples(samples_count=50000, resources_count=5000,
-                   conf=None):
-    print ('%s. %s. Start record samples' % (
-        datetime.datetime.utcnow(),
-        multiprocessing.current_process().name))
+def get_db():
+    from ceilometer.storage import impl_mongodb
+    from oslo_config import cfg
+
     cfg.CONF(["--config-file", "/etc/ceilometer/ceilometer.conf"],
              project='ceilometer')
+    return impl_mongodb.Connection(cfg.CONF.database.connection).db
+
+
+def make_uuid(rng):
+    """Return uuid4-like hex string from random generator"""
+    return '%032x' % rng.getrandbits(128)
+
+
+def make_ids(count, rng):
+    """Return `count` unique hex ids of uuid4 hex length
+
+    Ids share random prefix and differ by counter, which is much cheaper
+    than uuid4 call for each id.
+    """
+    prefix = make_uuid(rng)[:24]
+    return ['%s%08x' % (prefix, i) for i in xrange(count)]
+
+
+def insert_unordered(collection, docs):
+    """Write documents with single unordered bulk request"""
+    if hasattr(collection, 'insert_many'):
+        collection.insert_many(docs, ordered=False)
+    else:
+        # pymongo < 3.0
+        collection.insert(docs, continue_on_error=True)
+
 
-    cl = impl_mongodb.Connection(cfg.CONF.database.connection)
-    db = cl.db
+def generate(samples_count, resources_count, conf):
+    """Yield (collection name, batch of documents) tuples
+
+    Documents are the same for the same `conf['seed']` and
+    `conf['end_timestamp']`.
+    """
+    rng = random.Random(conf.get('seed'))
+    batch_size = conf.get('batch_size') or 5000
     one_second = datetime.timedelta(seconds=1) * (conf.get('interval') or 1)
-    timestamp = datetime.datetime.utcnow() - one_second * (samples_count + 1)
-    sample = copy.deepcopy(sample_dict)
-    resource_ids = create_resources(resources_count)
+    first_timestamp = (conf['end_timestamp'].replace(microsecond=0) -
+                       one_second * samples_count)
+
+    # Fields, which are the same for all samples of task
+    template = dict(sample_dict,
+                    counter_name=conf.get('name') or 'cpu_util',
+                    counter_unit=conf.get('unit') or '%',
+                    project_id=conf.get('project'),
+                    user_id=conf.get('user'))
+    resource_ids = [str(uuid.UUID(make_uuid(rng)))
+                    for _ in xrange(resources_count)]
+    # Nested metadata dicts are shared between samples; they are only read
+    resource_metadatas = [dict(metadata, host="host.%s" % i)
+                          for i in xrange(resources_count)]
+
+    timestamps = [first_timestamp + one_second * i
+                  for i in xrange(1, samples_count + 1)]
+    resource_indexes = [rng.randrange(resources_count)
+                        for _ in xrange(samples_count)]
+    volumes = [rng.randint(0, 1600) for _ in xrange(samples_count)]
+    ids = make_ids(samples_count, rng)
+    message_ids = make_ids(samples_count, rng)
+
     resources_timestamps = {}
-    resource_metadatas = {}
-    batch = []
-    for i in range(samples_count):
-        m = copy.deepcopy(metadata)
-        sample['_id'] = uuid.uuid4().hex
-        sample['message_id'] = uuid.uuid4().hex
-        sample['timestamp'] = timestamp
-        sample['counter_name'] = conf.get('name') or 'cpu_util'
-        sample['counter_volume'] = random.randint(0, 1600)
-        sample['counter_unit'] = conf.get('unit') or '%'
-        sample['recorded_at'] = timestamp
-        sample['project_id'] = conf.get('project')
-        sample['user_id'] = conf.get('user')
-        timestamp += one_second
-        timestamp = timestamp.replace(microsecond=0)
-
-        resource_index = random.randint(0, resources_count - 1)
-        resource_id = resource_ids[resource_index]
-        sample['resource_id'] = resource_id
-        m['host'] = "host.%s" % resource_index
-        sample['resource_metadata'] = m
-        if resource_id not in resource_metadatas:
-            resource_metadatas[resource_id] = m
-        batch.append(copy.deepcopy(sample))
-        if len(batch) >= 5000:
-            db.meter.insert(batch)
-            batch = []
-        if not resources_timestamps.get(resource_id):
-            resources_timestamps[resource_id] = [timestamp, timestamp]
-        resources_timestamps[resource_id][1] = timestamp
+    for batch_start in xrange(0, samples_count, batch_size):
+        batch = []
+        for i in xrange(batch_start,
+                        min(batch_start + batch_size, samples_count)):
+            index = resource_indexes[i]
+            timestamp = timestamps[i]
+            sample = dict(template)
+            sample['_id'] = ids[i]
+            sample['message_id'] = message_ids[i]
+            sample['timestamp'] = timestamp
+            sample['recorded_at'] = timestamp
+            sample['counter_volume'] = volumes[i]
+            sample['resource_id'] = resource_ids[index]
+            sample['resource_metadata'] = resource_metadatas[index]
+            batch.append(sample)
+            resources_timestamps.setdefault(index, timestamp)
+        yield 'meter', batch
 
     resource_batch = []
-    for resource, timestamps in resources_timestamps.items():
-        resource_dict = {"_id": resource,
-                         "first_sample_timestamp": timestamps[0],
+    for index, timestamp in sorted(resources_timestamps.items()):
+        resource_dict = {"_id": resource_ids[index],
+                         "first_sample_timestamp": timestamp,
                          "last_sample_timestamp":
-                             timestamps[0] +
+                             timestamp +
                              datetime.timedelta(
-                                 seconds=random.randint(0, 1000)),
-                         "metadata": resource_metadatas[resource],
+                                 seconds=rng.randint(0, 1000)),
+                         "metadata": resource_metadatas[index],
                          "user_id": conf.get('user'),
                          "project_id": conf.get('project'),
                          "source": "jira",
@@ -130,14 +179,158 @@ def record_samples(samples_count=50000, resources_count=5000,
                                     "counter_unit": conf.get('unit', '%'),
                                     "counter_type": 'gauge'}, ]}
         resource_batch.append(resource_dict)
-    if batch:
-        db.meter.insert(batch)
     if resource_batch:
-        db.resource.insert(resource_batch)
-    print ("%s. %s. Writed %s samples and %s resources" % (
-        datetime.datetime.utcnow(),
-        multiprocessing.current_process().name,
-        samples_count, resources_count))
+        yield 'resource', resource_batch
+
+
+def json_default(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    raise TypeError(repr(value))
+
+
+class DatasetWriter(object):
+    """Write documents to gzipped JSONL or BSON files of dataset"""
+
+    def __init__(self, path, task_index, fmt):
+        self.fmt = fmt
+        self.files = {}
+        for name in COLLECTIONS:
+            filename = '%s-%04d.%s.gz' % (name, task_index, fmt)
+            self.files[name] = gzip.open(os.path.join(path, filename), 'wb')
+
+    def write(self, name, docs):
+        f = self.files[name]
+        if self.fmt == 'bson':
+            import bson
+            for doc in docs:
+                f.write(bson.BSON.encode(doc))
+        else:
+            for doc in docs:
+                f.write(json.dumps(doc, default=json_default))
+                f.write('\n')
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+
+
+def record_samples(samples_count=50000, resources_count=5000,
+                   conf=None):
+    """Write generated documents to MongoDB or to dataset files
+
+    Documents are written to files of dataset if `conf['export_path']` is
+    set.
+    """
+    start = time.time()
+    process = multiprocessing.current_process().name
+    print('%s. %s. Start record samples' % (datetime.datetime.utcnow(),
+                                            process))
+    if conf.get('export_path'):
+        writer = DatasetWriter(conf['export_path'], conf['task_index'],
+                               conf['format'])
+        write = writer.write
+    else:
+        writer = None
+        db = get_db()
+
+        def write(name, docs):
+            insert_unordered(db[name], docs)
+
+    counts = dict.fromkeys(COLLECTIONS, 0)
+    try:
+        for name, docs in generate(samples_count, resources_count, conf):
+            write(name, docs)
+            counts[name] += len(docs)
+    finally:
+        if writer is not None:
+            writer.close()
+    elapsed = time.time() - start
+    print("%s. %s. Writed %s samples and %s resources in %.1fs "
+          "(%d docs/sec)" % (datetime.datetime.utcnow(), process,
+                             counts['meter'], counts['resource'], elapsed,
+                             counts['meter'] / max(elapsed, 0.001)))
+    return sum(counts.values())
+
+
+def record_task(args):
+    return record_samples(*args)
+
+
+def read_docs(path, batch_size):
+    """Yield batches of documents from dataset file"""
+    with gzip.open(path, 'rb') as f:
+        if path.endswith('.bson.gz'):
+            import bson
+            docs = bson.decode_file_iter(f)
+        else:
+            docs = (json.loads(line) for line in f)
+        batch = []
+        for doc in docs:
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def load_file(args):
+    """Insert documents of dataset file to MongoDB
+
+    Timestamps are shifted by `shift` timedelta, ids are prefixed with
+    `salt`.
+    """
+    path, shift, salt, batch_size = args
+    db = get_db()
+    name = os.path.basename(path).split('-')[0]
+    count = 0
+    for batch in read_docs(path, batch_size):
+        for doc in batch:
+            for field in ID_FIELDS[name]:
+                doc[field] = salt + doc[field][len(salt):]
+            for field in TIMESTAMP_FIELDS:
+                value = doc.get(field)
+                if value is None:
+                    continue
+                if not isinstance(value, datetime.datetime):
+                    value = datetime.datetime.strptime(value,
+                                                       '%Y-%m-%dT%H:%M:%S')
+                doc[field] = value + shift
+        insert_unordered(db[name], batch)
+        count += len(batch)
+    return count
+
+
+def dataset_id(params):
+    """Return id of dataset, which depends only on generator parameters"""
+    data = json.dumps(params, sort_keys=True)
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()[:16]
+
+
+def run_pool(func, tasks, workers):
+    workers = max(1, min(workers, len(tasks)))
+    if workers == 1:
+        return [func(x) for x in tasks], workers
+    pool = multiprocessing.Pool(workers)
+    try:
+        return pool.map(func, tasks), workers
+    finally:
+        pool.close()
+        pool.join()
+
+
+def load(path, workers, batch_size):
+    """Load dataset from `path` with parallel insert workers"""
+    with open(os.path.join(path, MANIFEST)) as f:
+        manifest = json.load(f)
+    shift = (datetime.datetime.utcnow().replace(microsecond=0) -
+             EXPORT_END_TIMESTAMP)
+    # The same salt for all files keeps references of samples to resources
+    salt = '%08x' % random.SystemRandom().getrandbits(32)
+    tasks = [(os.path.join(path, x), shift, salt, batch_size)
+             for x in manifest['files']]
+    return run_pool(load_file, tasks, workers)
 
 
 def main():
@@ -158,18 +351,96 @@ def main():
                         dest="resources")
     parser.add_argument("--meter",
                         type=str,
-                        default="cpu_util")
+                        default="cpu_util",
+                        help="comma separated list of meters")
+    parser.add_argument("--workers",
+                        type=int,
+                        default=multiprocessing.cpu_count(),
+                        help="count of generating or loading processes")
+    parser.add_argument("--batch_size",
+                        type=int,
+                        default=5000,
+                        help="count of samples in single bulk write")
+    parser.add_argument("--seed",
+                        type=int,
+                        default=None,
+                        help="random seed; exported datasets use 0 by "
+                             "default")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--export_dir",
+                      help="write dataset to directory instead of MongoDB")
+    mode.add_argument("--load",
+                      help="load dataset from directory to MongoDB")
+    parser.add_argument("--format",
+                        choices=("jsonl", "bson"),
+                        default="jsonl",
+                        help="format of exported dataset files")
     args = parser.parse_args()
-    users = [uuid.uuid4().hex for _ in xrange(args.users)]
-    projects = [uuid.uuid4().hex for _ in xrange(args.projects)]
-    meters = [args.meter]
+    start = time.time()
+
+    if args.load:
+        counts, workers = load(args.load, args.workers, args.batch_size)
+        elapsed = time.time() - start
+        print("%s. Loaded %s documents by %s processes in %.1fs "
+              "(%d docs/sec)" % (datetime.datetime.utcnow(), sum(counts),
+                                 workers, elapsed,
+                                 sum(counts) / max(elapsed, 0.001)))
+        return
+
+    export_path = None
+    seed = args.seed
+    end_timestamp = datetime.datetime.utcnow()
+    if args.export_dir:
+        if args.format == 'bson':
+            # Fail before generation if pymongo is not installed
+            import bson  # noqa
+        seed = seed or 0
+        end_timestamp = EXPORT_END_TIMESTAMP
+        params = {'users': args.users, 'projects': args.projects,
+                  'samples': args.samples, 'resources': args.resources,
+                  'meters': args.meter, 'seed': seed,
+                  'format': args.format, 'version': DATASET_VERSION}
+        export_path = os.path.join(args.export_dir, dataset_id(params))
+        if os.path.exists(os.path.join(export_path, MANIFEST)):
+            # Path is printed last to be used by callers
+            print(export_path)
+            return
+        if not os.path.exists(export_path):
+            os.makedirs(export_path)
+
+    rng = random.Random(seed)
+    users = [make_uuid(rng) for _ in xrange(args.users)]
+    projects = [make_uuid(rng) for _ in xrange(args.projects)]
+    meters = args.meter.split(',')
     interval = 30
-    for user, project, meter in itertools.product(users, projects, meters):
+    tasks = []
+    for i, (user, project, meter) in enumerate(
+            itertools.product(users, projects, meters)):
         conf = {"name": meter,
                 "user": user,
                 "project": project,
-                "interval": interval}
-        record_samples(args.samples, args.resources, conf)
+                "interval": interval,
+                "batch_size": args.batch_size,
+                "seed": None if seed is None else seed + i,
+                "end_timestamp": end_timestamp,
+                "export_path": export_path,
+                "task_index": i,
+                "format": args.format}
+        tasks.append((args.samples, args.resources, conf))
+
+    counts, workers = run_pool(record_task, tasks, args.workers)
+    elapsed = time.time() - start
+    print("%s. Writed %s documents by %s processes in %.1fs "
+          "(%d docs/sec)" % (datetime.datetime.utcnow(), sum(counts),
+                             workers, elapsed,
+                             sum(counts) / max(elapsed, 0.001)))
+    if export_path:
+        files = sorted('%s-%04d.%s.gz' % (name, i, args.format)
+                       for name in COLLECTIONS for i in range(len(tasks)))
+        with open(os.path.join(export_path, MANIFEST), 'w') as f:
+            json.dump({'params': params, 'files': files,
+                       'documents': sum(counts)}, f)
+        print(export_path)
 
 if __name__ == '__main__':
     main()
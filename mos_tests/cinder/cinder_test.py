@@ -13,11 +13,11 @@
 #    under the License.
 
 import logging
-import time
 
 import pytest
 
 from mos_tests.functions.base import OpenStackTestCase
+from mos_tests.functions.cinder_storm import CinderStorm
 from mos_tests.functions import common as common_functions
 from mos_tests import settings
 
@@ -70,45 +70,30 @@ class CinderIntegrationTests(OpenStackTestCase):
         # 2. Creation of 70 snapshots
         logger.info('Create 70 snapshots')
         count = 70
-        initial_snapshot_lst = []
-        for num in xrange(count):
-            logger.info('Creating {} snapshot'.format(num))
-            snapshot_id = self.cinder.volume_snapshots \
-                .create(volume.id, name='1st_creation_{0}'.format(num))
-            initial_snapshot_lst.append(snapshot_id)
-            self.assertTrue(
-                common_functions.check_volume_snapshot_status(self.cinder,
-                                                              snapshot_id,
-                                                              'available'))
-        self.snapshot_list.extend(initial_snapshot_lst)
+        storm = CinderStorm(self.cinder, concurrency=10)
+        initial_snapshots = storm.create_snapshots(volume.id, count,
+                                                   prefix='1st_creation')
+        self.snapshot_list.extend(storm.resources(initial_snapshots))
+        report = storm.wait(initial_snapshots, timeout_seconds=count * 10)
+        self.assertFalse(report.failed, "All snapshots must be available")
 
         # 3. Delete all snapshots
         logger.info('Delete all snapshots')
-        for snapshot in initial_snapshot_lst:
-            self.cinder.volume_snapshots.delete(snapshot)
+        deletions = storm.delete(initial_snapshots)
 
         # 4. Launch creation of 50 snapshot without waiting of deletion
         logger.info('Launch creation of 50 snapshot without waiting '
                     'of deletion')
         new_count = 50
-        new_snapshot_lst = []
-        for num in xrange(new_count):
-            logger.info('Creating {} snapshot'.format(num))
-            snapshot_id = self.cinder.volume_snapshots \
-                .create(volume.id, name='2nd_creation_{0}'.format(num))
-            new_snapshot_lst.append(snapshot_id)
-        self.snapshot_list.extend(new_snapshot_lst)
+        new_snapshots = storm.create_snapshots(volume.id, new_count,
+                                               prefix='2nd_creation')
+        self.snapshot_list.extend(storm.resources(new_snapshots))
 
-        timeout = time.time() + (new_count + count) * 10
-        while [s.status for s in self.cinder.volume_snapshots.list() if
-               s in new_snapshot_lst].count('available') != new_count:
-            if time.time() < timeout:
-                time.sleep(10)
-            else:
-                unavailable = [s.id for s in
-                               self.cinder.volume_snapshots.list() if
-                               s.status != 'available']
-                raise AssertionError(
-                    "All snapshots must be available. "
-                    "List of unavailable snapshots:\n\t{0}".format(
-                        "\n\t".join(unavailable)))
+        report = storm.wait(new_snapshots + deletions,
+                            timeout_seconds=(new_count + count) * 10)
+        unavailable = [x.resource_id or x.name for x in report.failed]
+        self.assertFalse(unavailable,
+                         "All snapshots must be available. "
+                         "List of unavailable snapshots:\n\t{0}".format(
+                             "\n\t".join(unavailable)))
+        logger.info('Storm summary:\n{0}'.format(storm.report().format()))
@@ -24,6 +24,7 @@ from six.moves import configparser
 
 from mos_tests.environment.devops_client import DevopsClient
 from mos_tests.environment.fuel_client import FuelClient
+from mos_tests.environment import provisioning
 from mos_tests.functions.common import gen_temp_file
 from mos_tests.functions.common import get_os_conn
 from mos_tests.functions.common import wait
@@ -106,6 +107,13 @@ def setup_session(request, env_name, snapshot_name):
     revert_snapshot(env_name, snapshot_name)
 
 
+@pytest.yield_fixture(scope="session", autouse=True)
+def provisioned_resources():
+    """Delete session-wide security groups and keypairs after session"""
+    yield provisioning.registry
+    provisioning.registry.cleanup()
+
+
 @pytest.yield_fixture(autouse=True)
 def cleanup(request, env_name, snapshot_name):
     yield
@@ -405,6 +413,13 @@ def pytest_collection_modifyitems(config, items):
 
 
 @pytest.yield_fixture
-def openstack_client(env):
+def cli_session(env):
+    """Long-lived CLI session on first controller"""
     with env.get_nodes_by_role('controller')[0].ssh() as remote:
-        yield os_cli.OpenStack(remote)
+        with os_cli.CLISession(remote) as session:
+            yield session
+
+
+@pytest.fixture
+def openstack_client(cli_session):
+    return os_cli.OpenStack(cli_session.remote, session=cli_session)
@@ -13,11 +13,28 @@
 #    under the License.
 """Virtual test env setup and so on."""
 import logging
+import time
 
 from devops.models import Environment
 
+from mos_tests.functions.common import parallel_map
+from mos_tests.functions.common import wait
+
 logger = logging.getLogger(__name__)
 
+SSH_OPTIONS = '-o ConnectTimeout=5 -o BatchMode=yes'
+
+# Commands are tried one by one until one of them succeeds
+SYNC_TIME_CMD = ('chronyc -a makestep || ntpdate -u {master_ip} || '
+                 'hwclock --hctosys')
+
+# Max allowed clock offset (in seconds) of slave from master
+MAX_TIME_OFFSET = 2
+
+# Max count of simultaneous channels of one ssh connection to master,
+# it must be less than sshd MaxSessions (10 by default)
+MAX_SSH_SESSIONS = 8
+
 
 class DevopsClient(object):
     """Method to work with the virtual env over fuel-devops."""
@@ -39,7 +56,7 @@ class DevopsClient(object):
         try:
             logger.info("Reverting snapshot {0}".format(snapshot_name))
             env.revert(snapshot_name, flag=False)
-            env.resume(verbose=False)
+            cls.resume(env)
             cls.sync_time(env)
         except Exception as e:
             logger.error('Can\'t revert snapshot due to error: {}'.
@@ -61,17 +78,118 @@ class DevopsClient(object):
             admin_ip = master.get_ip_address_by_network_name('admin')
         return admin_ip
 
+    @classmethod
+    def resume(cls, env):
+        """Resume all nodes of env at once."""
+        start = time.time()
+        nodes = env.get_nodes()
+        parallel_map(lambda node: node.resume(verbose=False), nodes,
+                     workers=len(nodes))
+        logger.info('{0} nodes are resumed in {1:.1f}s'.format(
+            len(nodes), time.time() - start))
+
+    @classmethod
+    def _log_report(cls, title, values):
+        logger.info('{0}:\n{1}'.format(title, '\n'.join(
+            '{0}: {1}'.format(name, value)
+            for name, value in sorted(values.items()))))
+
+    @classmethod
+    def wait_slaves_ssh(cls, remote, slaves, timeout_seconds=5 * 60):
+        """Wait until all slaves accept ssh from master.
+
+        Slaves are probed concurrently. Slaves, which are not ready after
+        timeout, are logged.
+
+        :param remote: SSHClient of master
+        :param slaves: list of slaves hostnames
+        :returns: dict with seconds until each ready slave was ready
+        """
+        start = time.time()
+
+        def probe(name):
+            try:
+                wait(lambda: remote.execute(
+                    'ssh {0} {1} true'.format(SSH_OPTIONS, name))[
+                        'exit_code'] == 0,
+                    timeout_seconds=timeout_seconds, sleep_seconds=5,
+                    waiting_for='ssh on {0}'.format(name))
+            except Exception as e:
+                logger.error('ssh on {0} is not ready: {1}'.format(name, e))
+                return None
+            return time.time() - start
+
+        timings = dict(zip(slaves, parallel_map(probe, slaves,
+                                                workers=MAX_SSH_SESSIONS)))
+        cls._log_report('Slaves ssh is ready after', {
+            k: '-' if v is None else '{0:.1f}s'.format(v)
+            for k, v in timings.items()})
+        return {k: v for k, v in timings.items() if v is not None}
+
+    @classmethod
+    def time_offset(cls, remote, name):
+        """Return clock offset (in seconds) of slave from master.
+
+        Offset is measured from the midpoint of master time before and
+        after request, so it has error of half of ssh round trip.
+        """
+        result = remote.execute(
+            'date +%s.%N; ssh {0} {1} date +%s.%N; date +%s.%N'.format(
+                SSH_OPTIONS, name))
+        before, slave, after = [float(x) for x in result['stdout']]
+        return slave - (before + after) / 2
+
     @classmethod
     def sync_time(cls, env):
+        """Sync time on master and then on all slaves at once.
+
+        Slaves take time from chrony, ntpdate (with master as server) or
+        hardware clock, whichever works first. Slaves with clock offset
+        from master greater than MAX_TIME_OFFSET are logged. Failures of
+        sync on slaves are logged too, but not raised.
+
+        :returns: dict with clock offsets of synced slaves
+        """
+        master = env.get_nodes(role__in=('fuel_master', 'admin'))[0]
+        master_ip = master.get_ip_address_by_network_name('admin')
         with env.get_admin_remote() as remote:
             slaves_count = len(env.nodes().all) - 1
+            slaves = ['node-{0}'.format(i)
+                      for i in range(1, slaves_count + 1)]
             logger.info("sync time on master")
             remote.execute('hwclock --hctosys')
-            logger.info("sync time on {} slaves".format(slaves_count))
-            remote.execute(
-                'for i in {{1..{0}}}; '
-                'do (ssh node-$i "hwclock --hctosys") done'.format(
-                    slaves_count))
+            ready = sorted(cls.wait_slaves_ssh(remote, slaves))
+            logger.info("sync time on {} slaves".format(len(ready)))
+            start = time.time()
+
+            def sync(name):
+                try:
+                    remote.execute('ssh {0} {1} "{2}"'.format(
+                        SSH_OPTIONS, name,
+                        SYNC_TIME_CMD.format(master_ip=master_ip)))
+                    return cls.time_offset(remote, name)
+                except Exception as e:
+                    logger.error('Can\'t sync time on {0}: {1}'.format(
+                        name, e))
+
+            offsets = dict(zip(ready, parallel_map(
+                sync, ready, workers=MAX_SSH_SESSIONS)))
+        logger.info('Time sync on {0} slaves took {1:.1f}s'.format(
+            len(ready), time.time() - start))
+        cls._log_report('Slaves clock offsets', {
+            k: '-' if v is None else '{0:+.3f}s'.format(v)
+            for k, v in offsets.items()})
+        offsets = {k: v for k, v in offsets.items() if v is not None}
+        skewed = [k for k, v in offsets.items()
+                  if abs(v) > MAX_TIME_OFFSET]
+        if skewed:
+            logger.warning('Clock offset of {0} is more than {1}s'.format(
+                ', '.join(sorted(skewed)), MAX_TIME_OFFSET))
+        failed = set(slaves) - set(offsets)
+        if failed:
+            logger.warning('Time is not synced on {0}'.format(
+                ', '.join(sorted(failed))))
+        return offsets
 
     @classmethod
     def get_node_by_mac(cls, env_name, mac, interface='admin'):
@@ -0,0 +1,228 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Pool of pre-allocated floating IPs.
+
+Floating IPs are allocated in advance, handed out to tests and taken back
+without deallocation (unless pool already has enough free IPs). When count
+of free IPs drops below half of pool size, pool is refilled in background
+thread.
+"""
+
+from collections import deque
+import logging
+import threading
+
+from mos_tests.functions.common import parallel_map
+
+
+logger = logging.getLogger(__name__)
+
+
+class FloatingIPPool(object):
+    """Warm set of floating IPs of one external network
+
+    With `use_neutron` floating IPs are neutron dicts, otherwise they are
+    nova FloatingIP objects (as `assign_floating_ip` returns).
+
+    :param os_conn: OpenStackActions
+    :param size: count of free IPs to keep
+    :param use_neutron: use neutron API instead of nova
+    :param network: external network id (for neutron) or nova floating IP
+        pool name; first one by default
+    """
+
+    def __init__(self, os_conn, size=10, use_neutron=True, network=None):
+        self.os_conn = os_conn
+        self.size = size
+        self.use_neutron = use_neutron
+        if network is None:
+            if use_neutron:
+                network = os_conn.ext_network['id']
+            else:
+                network = os_conn.nova.floating_ip_pools.list()[0].name
+        self.network = network
+        self._free = deque()
+        self._used = {}
+        self._lock = threading.Lock()
+        self._refill_thread = None
+
+    def __repr__(self):
+        return '<FloatingIPPool {0}: {1} free, {2} used>'.format(
+            self.network, len(self._free), len(self._used))
+
+    def _id(self, floating_ip):
+        if self.use_neutron:
+            return floating_ip['id']
+        return floating_ip.id
+
+    def address(self, floating_ip):
+        """Return ip address of floating IP"""
+        if self.use_neutron:
+            return floating_ip['floating_ip_address']
+        return floating_ip.ip
+
+    def _allocate(self, count):
+        if count <= 0:
+            return []
+        if self.use_neutron:
+            body = {'floating_network_id': self.network}
+            return self.os_conn._bulk_create('floatingip',
+                                             [dict(body)] * count)
+        return parallel_map(
+            lambda _: self.os_conn.nova.floating_ips.create(
+                pool=self.network), range(count))
+
+    def _refill(self):
+        try:
+            floating_ips = self._allocate(self.size - len(self._free))
+            with self._lock:
+                self._free.extend(floating_ips)
+            logger.debug('{0!r} is refilled'.format(self))
+        except Exception:
+            logger.exception('Error during floating IPs pool refill')
+
+    def refill(self, wait_for=False):
+        """Start background refill of pool if it's not running
+
+        :param wait_for: wait until pool is refilled
+        """
+        with self._lock:
+            thread = self._refill_thread
+            if thread is None or not thread.is_alive():
+                thread = threading.Thread(target=self._refill)
+                thread.daemon = True
+                self._refill_thread = thread
+                thread.start()
+        if wait_for:
+            thread.join()
+
+    def _existing_ids(self):
+        if self.use_neutron:
+            floating_ips = self.os_conn.neutron.list_floatingips(
+                floating_network_id=self.network)['floatingips']
+        else:
+            floating_ips = self.os_conn.nova.floating_ips.list()
+        return {self._id(x) for x in floating_ips}
+
+    def discard_missing(self):
+        """Forget floating IPs, which don't exist anymore
+
+        They disappear after revert of environment snapshot.
+        """
+        existing = self._existing_ids()
+        with self._lock:
+            missing = [x for x in self._free if self._id(x) not in existing]
+            for floating_ip in missing:
+                self._free.remove(floating_ip)
+            for id in set(self._used) - existing:
+                missing.append(self._used.pop(id))
+        if missing:
+            logger.info('{0} missing floating IPs are discarded from '
+                        '{1!r}'.format(len(missing), self))
+
+    def acquire(self, count=1):
+        """Return list of `count` floating IPs, not associated to ports
+
+        Missing floating IPs are discarded first, see `discard_missing`.
+        """
+        thread = self._refill_thread
+        if thread is not None and len(self._free) < count:
+            # Running refill allocates IPs, so wait for them instead of
+            # allocating the same IPs here
+            thread.join()
+        self.discard_missing()
+        with self._lock:
+            taken = [self._free.popleft()
+                     for _ in range(min(count, len(self._free)))]
+        taken.extend(self._allocate(count - len(taken)))
+        with self._lock:
+            self._used.update((self._id(x), x) for x in taken)
+            need_refill = len(self._free) < self.size // 2 + 1
+        if need_refill:
+            self.refill()
+        return taken
+
+    def release(self, floating_ip):
+        """Disassociate floating IP and return it to pool
+
+        Floating IP is deleted if pool already has `size` free IPs.
+        """
+        floating_ip = self.disassociate(floating_ip)
+        with self._lock:
+            self._used.pop(self._id(floating_ip), None)
+            is_extra = len(self._free) >= self.size
+            if not is_extra:
+                self._free.append(floating_ip)
+        if is_extra:
+            self.os_conn.delete_floating_ip(floating_ip,
+                                            use_neutron=self.use_neutron)
+
+    def release_all(self):
+        """Return all used floating IPs to pool"""
+        self.discard_missing()
+        with self._lock:
+            used = list(self._used.values())
+        parallel_map(self.release, used)
+
+    def associate(self, floating_ip, server):
+        """Associate floating IP to first port of server
+
+        Neutron floating IP is associated with single update request.
+
+        :returns: updated floating IP
+        """
+        if not self.use_neutron:
+            self.os_conn.nova.servers.add_floating_ip(
+                server, self.address(floating_ip))
+            return floating_ip
+        ports = self.os_conn.neutron.list_ports(device_id=server.id)['ports']
+        assert ports, "Not found ports for instance: {}".format(server.id)
+        floating_ip = self.os_conn.neutron.update_floatingip(
+            floating_ip['id'],
+            {'floatingip': {'port_id': ports[0]['id']}})['floatingip']
+        with self._lock:
+            self._used[floating_ip['id']] = floating_ip
+        return floating_ip
+
+    def disassociate(self, floating_ip):
+        """Disassociate floating IP from port
+
+        :returns: updated floating IP
+        """
+        if not self.use_neutron:
+            floating_ip = self.os_conn.nova.floating_ips.get(floating_ip.id)
+            if floating_ip.instance_id is not None:
+                self.os_conn.nova.servers.remove_floating_ip(
+                    floating_ip.instance_id, floating_ip.ip)
+            return floating_ip
+        floating_ip = self.os_conn.neutron.update_floatingip(
+            floating_ip['id'], {'floatingip': {'port_id': None}})
+        return floating_ip['floatingip']
+
+    def ids(self):
+        """Return set of ids of all floating IPs of pool"""
+        with self._lock:
+            return {self._id(x) for x in self._free} | set(self._used)
+
+    def drain(self):
+        """Delete all floating IPs of pool"""
+        if self._refill_thread is not None:
+            self._refill_thread.join()
+        with self._lock:
+            floating_ips = list(self._free) + list(self._used.values())
+            self._free.clear()
+            self._used.clear()
+        parallel_map(
+            lambda x: self.os_conn.delete_floating_ip(
+                x, use_neutron=self.use_neutron), floating_ips)
@@ -0,0 +1,123 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Keystone projects, users and roles management through API.
+
+Methods accept names or ids and return dicts with the same fields as
+`openstack ... -f json` commands of `os_cli.OpenStack`, so they can be used
+instead of CLI in fixtures.
+"""
+
+import logging
+
+from keystoneclient.exceptions import NotFound
+
+from mos_tests.functions.common import parallel_map
+
+
+logger = logging.getLogger(__name__)
+
+
+def _find(manager, name_or_id):
+    try:
+        return manager.get(name_or_id)
+    except NotFound:
+        return manager.find(name=name_or_id)
+
+
+def project_to_dict(project):
+    return {'id': project.id,
+            'name': project.name,
+            'description': getattr(project, 'description', None),
+            'enabled': project.enabled}
+
+
+def user_to_dict(user):
+    return {'id': user.id,
+            'name': user.name,
+            'username': getattr(user, 'username', user.name),
+            'email': getattr(user, 'email', None),
+            'enabled': user.enabled,
+            'project_id': getattr(user, 'tenantId', None)}
+
+
+def role_to_dict(role):
+    return {'id': role.id, 'name': role.name}
+
+
+class Identity(object):
+    """Identity operations with keystone v2 client
+
+    :param keystone: authenticated keystone client
+    :param workers: count of threads for batch operations
+    """
+
+    def __init__(self, keystone, workers=10):
+        self.keystone = keystone
+        self.workers = workers
+
+    def project_create(self, name, description=None):
+        project = self.keystone.tenants.create(name, description=description)
+        logger.debug('Project {0} is created'.format(name))
+        return project_to_dict(project)
+
+    def projects_create(self, names, description=None):
+        """Create projects concurrently and return list of them"""
+        return parallel_map(lambda x: self.project_create(x, description),
+                            names, workers=self.workers)
+
+    def project_delete(self, name_or_id):
+        self.keystone.tenants.delete(_find(self.keystone.tenants, name_or_id))
+
+    def projects_delete(self, names_or_ids):
+        parallel_map(self.project_delete, names_or_ids, workers=self.workers)
+
+    def user_create(self, name, password, project=None, email=None):
+        project_id = None
+        if project is not None:
+            project_id = _find(self.keystone.tenants, project).id
+        user = self.keystone.users.create(name, password, email=email,
+                                          tenant_id=project_id)
+        logger.debug('User {0} is created'.format(name))
+        return user_to_dict(user)
+
+    def users_create(self, names, password, project=None):
+        """Create users concurrently and return list of them"""
+        if project is not None:
+            project = _find(self.keystone.tenants, project).id
+        return parallel_map(lambda x: self.user_create(x, password, project),
+                            names, workers=self.workers)
+
+    def user_delete(self, name_or_id):
+        self.keystone.users.delete(_find(self.keystone.users, name_or_id))
+
+    def users_delete(self, names_or_ids):
+        parallel_map(self.user_delete, names_or_ids, workers=self.workers)
+
+    def role_create(self, name):
+        return role_to_dict(self.keystone.roles.create(name))
+
+    def role_delete(self, name_or_id):
+        self.keystone.roles.delete(_find(self.keystone.roles, name_or_id))
+
+    def assign_role_to_user(self, role, user, project):
+        """Grant role on project to user
+
+        :returns: dict of role
+        """
+        role = _find(self.keystone.roles, role)
+        self.keystone.roles.add_user_role(_find(self.keystone.users, user),
+                                          role,
+                                          _find(self.keystone.tenants,
+                                                project))
+        return role_to_dict(role)
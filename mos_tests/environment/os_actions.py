@@ -25,13 +25,19 @@ from neutronclient.common.exceptions import NeutronClientException
 import neutronclient.v2_0.client as neutronclient
 from novaclient import client as nova_client
 from novaclient.exceptions import ClientException as NovaClientException
+from novaclient.exceptions import Conflict as NovaConflict
+from novaclient.exceptions import NotFound as NovaNotFound
 import paramiko
 import six
 
+from mos_tests.environment.fip_pool import FloatingIPPool
+from mos_tests.environment.identity import Identity
+from mos_tests.environment import provisioning
+from mos_tests.environment.resolver import NameResolver
 from mos_tests.environment.ssh import SSHClient
 from mos_tests.functions.common import gen_temp_file
+from mos_tests.functions.common import parallel_map
 from mos_tests.functions.common import wait
-from mos_tests.functions import os_cli
 
 logger = logging.getLogger(__name__)
 
@@ -81,6 +87,7 @@ class OpenStackActions(object):
                                                  tenant_name=tenant,
                                                  auth_url=auth_url,
                                                  ca_cert=self.path_to_cert)
+        self.identity = Identity(self.keystone)
 
         token = self.keystone.auth_token
         glance_endpoint = self.keystone.service_catalog.url_for(
@@ -99,6 +106,12 @@ class OpenStackActions(object):
                                 cacert=self.path_to_cert,
                                 ca_file=self.path_to_cert)
         self.env = env
+        self.resolver = NameResolver({
+            'images': self.glance.images.list,
+            'flavors': self.nova.flavors.list,
+            'networks': lambda: self.neutron.list_networks()['networks'],
+            'security_groups': self.nova.security_groups.list,
+        })
 
     def _get_keystoneclient(self, username, password, tenant_name, auth_url,
                             retries=3, ca_cert=None):
@@ -123,9 +136,8 @@ class OpenStackActions(object):
         return keystone
 
     def _get_cirros_image(self):
-        for image in self.glance.images.list():
-            if image.name.startswith("TestVM"):
-                return image
+        return self.resolver.find('images',
+                                  lambda x: x.name.startswith("TestVM"))
 
     def is_nova_ready(self):
         """Checks that all nova computes are available"""
@@ -288,14 +300,56 @@ class OpenStackActions(object):
     def get_l3_for_router(self, router_id):
         return self.neutron.list_l3_agent_hosting_routers(router_id)
 
+    def _bulk_create(self, resource, items):
+        """Create neutron resources with single bulk request
+
+        If plugin doesn't support bulk operations, resources are created
+        with parallel single requests.
+
+        :param resource: neutron resource name, like 'network' or 'port'
+        :param items: list of resources bodies
+        :returns: list of created resources in `items` order
+        """
+        if not items:
+            return []
+        collection = resource + 's'
+        create = getattr(self.neutron, 'create_' + resource)
+        try:
+            return create({collection: items})[collection]
+        except NeutronClientException as e:
+            if e.status_code not in (400, 501) or len(items) == 1:
+                raise
+            logger.info('Bulk create of {0} is rejected ({1}), create them '
+                        'one by one'.format(collection, e))
+        return parallel_map(lambda x: create({resource: x})[resource], items)
+
     def create_network(self, name, tenant_id=None):
         network = {'name': name, 'admin_state_up': True}
         if tenant_id is not None:
             network['tenant_id'] = tenant_id
-        return self.neutron.create_network({'network': network})
+        network = self.neutron.create_network({'network': network})
+        self.resolver.invalidate('networks')
+        return network
+
+    def create_networks(self, names, tenant_id=None):
+        """Create networks with single request
+
+        :returns: list of networks in `names` order
+        """
+        networks = []
+        for name in names:
+            network = {'name': name, 'admin_state_up': True}
+            if tenant_id is not None:
+                network['tenant_id'] = tenant_id
+            networks.append(network)
+        networks = self._bulk_create('network', networks)
+        self.resolver.invalidate('networks')
+        return networks
 
     def delete_network(self, id):
-        return self.neutron.delete_network(id)
+        result = self.neutron.delete_network(id)
+        self.resolver.invalidate('networks')
+        return result
 
     def create_subnet(self, network_id, name, cidr, tenant_id=None,
                       dns_nameservers=None):
@@ -311,6 +365,29 @@ class OpenStackActions(object):
             subnet['dns_nameservers'] = dns_nameservers
         return self.neutron.create_subnet({'subnet': subnet})
 
+    def create_subnets(self, subnets, tenant_id=None):
+        """Create subnets with single request
+
+        :param subnets: list of dicts with `network_id`, `name`, `cidr` and
+            optional `dns_nameservers` keys
+        :returns: list of subnets in `subnets` order
+        """
+        bodies = []
+        for params in subnets:
+            subnet = dict(params, ip_version=4)
+            if tenant_id is not None:
+                subnet['tenant_id'] = tenant_id
+            bodies.append(subnet)
+        return self._bulk_create('subnet', bodies)
+
+    def create_ports(self, ports):
+        """Create ports with single request
+
+        :param ports: list of ports bodies (with `network_id` at least)
+        :returns: list of ports in `ports` order
+        """
+        return self._bulk_create('port', ports)
+
     def delete_subnet(self, id):
         return self.neutron.delete_subnet(id)
 
@@ -351,6 +428,21 @@ class OpenStackActions(object):
             self.nova.servers.add_floating_ip(srv, floating_ip)
             return floating_ip
 
+    def get_floating_ip_pool(self, use_neutron=False, size=10):
+        """Return session-wide FloatingIPPool of first external network
+
+        Floating IPs of pool are deleted at the end of tests session.
+        """
+        scope = self.provision_scope
+        name = 'neutron' if use_neutron else 'nova'
+        pool = provisioning.registry.get(scope, 'floating_ip_pools', name)
+        if pool is None:
+            pool = FloatingIPPool(self, size=size, use_neutron=use_neutron)
+            pool.refill()
+            provisioning.registry.add(scope, 'floating_ip_pools', name,
+                                      pool, lambda x: x.drain())
+        return pool
+
     def disassociate_floating_ip(self, srv, floating_ip, use_neutron=False):
         def is_floating_ip_down():
             fl_ip = self.neutron.show_floatingip(identifier)
@@ -406,35 +498,95 @@ class OpenStackActions(object):
         self.neutron.add_gateway_router(router_id, network)
 
     def create_sec_group_for_ssh(self):
-        name = "test-sg" + str(random.randint(1, 0x7fffffff))
-        secgroup = self.nova.security_groups.create(
-            name, "descr")
-
-        rulesets = [
-            {
-                # ssh
-                'ip_protocol': 'tcp',
-                'from_port': 22,
-                'to_port': 22,
-                'cidr': '0.0.0.0/0',
-            },
-            {
-                # ping
-                'ip_protocol': 'icmp',
-                'from_port': -1,
-                'to_port': -1,
-                'cidr': '0.0.0.0/0',
-            }
-        ]
+        """Return session-wide security group allowing ssh and ping"""
+        return self.get_or_create_sec_group(provisioning.SSH_PING_RULES)
 
-        for ruleset in rulesets:
-            self.nova.security_group_rules.create(
-                secgroup.id, **ruleset)
+    @property
+    def provision_scope(self):
+        """Scope of session-wide resources of this cloud and credentials"""
+        return (self.controller_ip, self.tenant, self.username)
+
+    def get_or_create_sec_group(self, rulesets, prefix='test-sg'):
+        """Return session-wide security group with `rulesets` rules
+
+        Group name contains digest of rules, so existing group is reused
+        and only missing rules are added to it. Group is deleted at the end
+        of tests session.
+
+        :param rulesets: list of nova style rules dicts
+        :param prefix: group name prefix
+        """
+        name = '{0}-{1}'.format(prefix, provisioning.rules_digest(rulesets))
+        try:
+            secgroup = self.resolver.get('security_groups', name)
+            existing = {provisioning.rule_key(x) for x in secgroup.rules}
+        except KeyError:
+            secgroup = self.nova.security_groups.create(name, "descr")
+            self.resolver.invalidate('security_groups')
+            existing = set()
+        missing = [x for x in rulesets
+                   if provisioning.rule_key(x) not in existing]
+        if missing:
+            self.create_security_group_rules(secgroup.id, missing)
+        provisioning.registry.add(self.provision_scope, 'security_groups',
+                                  name, secgroup,
+                                  self.nova.security_groups.delete)
         return secgroup
 
+    def create_security_group_rules(self, group_id, rulesets):
+        """Create ingress security group rules with single request
+
+        :param group_id: security group id
+        :param rulesets: list of nova style rules dicts with `ip_protocol`,
+            `from_port`, `to_port` and `cidr` keys (ports are -1 for icmp)
+        :returns: list of created neutron rules in `rulesets` order
+        """
+        rules = []
+        for ruleset in rulesets:
+            rule = {
+                'security_group_id': group_id,
+                'direction': 'ingress',
+                'ethertype': 'IPv4',
+                'protocol': ruleset['ip_protocol'],
+                'remote_ip_prefix': ruleset.get('cidr'),
+            }
+            if ruleset.get('from_port', -1) != -1:
+                rule['port_range_min'] = ruleset['from_port']
+            if ruleset.get('to_port', -1) != -1:
+                rule['port_range_max'] = ruleset['to_port']
+            rules.append(rule)
+        return self._bulk_create('security_group_rule', rules)
+
     def create_key(self, key_name):
         return self.nova.keypairs.create(key_name)
 
+    def get_or_create_key(self, key_name='instancekey'):
+        """Return session-wide keypair with private key
+
+        Keypair, created earlier in session, is reused while it exists in
+        nova with the same fingerprint. Keypair is deleted at the end of
+        tests session.
+        """
+        scope = self.provision_scope
+        keypair = provisioning.registry.get(scope, 'keypairs', key_name)
+        if keypair is not None:
+            try:
+                existing = self.nova.keypairs.get(key_name)
+                if existing.fingerprint == keypair.fingerprint:
+                    return keypair
+                # Private key of other keypair is unknown
+                self.nova.keypairs.delete(key_name)
+            except NovaNotFound:
+                pass
+        try:
+            keypair = self.create_key(key_name)
+        except NovaConflict:
+            self.nova.keypairs.delete(key_name)
+            keypair = self.create_key(key_name)
+        provisioning.registry.add(scope, 'keypairs', key_name, keypair,
+                                  self.nova.keypairs.delete)
+        return keypair
+
     def delete_key(self, key_name):
         return self.nova.keypairs.delete(key_name)
 
@@ -447,8 +599,8 @@ class OpenStackActions(object):
 
     @property
     def ext_network(self):
-        exist_networks = self.list_networks()['networks']
-        return [x for x in exist_networks if x.get('router:external')][0]
+        return self.resolver.find('networks',
+                                  lambda x: x.get('router:external'))
 
     def delete_subnets(self, networks):
         # Subnets and ports are simply filtered by network ids
@@ -473,7 +625,16 @@ class OpenStackActions(object):
                 logger.info('the router {} is not deletable'.format(router))
 
     def delete_floating_ips(self):
+        kept = set()
+        for name in provisioning.registry.names(self.provision_scope,
+                                                'floating_ip_pools'):
+            pool = provisioning.registry.get(self.provision_scope,
+                                             'floating_ip_pools', name)
+            pool.release_all()
+            kept |= pool.ids()
         for floating_ip in self.nova.floating_ips.list():
+            if floating_ip.id in kept:
+                continue
             try:
                 self.nova.floating_ips.delete(floating_ip)
             except NovaClientException:
@@ -487,15 +648,21 @@ class OpenStackActions(object):
                 logger.info('nova server {} is not deletable'.format(server))
 
     def delete_keypairs(self):
+        kept = provisioning.registry.names(self.provision_scope, 'keypairs')
         for key_pair in self.nova.keypairs.list():
+            if key_pair.name in kept:
+                continue
             try:
                 self.nova.keypairs.delete(key_pair)
             except NovaClientException:
                 logger.info('key pair {} is not deletable'.format(key_pair.id))
 
     def delete_security_groups(self):
+        self.resolver.invalidate('security_groups')
+        kept = provisioning.registry.names(self.provision_scope,
+                                           'security_groups')
         for sg in self.nova.security_groups.list():
-            if sg.description == 'Default security group':
+            if sg.description == 'Default security group' or sg.name in kept:
                 continue
             try:
                 self.nova.security_groups.delete(sg)
@@ -555,6 +722,7 @@ class OpenStackActions(object):
         self.delete_routers()
 
         # Delete nets
+        self.resolver.invalidate('networks')
         for net in networks:
             try:
                 self.neutron.delete_network(net)
@@ -651,19 +819,31 @@ class OpenStackActions(object):
              waiting_for='agents go down')
 
     def add_net(self, router_id):
+        return self.add_nets(router_id)[0]
+
+    def add_nets(self, router_id, count=1):
+        """Create networks with subnets and attach them to router
+
+        Networks and subnets are created with bulk requests.
+
+        :returns: list of networks ids
+        """
         i = len(self.neutron.list_networks()['networks']) + 1
-        network = self.create_network(name='net%02d' % i)['network']
-        logger.info('network {name}({id}) is created'.format(**network))
-        subnet = self.create_subnet(
-            network_id=network['id'],
-            name='net%02d__subnet' % i,
-            cidr="192.168.%d.0/24" % i)
-        logger.info('subnet {name}({id}) is created'.format(
-            **subnet['subnet']))
-        self.router_interface_add(
-            router_id=router_id,
-            subnet_id=subnet['subnet']['id'])
-        return network['id']
+        indexes = range(i, i + count)
+        networks = self.create_networks(['net%02d' % x for x in indexes])
+        for network in networks:
+            logger.info('network {name}({id}) is created'.format(**network))
+        subnets = self.create_subnets([
+            {'network_id': network['id'],
+             'name': 'net%02d__subnet' % x,
+             'cidr': '192.168.%d.0/24' % x}
+            for x, network in zip(indexes, networks)])
+        for subnet in subnets:
+            logger.info('subnet {name}({id}) is created'.format(**subnet))
+            self.router_interface_add(
+                router_id=router_id,
+                subnet_id=subnet['id'])
+        return [x['id'] for x in networks]
 
     def add_server(self, network_id, key_name, hostname, sg_id):
         i = len(self.nova.servers.list()) + 1
@@ -726,28 +906,14 @@ class OpenStackActions(object):
              timeout_seconds=5 * 60,
              waiting_for="network reschedule to new dhcp agent")
 
-    def _get_controller(self):
-        # TODO(gdyuldin) remove this methods after moving to functions.os_cli
-        return self.env.get_nodes_by_role('controller')[0]
-
     def tenant_create(self, name):
-        # TODO(gdyuldin) remove this methods after moving to functions.os_cli
-        with self._get_controller().ssh() as remote:
-            return os_cli.OpenStack(remote).tenant_create(name=name)
+        return self.identity.project_create(name)
 
     def tenant_delete(self, name):
-        # TODO(gdyuldin) remove this methods after moving to functions.os_cli
-        with self._get_controller().ssh() as remote:
-            return os_cli.OpenStack(remote).tenant_delete(name=name)
+        return self.identity.project_delete(name)
 
     def user_create(self, name, password, tenant=None):
-        # TODO(gdyuldin) remove this methods after moving to functions.os_cli
-        with self._get_controller().ssh() as remote:
-            return os_cli.OpenStack(remote).user_create(name=name,
-                                                       password=password,
-                                                       tenant=tenant)
+        return self.identity.user_create(name, password, project=tenant)
 
     def user_delete(self, name):
-        # TODO(gdyuldin) remove this methods after moving to functions.os_cli
-        with self._get_controller().ssh() as remote:
-            return os_cli.OpenStack(remote).user_delete(name=name)
+        return self.identity.user_delete(name)
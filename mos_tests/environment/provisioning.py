@@ -0,0 +1,116 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Session-wide registry of reusable security groups and keypairs.
+
+Security groups are named by digest of their rules, so group with the same
+rules is shared by all tests of session. Keypairs are kept together with
+private key, which can't be got from nova later.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+SSH_PING_RULES = [
+    {
+        # ssh
+        'ip_protocol': 'tcp',
+        'from_port': 22,
+        'to_port': 22,
+        'cidr': '0.0.0.0/0',
+    },
+    {
+        # ping
+        'ip_protocol': 'icmp',
+        'from_port': -1,
+        'to_port': -1,
+        'cidr': '0.0.0.0/0',
+    }
+]
+
+
+def rule_key(rule):
+    """Return comparable tuple for nova style rule
+
+    Works both for rules passed to `security_group_rules.create` and for
+    rules from `security_groups.list` (with `ip_range` dict).
+    """
+    cidr = rule.get('cidr') or (rule.get('ip_range') or {}).get('cidr')
+    from_port = rule.get('from_port')
+    to_port = rule.get('to_port')
+    return (rule.get('ip_protocol'),
+            -1 if from_port is None else int(from_port),
+            -1 if to_port is None else int(to_port),
+            cidr)
+
+
+def rules_digest(rulesets):
+    """Return short digest of rules, which doesn't depend on rules order"""
+    keys = sorted(rule_key(x) for x in rulesets)
+    return hashlib.sha1(json.dumps(keys).encode('utf-8')).hexdigest()[:10]
+
+
+class Registry(object):
+    """Resources, which are kept until the end of tests session
+
+    Resources are stored by scope (cloud and credentials), kind and name.
+    """
+
+    def __init__(self):
+        self._resources = {}
+        self._lock = threading.Lock()
+
+    def get(self, scope, kind, name):
+        """Return stored resource or None"""
+        with self._lock:
+            item = self._resources.get((scope, kind, name))
+        return item and item[0]
+
+    def add(self, scope, kind, name, resource, delete):
+        """Store resource
+
+        :param delete: function to delete resource at session end
+        """
+        with self._lock:
+            self._resources[(scope, kind, name)] = (resource, delete)
+        logger.info('{0} {1!r} is kept for session'.format(kind, name))
+
+    def remove(self, scope, kind, name):
+        with self._lock:
+            self._resources.pop((scope, kind, name), None)
+
+    def names(self, scope, kind):
+        """Return set of stored resources names"""
+        with self._lock:
+            return {x[2] for x in self._resources
+                    if x[:2] == (scope, kind)}
+
+    def cleanup(self):
+        """Delete all stored resources"""
+        with self._lock:
+            items = list(self._resources.items())
+            self._resources.clear()
+        for (_, kind, name), (resource, delete) in items:
+            try:
+                delete(resource)
+            except Exception as e:
+                logger.info('{0} {1!r} is not deletable: {2}'.format(
+                    kind, name, e))
+
+
+registry = Registry()
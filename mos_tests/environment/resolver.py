@@ -0,0 +1,96 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import logging
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+def _attr(obj, name):
+    """Get attribute of client object or key of neutron dict"""
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+class NameResolver(object):
+    """Cached name -> object lookups for OpenStack resources
+
+    Each kind of resources is listed once on first lookup and cached for
+    `ttl` seconds. Lookup of missing name relists resources once, so just
+    created resources are found too.
+
+    :param listers: dict with resources kinds as keys and functions, which
+        return list of resources, as values
+    :param ttl: cache lifetime in seconds
+    """
+
+    def __init__(self, listers, ttl=60):
+        self.listers = listers
+        self.ttl = ttl
+        self._caches = {}
+        self._lock = threading.Lock()
+
+    def _load(self, kind):
+        items = list(self.listers[kind]())
+        by_name = {}
+        for item in items:
+            # First listed resource wins for duplicated names
+            by_name.setdefault(_attr(item, 'name'), item)
+        self._caches[kind] = (time.time(), items, by_name)
+        logger.debug('{0} {1} are cached'.format(len(items), kind))
+        return items, by_name
+
+    def _get_cache(self, kind, refresh=False):
+        with self._lock:
+            cache = self._caches.get(kind)
+            if (refresh or cache is None or
+                    time.time() - cache[0] > self.ttl):
+                return self._load(kind)
+            return cache[1:]
+
+    def invalidate(self, kind=None):
+        """Drop cache of `kind` resources (all caches by default)"""
+        with self._lock:
+            if kind is None:
+                self._caches.clear()
+            else:
+                self._caches.pop(kind, None)
+
+    def get(self, kind, name):
+        """Return resource by name
+
+        :raises KeyError: if resource is not found
+        """
+        _, by_name = self._get_cache(kind)
+        if name not in by_name:
+            _, by_name = self._get_cache(kind, refresh=True)
+        if name not in by_name:
+            raise KeyError('{0} {1!r} is not found'.format(kind, name))
+        return by_name[name]
+
+    def id(self, kind, name):
+        """Return resource id by name"""
+        return _attr(self.get(kind, name), 'id')
+
+    def find(self, kind, predicate):
+        """Return first resource matched to `predicate` or None"""
+        for refresh in (False, True):
+            items, _ = self._get_cache(kind, refresh=refresh)
+            for item in items:
+                if predicate(item):
+                    return item
@@ -178,7 +178,7 @@ class TestFailoverRestarts(TestBase):
         zone = self.os_conn.nova.availability_zones.find(zoneName="nova")
         hosts = zone.hosts.keys()
         security_group = self.os_conn.create_sec_group_for_ssh()
-        self.instance_keypair = self.os_conn.create_key(key_name='instancekey')
+        self.instance_keypair = self.os_conn.get_or_create_key('instancekey')
 
         # create router
         router = self.os_conn.create_router(name="router01")['router']
@@ -0,0 +1,157 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Latency and throughput measurement of API calls.
+
+API is called directly through REST client with keep-alive connections,
+so results don't include CLI process spawn or authentication.
+"""
+
+from collections import namedtuple
+import logging
+import threading
+import time
+
+import requests
+
+from mos_tests.functions.common import parallel_map
+from mos_tests.functions.common import percentile
+
+
+logger = logging.getLogger(__name__)
+
+Query = namedtuple('Query', ['name', 'path', 'params'])
+
+
+class RestClient(object):
+    """Minimal REST client of OpenStack service
+
+    :param endpoint: service endpoint url
+    :param token: keystone token
+    :param verify: path to CA certificate or False
+    """
+
+    def __init__(self, endpoint, token, verify=False):
+        self.endpoint = endpoint.rstrip('/')
+        self.headers = {'X-Auth-Token': token,
+                        'Accept': 'application/json'}
+        self.verify = verify
+        # Sessions are not thread-safe, so each thread has own one
+        self._local = threading.local()
+
+    @classmethod
+    def from_os_conn(cls, os_conn, service_type):
+        """Make client of service from OpenStackActions catalog"""
+        endpoint = os_conn.keystone.service_catalog.url_for(
+            service_type=service_type, endpoint_type='publicURL')
+        return cls(endpoint, os_conn.keystone.auth_token,
+                   verify=os_conn.path_to_cert or False)
+
+    @property
+    def session(self):
+        if not hasattr(self._local, 'session'):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def get(self, path, params=None):
+        response = self.session.get(self.endpoint + path, params=params,
+                                    headers=self.headers,
+                                    verify=self.verify)
+        response.raise_for_status()
+        return response.json()
+
+
+class BenchResult(object):
+    """Latencies of calls of one query at one concurrency level"""
+
+    def __init__(self, name, concurrency, latencies, errors, elapsed,
+                 tags=None):
+        self.name = name
+        self.concurrency = concurrency
+        self.latencies = latencies
+        self.errors = errors
+        self.elapsed = elapsed
+        self.tags = tags or {}
+
+    @property
+    def throughput(self):
+        """Successful calls per second"""
+        return len(self.latencies) / self.elapsed if self.elapsed else 0
+
+    def percentile(self, percent):
+        return percentile(self.latencies, percent)
+
+    def format(self):
+        def fmt(value):
+            return '-' if value is None else '{0:.3f}s'.format(value)
+
+        tags = ''.join(' {0}={1}'.format(*x) for x in sorted(
+            self.tags.items()))
+        return ('{0}{1} x{2}: {3} ok, {4} errors, {5:.1f} rps, p50 {6}, '
+                'p90 {7}, p99 {8}'.format(
+                    self.name, tags, self.concurrency, len(self.latencies),
+                    len(self.errors), self.throughput,
+                    fmt(self.percentile(50)), fmt(self.percentile(90)),
+                    fmt(self.percentile(99))))
+
+
+def measure(func, calls, concurrency=1, name=None, tags=None):
+    """Call `func` `calls` times with `concurrency` threads
+
+    :param func: function without arguments
+    :param tags: dict with benchmark parameters (like data volume) to be
+        shown in report
+    :returns: BenchResult
+    """
+    latencies = []
+    errors = []
+
+    def call(_):
+        start = time.time()
+        try:
+            func()
+        except Exception as e:
+            errors.append(e)
+            return
+        latencies.append(time.time() - start)
+
+    start = time.time()
+    parallel_map(call, range(calls), workers=concurrency)
+    result = BenchResult(name or getattr(func, '__name__', 'call'),
+                         concurrency, latencies, errors,
+                         time.time() - start, tags=tags)
+    logger.info(result.format())
+    return result
+
+
+def run_queries(client, queries, concurrency_levels=(1,), calls=20,
+                tags=None):
+    """Measure each query at each concurrency level
+
+    :param client: RestClient
+    :param queries: list of Query
+    :returns: list of BenchResult
+    """
+    results = []
+    for query in queries:
+        for concurrency in concurrency_levels:
+            results.append(measure(
+                lambda: client.get(query.path, query.params),
+                calls=max(calls, concurrency), concurrency=concurrency,
+                name=query.name, tags=tags))
+    return results
+
+
+def format_results(results):
+    """Return report of several BenchResult"""
+    return '\n'.join(x.format() for x in results)
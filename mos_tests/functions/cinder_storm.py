@@ -0,0 +1,225 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Generator of concurrent cinder volumes and snapshots operations.
+
+Create and delete requests are issued concurrently; completion of all
+operations is tracked with single list request per resource kind per poll.
+Latencies of create -> available and delete -> gone are collected to
+report distributions and error rates.
+"""
+
+from collections import defaultdict
+import logging
+import time
+
+from mos_tests.functions.common import parallel_map
+from mos_tests.functions.common import percentile
+from mos_tests.functions.common import wait
+
+
+logger = logging.getLogger(__name__)
+
+VOLUME = 'volume'
+SNAPSHOT = 'snapshot'
+CREATE = 'create'
+DELETE = 'delete'
+
+ERROR_STATUSES = ('error', 'error_deleting')
+
+
+class Operation(object):
+    """Single create or delete of cinder resource"""
+
+    def __init__(self, kind, action, name=None, resource=None):
+        self.kind = kind
+        self.action = action
+        self.name = name
+        self.resource = resource
+        self.requested_at = None
+        self.done_at = None
+        self.error = None
+
+    @property
+    def resource_id(self):
+        return getattr(self.resource, 'id', None)
+
+    @property
+    def finished(self):
+        return self.done_at is not None or self.error is not None
+
+    @property
+    def latency(self):
+        if self.done_at is None:
+            return None
+        return self.done_at - self.requested_at
+
+
+class StormReport(object):
+    """Latency distributions and error rates of operations"""
+
+    def __init__(self, operations):
+        self.operations = operations
+
+    @property
+    def failed(self):
+        return [x for x in self.operations if x.error is not None]
+
+    def stats(self, percents=(50, 90, 99, 100)):
+        """Return dict with (kind, action) as keys and dicts with count,
+        error rate and latency percentiles as values
+        """
+        groups = defaultdict(list)
+        for operation in self.operations:
+            groups[(operation.kind, operation.action)].append(operation)
+        stats = {}
+        for key, operations in groups.items():
+            latencies = [x.latency for x in operations
+                         if x.latency is not None]
+            errors = len([x for x in operations if x.error is not None])
+            stats[key] = {
+                'count': len(operations),
+                'error_rate': float(errors) / len(operations),
+                'latency': {p: percentile(latencies, p) for p in percents},
+            }
+        return stats
+
+    def format(self):
+        """Return human readable report"""
+        lines = []
+        for (kind, action), x in sorted(self.stats().items()):
+            latency = ', '.join(
+                'p{0}={1}'.format(p, '-' if v is None else '{0:.1f}s'.format(
+                    v)) for p, v in sorted(x['latency'].items()))
+            lines.append('{0} {1}: {2} operations, {3:.1%} errors, '
+                         '{4}'.format(kind, action, x['count'],
+                                      x['error_rate'], latency))
+        return '\n'.join(lines)
+
+
+class CinderStorm(object):
+    """Concurrent cinder operations with batched completion tracking
+
+    :param cinder: cinder client
+    :param concurrency: max count of simultaneous API requests
+    :param poll_interval: seconds between completion polls
+    """
+
+    def __init__(self, cinder, concurrency=10, poll_interval=2):
+        self.cinder = cinder
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.operations = []
+
+    def _manager(self, kind):
+        if kind == VOLUME:
+            return self.cinder.volumes
+        return self.cinder.volume_snapshots
+
+    def _issue(self, operation, request):
+        operation.requested_at = time.time()
+        try:
+            result = request()
+            if operation.action == CREATE:
+                operation.resource = result
+        except Exception as e:
+            logger.warning('{0} {1} {2} failed: {3}'.format(
+                operation.action, operation.kind,
+                operation.name or operation.resource_id, e))
+            operation.error = e
+        return operation
+
+    def _run(self, operations, requests):
+        self.operations.extend(operations)
+        start = time.time()
+        parallel_map(lambda x: self._issue(*x), zip(operations, requests),
+                     workers=self.concurrency)
+        logger.info('{0} requests are issued in {1:.1f}s'.format(
+            len(operations), time.time() - start))
+        return operations
+
+    def create_volumes(self, count, size=1, prefix='storm_volume',
+                       **kwargs):
+        """Issue creation of `count` volumes and return operations"""
+        operations = [Operation(VOLUME, CREATE, '{0}_{1}'.format(prefix, i))
+                      for i in range(count)]
+        return self._run(operations, [
+            lambda x=x: self.cinder.volumes.create(size, name=x.name,
+                                                   **kwargs)
+            for x in operations])
+
+    def create_snapshots(self, volume_id, count, prefix='storm_snapshot'):
+        """Issue creation of `count` snapshots of volume"""
+        operations = [Operation(SNAPSHOT, CREATE,
+                                '{0}_{1}'.format(prefix, i))
+                      for i in range(count)]
+        return self._run(operations, [
+            lambda x=x: self.cinder.volume_snapshots.create(volume_id,
+                                                            name=x.name)
+            for x in operations])
+
+    def delete(self, operations):
+        """Issue deletion of resources, created by `operations`"""
+        created = [x for x in operations
+                   if x.action == CREATE and x.resource is not None]
+        deletes = [Operation(x.kind, DELETE, x.name, x.resource)
+                   for x in created]
+        return self._run(deletes, [
+            lambda x=x: self._manager(x.kind).delete(x.resource)
+            for x in deletes])
+
+    def _poll(self, operations):
+        now = time.time()
+        for kind in {x.kind for x in operations}:
+            statuses = {x.id: x.status for x in
+                        self._manager(kind).list()}
+            for operation in operations:
+                if operation.kind != kind:
+                    continue
+                status = statuses.get(operation.resource_id)
+                if status in ERROR_STATUSES:
+                    operation.error = '{0} {1} is in {2} status'.format(
+                        kind, operation.resource_id, status)
+                elif operation.action == CREATE and status == 'available':
+                    operation.done_at = now
+                elif operation.action == DELETE and status is None:
+                    operation.done_at = now
+
+    def wait(self, operations, timeout_seconds=5 * 60):
+        """Wait until all operations are finished
+
+        :returns: StormReport of `operations`
+        """
+        pending = [x for x in operations if not x.finished]
+
+        def all_finished():
+            self._poll(pending)
+            pending[:] = [x for x in pending if not x.finished]
+            return not pending
+
+        wait(all_finished, timeout_seconds=timeout_seconds,
+             sleep_seconds=self.poll_interval,
+             waiting_for='{0} cinder operations to finish'.format(
+                 len(pending)))
+        report = StormReport(operations)
+        logger.info(report.format())
+        return report
+
+    def report(self):
+        """Return StormReport of all issued operations"""
+        return StormReport(self.operations)
+
+    @staticmethod
+    def resources(operations):
+        """Return created resources of operations"""
+        return [x.resource for x in operations if x.resource is not None]
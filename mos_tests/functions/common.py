@@ -12,7 +12,9 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import copy
 import logging
+from multiprocessing.pool import ThreadPool
 import os
 from tempfile import NamedTemporaryFile
 from time import sleep
@@ -23,9 +25,17 @@ from waiting import TimeoutExpired
 from waiting import wait as base_wait
 import yaml
 
+from mos_tests.functions.image_cache import DEFAULT_ROOT as DEFAULT_IMAGES_ROOT
+from mos_tests.functions.image_cache import ImageCache
+from mos_tests.functions.stack_watcher import StackWatcher
+
 
 logger = logging.getLogger(__name__)
 
+# Templates contents by paths and parsed templates by contents
+_templates = {}
+_parsed_templates = {}
+
 
 def is_stack_exists(stack_name, heat):
     """Check the presence of stack_name in stacks list
@@ -33,7 +43,8 @@ def is_stack_exists(stack_name, heat):
         :param heat: Heat API client connection point
         :return True or False
     """
-    return stack_name in [s.stack_name for s in heat.stacks.list()]
+    return any(s.stack_name == stack_name for s in heat.stacks.list(
+        filters={'name': stack_name}))
 
 
 def get_stack_id(heat_client, stack_name):
@@ -42,8 +53,9 @@ def get_stack_id(heat_client, stack_name):
         :param stack_name: Name of stack
         :return Stack uid
     """
-    if is_stack_exists(stack_name, heat_client):
-        return heat_client.stacks.list(filter={'name': stack_name}).id
+    for stack in heat_client.stacks.list(filters={'name': stack_name}):
+        if stack.stack_name == stack_name:
+            return stack.id
     raise Exception("ERROR: Stack {} is not defined".format(stack_name))
 
 
@@ -56,17 +68,10 @@ def check_stack_status(stack_name, heat, status, timeout=60):
         :return True if stack status is equals to expected status
         False otherwise
     """
-    if is_stack_exists(stack_name, heat):
-        start_time = time()
-        stack_status = [s.stack_status for s in heat.stacks.list()
-                        if s.stack_name == stack_name][0]
-        while 'IN_PROGRESS' not in stack_status \
-                and time() < start_time + 60 * timeout:
-            sleep(1)
-            stack_status = [s.stack_status for s in heat.stacks.list()
-                            if s.stack_name == stack_name][0]
-        return stack_status == status
-    return False
+    if not is_stack_exists(stack_name, heat):
+        return False
+    watcher = StackWatcher(heat, get_stack_id(heat, stack_name))
+    return watcher.wait(timeout_seconds=60 * timeout) == status
 
 
 def create_stack(heat_client, stack_name, template, parameters={}, timeout=20,
@@ -98,10 +103,14 @@ def delete_stack(heat_client, uid):
         :param heat_client: Heat API client connection point
         :param uid:         UID of stack
     """
-    if uid in [s.id for s in heat_client.stacks.list()]:
-        heat_client.stacks.delete(uid)
-        while uid in [s.id for s in heat_client.stacks.list()]:
-            sleep(1)
+    watcher = StackWatcher(heat_client, uid, skip_existing=True)
+    if watcher.stack_status() == 'DELETE_COMPLETE':
+        return
+    heat_client.stacks.delete(uid)
+    status = watcher.wait(timeout_seconds=10 * 60)
+    if status != 'DELETE_COMPLETE':
+        raise Exception("ERROR: Stack {} is not deleted, its status is "
+                        "{}:\n{}".format(uid, status, watcher.format()))
 
 
 def check_stack_status_complete(heat_client, uid, action, timeout=10):
@@ -113,21 +122,18 @@ def check_stack_status_complete(heat_client, uid, action, timeout=10):
         :param timeout: Timeout for check operation
         :return uid: UID of created stack
     """
-    stack = heat_client.stacks.get(stack_id=uid).to_dict()
-    end_time = time() + 60 * timeout
-    while stack['stack_status'] == '{}_IN_PROGRESS'.format(action):
+    watcher = StackWatcher(heat_client, uid)
+    status = watcher.wait(timeout_seconds=60 * timeout)
+    if status != '{}_COMPLETE'.format(action):
         stack = heat_client.stacks.get(stack_id=uid).to_dict()
-        if time() > end_time:
-            break
-        else:
-            sleep(1)
-    if stack['stack_status'] != '{}_COMPLETE'.format(action):
         raise Exception("ERROR: Stack {} is not in '{}_COMPLETE' "
-                        "state:\n".format(stack, action))
+                        "state:\n{}".format(stack, action,
+                                             watcher.format()))
 
 
 def read_template(templates_dir, template_name):
     """Read template file and return it content.
+        Contents are cached while file modification time is the same.
         :param templates_dir: dir
         :param template_name: name of template,
         for ex.: empty_heat_template.yaml
@@ -136,12 +142,31 @@ def read_template(templates_dir, template_name):
 
     template_path = os.path.join(templates_dir, template_name)
     try:
-        with open(template_path) as template:
-            return template.read()
-    except IOError as e:
+        mtime = os.path.getmtime(template_path)
+        cached = _templates.get(template_path)
+        if cached is None or cached[0] != mtime:
+            with open(template_path) as template:
+                cached = (mtime, template.read())
+            _templates[template_path] = cached
+        return cached[1]
+    except (IOError, OSError) as e:
         raise IOError('Can\'t read template: {}'.format(e))
 
 
+def load_template(templates_dir, template_name):
+    """Return parsed template as dict.
+        Parsed templates are cached, so changes of returned dict
+        don't affect cache.
+        :param templates_dir: dir
+        :param template_name: name of template
+        :return: template dict
+    """
+    content = read_template(templates_dir, template_name)
+    if content not in _parsed_templates:
+        _parsed_templates[content] = yaml.safe_load(content)
+    return copy.deepcopy(_parsed_templates[content])
+
+
 def update_stack(heat_client, uid, template_file, parameters={}):
     """Update stack using template file
         :param heat_client:   Heat API client connection point
@@ -176,9 +201,9 @@ def get_specific_resource_id(heat_client, uid, resource_name):
     return stack_resources['physical_resource_id']
 
 
-def update_template_file(template_file, type_of_changes, **kwargs):
-    """Update template file specific fields.
-        :param template_file: path to template file.
+def modify_template(data, type_of_changes, **kwargs):
+    """Update parsed template specific fields.
+        :param data: template dict
         :param type_of_changes:
         if changes in format - 'format'
         if changes in flavor size - 'flavor'
@@ -187,10 +212,8 @@ def update_template_file(template_file, type_of_changes, **kwargs):
         disk_format: new disk_format value (optional parameter)
         container_format: new container_format value (optional parameter)
         flavor: new flavor size
-        :return -
+        :return: template dict
     """
-    with open(template_file, 'r') as stream:
-        data = yaml.load(stream)
     if type_of_changes == 'format':
         data['resources']['cirros_image']['properties']['disk_format'] \
             = kwargs['disk_format']
@@ -198,16 +221,29 @@ def update_template_file(template_file, type_of_changes, **kwargs):
             = kwargs['container_format']
     elif type_of_changes == 'flavor':
         data['resources']['vm']['properties']['flavor'] = kwargs['flavor']
-    with open(template_file, 'w') as yaml_file:
-        yaml_file.write(yaml.dump(data, default_flow_style=False))
+    return data
+
+
+def change_template(templates_dir, template_name, type_of_changes, **kwargs):
+    """Return content of template with changed fields without changing of
+        template file.
+        :param templates_dir: dir
+        :param template_name: name of template
+        :param type_of_changes: see `modify_template`
+        :return: template content
+    """
+    data = modify_template(load_template(templates_dir, template_name),
+                           type_of_changes, **kwargs)
+    return yaml.safe_dump(data, default_flow_style=False)
 
 
-def download_image(image_link_file, where_to_put='/tmp/'):
+def download_image(image_link_file, where_to_put=DEFAULT_IMAGES_ROOT):
     """This function will download image from internet and write it
-        if image is not already present on node.
+        if image is not already present in images cache.
         :param image_link_file: Location of file with a link
-        :param where_to_put:    Path to output folder on node
-        :return: full path to downloaded image. Default: '/tmp/blablablb.bla'
+        :param where_to_put:    Path to images cache folder on node
+        :return: full path to downloaded image.
+            Like: '/tmp/mos_tests_images/0123456789abcdef-blablablb.bla'
     """
     # Get URL from file
     try:
@@ -217,39 +253,14 @@ def download_image(image_link_file, where_to_put='/tmp/'):
         raise Exception("Can not find or read from file on node:"
                         "\n\t{}".format(image_link_file))
 
-    # Get image name from URL. Like: 'fedora-heat-test-image.qcow2'
-    image_name_from_url = image_url.rsplit('/', 1)[-1]
-
-    # Prepare full path on node. Like: '/tmp/fedora-heat-test-image.qcow2'
-    image_path_on_node = where_to_put + image_name_from_url
-
-    # Check if image already exists on node with path above.
-    # If present - return full path to it. If NOT -> download.
-    if os.path.isfile(image_path_on_node):
-        return image_path_on_node
-    else:
-        # Open URL
-        try:
-            response = urllib2.urlopen(image_url)
-        except urllib2.HTTPError as e:
-            raise Exception('Can not get file from URL. HTTPError = {}.'
-                            '\n\tURL = "{}"'.format(str(e.code), image_url))
-        except urllib2.URLError as e:
-            raise Exception('Can not get file from URL. URLError = {}.'
-                            '\n\tURL = "{}"'.format(str(e.reason), image_url))
-        except Exception:
-            raise Exception("Can not get file from URL:"
-                            "\n\t{}".format(image_url))
-
-        # Write image to file. With Chunk to avoid memory errors.
-        CHUNK = 16 * 1024
-        with open(image_path_on_node, 'wb') as f:
-            while True:
-                chunk = response.read(CHUNK)
-                if not chunk:
-                    break
-                f.write(chunk)
-        return image_path_on_node
+    try:
+        return ImageCache(where_to_put).get(image_url)
+    except urllib2.HTTPError as e:
+        raise Exception('Can not get file from URL. HTTPError = {}.'
+                        '\n\tURL = "{}"'.format(str(e.code), image_url))
+    except urllib2.URLError as e:
+        raise Exception('Can not get file from URL. URLError = {}.'
+                        '\n\tURL = "{}"'.format(str(e.reason), image_url))
 
 
 # Instance functions
@@ -611,6 +622,43 @@ def wait(*args, **kwargs):
         raise e
 
 
+def parallel_map(func, items, workers=10):
+    """Call `func` for each item in thread pool
+
+    :param func: function with one argument
+    :param items: iterable with arguments for `func`
+    :param workers: max count of threads
+    :return: list of results in `items` order; first raised exception is
+        re-raised
+    """
+    items = list(items)
+    if not items:
+        return []
+    pool = ThreadPool(min(workers, len(items)))
+    try:
+        return pool.map(func, items)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def percentile(values, percent):
+    """Return percentile of values with linear interpolation
+
+    :param values: list of numbers
+    :param percent: percent from 0 to 100
+    :returns: percentile or None for empty values
+    """
+    values = sorted(values)
+    if not values:
+        return None
+    position = (len(values) - 1) * percent / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position -
+                                                              lower)
+
+
 def gen_temp_file(prefix='tmp', suffix=''):
     tempdir = os.path.join(os.path.dirname(__file__), '../../temp')
     return NamedTemporaryFile(prefix=prefix, suffix=suffix, dir=tempdir,
@@ -0,0 +1,265 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Glance images upload and download throughput measurement.
+
+Image data is generated on the fly and streamed through glanceclient by
+several parallel clients. Data is hashed while it streams in both
+directions, and the result is compared with the checksum reported by
+the server. No temporary files are used.
+"""
+
+import hashlib
+import logging
+import os
+import time
+
+from mos_tests.functions.common import parallel_map
+from mos_tests.functions.common import percentile
+
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 ** 2
+
+# Size of generated data block and of local reads
+CHUNK_SIZE = 4 * MB
+
+UPLOAD = 'upload'
+DOWNLOAD = 'download'
+
+
+class HashingReader(object):
+    """File-like source of `size` bytes of data with inline md5
+
+    Data is a random block repeated with different counter prefixes, so
+    it's cheap to generate and doesn't consist of equal chunks.
+
+    :param size: count of bytes to return
+    :param chunk_size: size of generated block
+    """
+
+    def __init__(self, size, chunk_size=CHUNK_SIZE):
+        self.size = size
+        self.chunk_size = chunk_size
+        self.md5 = hashlib.md5()
+        self._block = os.urandom(chunk_size)
+        self._offset = 0
+        # Current chunk is kept, so small reads don't rebuild it
+        self._chunk_index = None
+        self._chunk_data = None
+
+    def _chunk(self, index):
+        if index != self._chunk_index:
+            prefix = '{0:016x}'.format(index)
+            self._chunk_data = prefix + self._block[len(prefix):]
+            self._chunk_index = index
+        return self._chunk_data
+
+    def read(self, size=-1):
+        left = self.size - self._offset
+        if size < 0 or size > left:
+            size = left
+        parts = []
+        while size > 0:
+            index, position = divmod(self._offset, self.chunk_size)
+            part = self._chunk(index)[position:position + size]
+            parts.append(part)
+            self._offset += len(part)
+            size -= len(part)
+        data = ''.join(parts)
+        self.md5.update(data)
+        return data
+
+    def __iter__(self):
+        while True:
+            data = self.read(self.chunk_size)
+            if not data:
+                break
+            yield data
+
+    @property
+    def checksum(self):
+        return self.md5.hexdigest()
+
+
+class Transfer(object):
+    """Single image upload or download"""
+
+    def __init__(self, action, size, image_id=None):
+        self.action = action
+        self.size = size
+        self.image_id = image_id
+        self.elapsed = None
+        self.checksum = None
+        self.server_checksum = None
+        self.error = None
+
+    @property
+    def checksum_ok(self):
+        return (self.checksum is not None and
+                self.checksum == self.server_checksum)
+
+    @property
+    def mb_per_s(self):
+        if not self.elapsed:
+            return None
+        return float(self.size) / MB / self.elapsed
+
+
+class ThroughputReport(object):
+    """Upload and download transfers of one run
+
+    :param transfers: list of Transfer
+    :param elapsed: wall time of run in seconds
+    :param tags: dict with run parameters to be shown in report
+    """
+
+    def __init__(self, transfers, elapsed, tags=None):
+        self.transfers = transfers
+        self.elapsed = elapsed
+        self.tags = tags or {}
+
+    @property
+    def failed(self):
+        return [x for x in self.transfers
+                if x.error is not None or not x.checksum_ok]
+
+    def stats(self, action):
+        """Return dict with aggregated stats of transfers of `action`"""
+        transfers = [x for x in self.transfers
+                     if x.action == action and x.error is None]
+        elapsed = [x.elapsed for x in transfers]
+        total_mb = float(sum(x.size for x in transfers)) / MB
+        # Transfers of one action run at the same time, so aggregate
+        # throughput is total data divided by the longest transfer
+        return {
+            'count': len(transfers),
+            'total_mb_per_s': total_mb / max(elapsed) if elapsed else None,
+            'mb_per_s_p50': percentile([x.mb_per_s for x in transfers], 50),
+            'latency_p50': percentile(elapsed, 50),
+            'latency_max': percentile(elapsed, 100),
+        }
+
+    def format(self):
+        """Return human readable report"""
+
+        def fmt(value, template):
+            return '-' if value is None else template.format(value)
+
+        tags = ''.join(' {0}={1}'.format(*x) for x in sorted(
+            self.tags.items()))
+        lines = []
+        for action in (UPLOAD, DOWNLOAD):
+            x = self.stats(action)
+            lines.append(
+                '{0}{1}: {2} images, {3} total, {4} per client, latency '
+                'p50 {5} max {6}'.format(
+                    action, tags, x['count'],
+                    fmt(x['total_mb_per_s'], '{0:.1f}MB/s'),
+                    fmt(x['mb_per_s_p50'], '{0:.1f}MB/s'),
+                    fmt(x['latency_p50'], '{0:.2f}s'),
+                    fmt(x['latency_max'], '{0:.2f}s')))
+        if self.failed:
+            lines.append('{0} transfers failed'.format(len(self.failed)))
+        return '\n'.join(lines)
+
+
+class GlanceBench(object):
+    """Parallel images uploads and downloads through glanceclient
+
+    :param glance: glanceclient of API v1 or v2
+    :param api_version: version of `glance` API
+    :param chunk_size: size of generated data block
+    """
+
+    def __init__(self, glance, api_version, chunk_size=CHUNK_SIZE):
+        self.glance = glance
+        self.api_version = int(api_version)
+        self.chunk_size = chunk_size
+
+    def upload(self, name, size):
+        """Create image with `size` bytes of generated data
+
+        :returns: Transfer
+        """
+        transfer = Transfer(UPLOAD, size)
+        reader = HashingReader(size, chunk_size=self.chunk_size)
+        start = time.time()
+        try:
+            if self.api_version == 1:
+                image = self.glance.images.create(
+                    name=name, disk_format='raw', container_format='bare',
+                    data=reader)
+                transfer.image_id = image.id
+            else:
+                image = self.glance.images.create(
+                    name=name, disk_format='raw', container_format='bare')
+                transfer.image_id = image.id
+                self.glance.images.upload(image.id, reader, image_size=size)
+                image = self.glance.images.get(image.id)
+            transfer.elapsed = time.time() - start
+            transfer.checksum = reader.checksum
+            transfer.server_checksum = image.checksum
+        except Exception as e:
+            logger.exception('Upload of {0} failed'.format(name))
+            transfer.error = e
+        return transfer
+
+    def download(self, image_id):
+        """Download image data, hashing it on the fly
+
+        :returns: Transfer
+        """
+        image = self.glance.images.get(image_id)
+        transfer = Transfer(DOWNLOAD, image.size, image_id)
+        transfer.server_checksum = image.checksum
+        md5 = hashlib.md5()
+        start = time.time()
+        try:
+            for chunk in self.glance.images.data(image_id,
+                                                 do_checksum=False):
+                md5.update(chunk)
+            transfer.elapsed = time.time() - start
+            transfer.checksum = md5.hexdigest()
+        except Exception as e:
+            logger.exception('Download of {0} failed'.format(image_id))
+            transfer.error = e
+        return transfer
+
+    def delete(self, transfers):
+        ids = {x.image_id for x in transfers if x.image_id is not None}
+        parallel_map(self.glance.images.delete, ids)
+
+    def run(self, size, concurrency, prefix='bench_image', tags=None):
+        """Upload `concurrency` images of `size` bytes at once, then
+        download them at once and delete
+
+        :returns: ThroughputReport
+        """
+        start = time.time()
+        uploads = parallel_map(
+            lambda i: self.upload('{0}_{1}'.format(prefix, i), size),
+            range(concurrency), workers=concurrency)
+        try:
+            uploaded = [x.image_id for x in uploads if x.error is None]
+            downloads = parallel_map(self.download, uploaded,
+                                     workers=concurrency)
+        finally:
+            self.delete(uploads)
+        tags = dict(tags or {}, api=self.api_version, size_mb=size // MB,
+                    clients=concurrency)
+        report = ThroughputReport(uploads + downloads, time.time() - start,
+                                  tags=tags)
+        logger.info(report.format())
+        return report
@@ -0,0 +1,281 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Concurrent heat stacks load.
+
+Many stacks are created, updated and deleted from the same template at
+once. All stacks are tracked with single `stacks.list` request per poll.
+Latencies of create, update and delete and error rates (of API requests
+and of heat-engine) are collected to find engine workers saturation.
+"""
+
+from collections import defaultdict
+import hashlib
+import logging
+import time
+
+from waiting import TimeoutExpired
+
+from mos_tests.functions.common import parallel_map
+from mos_tests.functions.common import percentile
+from mos_tests.functions.common import wait
+
+
+logger = logging.getLogger(__name__)
+
+CREATE = 'CREATE'
+UPDATE = 'UPDATE'
+DELETE = 'DELETE'
+
+# Templates contents hashes, which are validated already
+_validated = set()
+
+
+def validate_template(heat, template):
+    """Validate template with heat once per template content"""
+    key = hashlib.sha1(template).hexdigest()
+    if key not in _validated:
+        heat.stacks.validate(template=template)
+        _validated.add(key)
+
+
+def unique_parameters(template, index, known=None):
+    """Return parameters for `index`-th stack from template
+
+    Parameters without defaults are taken from `known` or, for string
+    parameters, are generated unique for each stack.
+
+    :param template: parsed template
+    :param known: dict with common parameters values
+    """
+    known = known or {}
+    parameters = {}
+    for name, spec in (template.get('parameters') or {}).items():
+        if name in known:
+            parameters[name] = known[name]
+        elif 'default' not in spec and spec.get('type') == 'string':
+            parameters[name] = '{0}_{1}'.format(name, index)
+    return parameters
+
+
+class StackOperation(object):
+    """Single create, update or delete of stack"""
+
+    def __init__(self, action, name, stack_id=None):
+        self.action = action
+        self.name = name
+        self.stack_id = stack_id
+        self.requested_at = None
+        self.done_at = None
+        self.status = None
+        self.error = None
+
+    @property
+    def finished(self):
+        return self.done_at is not None or self.error is not None
+
+    @property
+    def latency(self):
+        if self.done_at is None:
+            return None
+        return self.done_at - self.requested_at
+
+
+class LoadReport(object):
+    """Latency distributions and error rates of stacks operations"""
+
+    def __init__(self, operations):
+        self.operations = operations
+
+    @property
+    def failed(self):
+        return [x for x in self.operations if x.error is not None]
+
+    def stats(self, percents=(50, 90, 99, 100)):
+        """Return dict with actions as keys and dicts with count, error
+        rates and latency percentiles as values
+
+        `engine_error_rate` counts stacks in FAILED status, `error_rate`
+        counts all errors including rejected API requests.
+        """
+        groups = defaultdict(list)
+        for operation in self.operations:
+            groups[operation.action].append(operation)
+        stats = {}
+        for action, operations in groups.items():
+            latencies = [x.latency for x in operations
+                         if x.latency is not None]
+            errors = [x for x in operations if x.error is not None]
+            engine_errors = [x for x in errors
+                             if (x.status or '').endswith('_FAILED')]
+            stats[action] = {
+                'count': len(operations),
+                'error_rate': float(len(errors)) / len(operations),
+                'engine_error_rate': (float(len(engine_errors)) /
+                                      len(operations)),
+                'latency': {p: percentile(latencies, p) for p in percents},
+            }
+        return stats
+
+    def format(self):
+        """Return human readable report"""
+        lines = []
+        for action in (CREATE, UPDATE, DELETE):
+            x = self.stats().get(action)
+            if x is None:
+                continue
+            latency = ', '.join(
+                'p{0}={1}'.format(p, '-' if v is None else '{0:.1f}s'.format(
+                    v)) for p, v in sorted(x['latency'].items()))
+            lines.append('{0}: {1} stacks, {2:.1%} errors ({3:.1%} engine), '
+                         '{4}'.format(action, x['count'], x['error_rate'],
+                                      x['engine_error_rate'], latency))
+        return '\n'.join(lines)
+
+
+class HeatLoad(object):
+    """Concurrent stacks operations with shared status tracking
+
+    :param heat: heat client
+    :param concurrency: max count of simultaneous API requests
+    :param poll_interval: seconds between stacks list polls
+    """
+
+    def __init__(self, heat, concurrency=10, poll_interval=2):
+        self.heat = heat
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.operations = []
+
+    def _issue(self, operation, request):
+        operation.requested_at = time.time()
+        try:
+            result = request()
+            if operation.action == CREATE:
+                operation.stack_id = result['stack']['id']
+        except Exception as e:
+            logger.warning('{0} of stack {1} failed: {2}'.format(
+                operation.action, operation.name, e))
+            operation.error = e
+        return operation
+
+    def _run(self, operations, requests):
+        self.operations.extend(operations)
+        start = time.time()
+        parallel_map(lambda x: self._issue(*x), zip(operations, requests),
+                     workers=self.concurrency)
+        logger.info('{0} requests are issued in {1:.1f}s'.format(
+            len(operations), time.time() - start))
+        return operations
+
+    def create(self, template, count, prefix='load_stack', parameters=None,
+               files=None, timeout_mins=20):
+        """Issue creation of `count` stacks and return operations
+
+        :param template: template content
+        :param parameters: function, which returns parameters of stack by
+            its index, or dict of parameters for all stacks
+        """
+        validate_template(self.heat, template)
+        if not callable(parameters):
+            parameters = (lambda value: lambda i: value)(parameters or {})
+        operations = [StackOperation(CREATE, '{0}_{1}'.format(prefix, i))
+                      for i in range(count)]
+        return self._run(operations, [
+            lambda x=x, i=i: self.heat.stacks.create(
+                stack_name=x.name, template=template, files=files or {},
+                parameters=parameters(i), timeout_mins=timeout_mins)
+            for i, x in enumerate(operations)])
+
+    def update(self, operations, template, parameters=None, files=None):
+        """Issue update of stacks, successfully created by `operations`
+
+        :param parameters: function, which returns parameters of stack by
+            its index, or dict of parameters for all stacks
+        """
+        validate_template(self.heat, template)
+        if not callable(parameters):
+            parameters = (lambda value: lambda i: value)(parameters or {})
+        created = [x for x in operations
+                   if x.action == CREATE and x.done_at is not None]
+        updates = [StackOperation(UPDATE, x.name, x.stack_id)
+                   for x in created]
+        return self._run(updates, [
+            lambda x=x, i=i: self.heat.stacks.update(
+                x.stack_id, template=template, files=files or {},
+                parameters=parameters(i))
+            for i, x in enumerate(updates)])
+
+    def delete(self, operations):
+        """Issue deletion of stacks, created by `operations`"""
+        created = [x for x in operations
+                   if x.action == CREATE and x.stack_id is not None]
+        deletes = [StackOperation(DELETE, x.name, x.stack_id)
+                   for x in created]
+        return self._run(deletes, [
+            lambda x=x: self.heat.stacks.delete(x.stack_id)
+            for x in deletes])
+
+    def _poll(self, operations):
+        now = time.time()
+        stacks = {x.id: x for x in self.heat.stacks.list()}
+        for operation in operations:
+            stack = stacks.get(operation.stack_id)
+            if stack is None:
+                if operation.action == DELETE:
+                    operation.status = 'DELETE_COMPLETE'
+                    operation.done_at = now
+                continue
+            operation.status = stack.stack_status
+            # Stack may show status of previous action for a while
+            if not stack.stack_status.startswith(operation.action):
+                continue
+            if stack.stack_status.endswith('_COMPLETE'):
+                operation.done_at = now
+            elif stack.stack_status.endswith('_FAILED'):
+                operation.error = '{0}: {1}'.format(
+                    stack.stack_status,
+                    getattr(stack, 'stack_status_reason', ''))
+
+    def wait(self, operations, timeout_seconds=20 * 60):
+        """Wait until all operations are finished
+
+        Operations, which are not finished after timeout, get "timeout"
+        error, so report is returned anyway.
+
+        :returns: LoadReport of `operations`
+        """
+        pending = [x for x in operations if not x.finished]
+
+        def all_finished():
+            self._poll(pending)
+            pending[:] = [x for x in pending if not x.finished]
+            return not pending
+
+        try:
+            wait(all_finished, timeout_seconds=timeout_seconds,
+                 sleep_seconds=self.poll_interval,
+                 waiting_for='{0} stacks operations to finish'.format(
+                     len(pending)))
+        except TimeoutExpired:
+            logger.warning('{0} stacks operations are not finished in '
+                           '{1}s'.format(len(pending), timeout_seconds))
+            for operation in pending:
+                operation.error = 'timeout'
+        report = LoadReport(operations)
+        logger.info(report.format())
+        return report
+
+    def report(self):
+        """Return LoadReport of all issued operations"""
+        return LoadReport(self.operations)
@@ -0,0 +1,235 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Content-addressed cache of test images.
+
+Images are downloaded once into local store, keyed by sha256 of URL, and
+are verified with sha256 of content. Downloads are done under file lock
+(so parallel test workers don't race), go to `.part` file (so interrupted
+download is resumed with HTTP Range request) and are moved to place
+atomically. Checksums of images are kept in `.json` files near them.
+
+In Glance, image with the same name and checksum is reused instead of
+uploading it again. Such images are not deleted after tests.
+"""
+
+from contextlib import contextmanager
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import tarfile
+import urllib2
+
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 4 * 1024 ** 2
+
+DEFAULT_ROOT = '/tmp/mos_tests_images'
+
+
+def _hash_file(path, hashes):
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            for x in hashes:
+                x.update(chunk)
+
+
+def _write_json(path, data):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.rename(tmp_path, path)
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return None
+
+
+@contextmanager
+def file_lock(path):
+    """Exclusive lock of `path`, held by this process"""
+    with open(path + '.lock', 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class ImageCache(object):
+    """Local store of downloaded images
+
+    :param root: directory of store
+    """
+
+    def __init__(self, root=DEFAULT_ROOT):
+        self.root = root
+        if not os.path.isdir(root):
+            try:
+                os.makedirs(root)
+            except OSError:
+                # Created by other worker
+                pass
+
+    def path(self, url):
+        """Return store path of image from `url`"""
+        key = hashlib.sha256(url).hexdigest()[:16]
+        return os.path.join(self.root, '{0}-{1}'.format(
+            key, url.rsplit('/', 1)[-1]))
+
+    def checksums(self, path, force=False):
+        """Return dict with sha256, md5 and size of file
+
+        Checksums are cached in `.json` file while size and modification
+        time of file are the same.
+
+        :param force: recalculate checksums anyway
+        """
+        if path.startswith(self.root):
+            meta_path = path + '.json'
+        else:
+            meta_path = os.path.join(self.root, '{0}.json'.format(
+                hashlib.sha256(os.path.abspath(path)).hexdigest()[:16]))
+        stat = os.stat(path)
+        meta = _read_json(meta_path) or {}
+        if (force or meta.get('size') != stat.st_size or
+                meta.get('mtime') != stat.st_mtime):
+            sha256, md5 = hashlib.sha256(), hashlib.md5()
+            _hash_file(path, [sha256, md5])
+            meta.update(sha256=sha256.hexdigest(), md5=md5.hexdigest(),
+                        size=stat.st_size, mtime=stat.st_mtime)
+            _write_json(meta_path, meta)
+        return meta
+
+    def _download(self, url, part_path):
+        """Download or resume download of `url` to `part_path`"""
+        offset = 0
+        if os.path.exists(part_path):
+            offset = os.path.getsize(part_path)
+        request = urllib2.Request(url)
+        if offset:
+            request.add_header('Range', 'bytes={0}-'.format(offset))
+        try:
+            response = urllib2.urlopen(request)
+        except urllib2.HTTPError as e:
+            # Range is not satisfiable, so part is complete
+            if offset and e.code == 416:
+                return
+            raise
+        if offset and response.getcode() != 206:
+            logger.info('Server does not support resume of {0}'.format(url))
+            offset = 0
+        if offset:
+            logger.info('Resume download of {0} from {1} bytes'.format(
+                url, offset))
+        else:
+            logger.info('Download {0}'.format(url))
+        with open(part_path, 'ab' if offset else 'wb') as f:
+            for chunk in iter(lambda: response.read(CHUNK_SIZE), b''):
+                f.write(chunk)
+        response.close()
+
+    def get(self, url, sha256=None, verify=False):
+        """Return path of image from `url`, downloading it if needed
+
+        :param sha256: expected sha256 of image
+        :param verify: recalculate checksum of already cached image
+        """
+        path = self.path(url)
+        with file_lock(path):
+            meta = _read_json(path + '.json')
+            if meta is not None and os.path.exists(path):
+                meta = self.checksums(path, force=verify)
+                if sha256 is None or meta['sha256'] == sha256:
+                    return path
+                logger.warning('Cached {0} has wrong sha256'.format(path))
+                os.remove(path)
+            part_path = path + '.part'
+            self._download(url, part_path)
+            meta = self.checksums(part_path)
+            if sha256 is not None and meta['sha256'] != sha256:
+                os.remove(part_path)
+                raise Exception('sha256 of {0} is {1}, but {2} is '
+                                'expected'.format(url, meta['sha256'],
+                                                  sha256))
+            os.rename(part_path, path)
+            meta['url'] = url
+            _write_json(path + '.json', meta)
+            os.remove(part_path + '.json')
+        return path
+
+    def extract(self, path):
+        """Extract first member of tar archive from store
+
+        :returns: path of extracted file
+        """
+        extracted_path = path + '.extracted'
+        with file_lock(extracted_path):
+            if not os.path.exists(extracted_path):
+                part_path = extracted_path + '.part'
+                with tarfile.open(path) as tar:
+                    src = tar.extractfile(tar.next())
+                    with open(part_path, 'wb') as dst:
+                        for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+                            dst.write(chunk)
+                os.rename(part_path, extracted_path)
+        return extracted_path
+
+
+def find_image(glance, checksum, name=None):
+    """Return active Glance image with md5 `checksum` or None"""
+    for image in glance.images.list():
+        if (getattr(image, 'checksum', None) == checksum and
+                image.status == 'active' and
+                (name is None or image.name == name)):
+            return image
+
+
+def get_or_upload_image(glance, path, name, disk_format='qcow2',
+                        container_format='bare', cache=None, **properties):
+    """Return Glance image with content of `path`
+
+    Active image with the same name and checksum is reused, otherwise new
+    image is uploaded. Both glanceclient v1 and v2 are supported.
+
+    :param properties: image properties
+    """
+    cache = cache or ImageCache()
+    md5 = cache.checksums(path)['md5']
+    image = find_image(glance, md5, name=name)
+    if image is not None:
+        logger.info('Reuse image {0} ({1})'.format(image.id, name))
+        return image
+    logger.info('Upload {0} as image {1}'.format(path, name))
+    with open(path, 'rb') as f:
+        if hasattr(glance.images, 'upload'):
+            image = glance.images.create(name=name, disk_format=disk_format,
+                                         container_format=container_format,
+                                         **properties)
+            glance.images.upload(image.id, f)
+            image = glance.images.get(image.id)
+        else:
+            image = glance.images.create(name=name, disk_format=disk_format,
+                                         container_format=container_format,
+                                         properties=properties, data=f)
+    assert image.checksum == md5, (
+        'Checksum of image {0} is {1}, but {2} is expected'.format(
+            image.id, image.checksum, md5))
+    return image
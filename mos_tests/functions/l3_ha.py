@@ -0,0 +1,268 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Background tracking of L3 HA routers states with transitions timeline."""
+
+from collections import namedtuple
+import logging
+import threading
+import time
+
+from mos_tests.functions.common import parallel_map
+from mos_tests.functions.common import wait
+
+
+logger = logging.getLogger(__name__)
+
+ACTIVE = 'active'
+DEAD = 'dead'
+
+# keepalived state file content -> neutron ha_state
+KEEPALIVED_STATES = {
+    'master': ACTIVE,
+    'backup': 'standby',
+    'fault': 'fault',
+}
+
+KEEPALIVED_CMD = ('for f in /var/lib/neutron/ha_confs/*/state; do '
+                  'test -f $f && echo $(basename $(dirname $f)) $(cat $f); '
+                  'done')
+
+Transition = namedtuple('Transition', ['timestamp', 'host', 'old', 'new'])
+
+
+class RouterStateLog(object):
+    """Timestamped states of router on all hosts
+
+    :param router_id: router id
+    """
+
+    def __init__(self, router_id):
+        self.router_id = router_id
+        self.states = {}
+        self.transitions = []
+        # list of (timestamp, tuple of hosts with active router)
+        self.active_changes = []
+
+    def update(self, timestamp, states):
+        """Add sample of states
+
+        :param timestamp: sample time
+        :param states: dict with hosts as keys and states as values
+        """
+        for host in sorted(set(states) | set(self.states)):
+            old = self.states.get(host)
+            new = states.get(host)
+            if old != new:
+                self.transitions.append(Transition(timestamp, host, old, new))
+                logger.debug('Router {0} on {1}: {2} -> {3}'.format(
+                    self.router_id, host, old, new))
+        active = tuple(sorted(host for host, state in states.items()
+                              if state == ACTIVE))
+        if not self.active_changes or self.active_changes[-1][1] != active:
+            self.active_changes.append((timestamp, active))
+        self.states = dict(states)
+
+    @property
+    def active_hosts(self):
+        """Hosts with active router in last sample"""
+        if not self.active_changes:
+            return ()
+        return self.active_changes[-1][1]
+
+    def split_brain_intervals(self):
+        """Return list of (start, end, hosts) with several active hosts
+
+        `end` is None for interval, which is not finished yet.
+        """
+        intervals = []
+        changes = self.active_changes + [(None, ())]
+        for (start, hosts), (end, _) in zip(changes, changes[1:]):
+            if len(hosts) > 1:
+                intervals.append((start, end, hosts))
+        return intervals
+
+    def failover_time(self, from_host, since=None):
+        """Return seconds until router became active on other single host
+
+        :param from_host: host, which was active before failover
+        :param since: failover start time, by default - first sample
+            without `from_host` active
+        :returns: seconds or None if failover is not finished
+        """
+        lost = None
+        for timestamp, hosts in self.active_changes:
+            if since is not None and timestamp < since:
+                continue
+            if from_host in hosts:
+                lost = None
+                continue
+            if lost is None:
+                lost = timestamp
+            if len(hosts) == 1:
+                return timestamp - (since or lost)
+        return None
+
+    def format(self):
+        """Return human readable transitions timeline"""
+        if not self.transitions:
+            return ''
+        start = self.transitions[0].timestamp
+        return '\n'.join(
+            '+{0:.1f}s {1.host}: {1.old} -> {1.new}'.format(
+                x.timestamp - start, x) for x in self.transitions)
+
+
+class L3HATracker(object):
+    """Background sampler of routers ha_state
+
+    Agents states are read from neutron API; if `controllers` are passed,
+    keepalived state files are also read on them, to cross-check neutron
+    data.
+
+    :param os_conn: OpenStackActions
+    :param router_ids: list of routers ids to track
+    :param controllers: fuel nodes to read keepalived states from
+    :param interval: seconds between samples
+    """
+
+    def __init__(self, os_conn, router_ids, controllers=(), interval=1):
+        self.os_conn = os_conn
+        self.router_ids = list(router_ids)
+        self.controllers = list(controllers)
+        self.interval = interval
+        self.logs = {x: RouterStateLog(x) for x in self.router_ids}
+        self.keepalived_logs = {x: RouterStateLog(x) for x in self.router_ids}
+        self._remotes = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *err):
+        self.stop()
+
+    def _agents_states(self, router_id):
+        agents = self.os_conn.get_l3_for_router(router_id)['agents']
+        return {x['host']: x['ha_state'] if x['alive'] else DEAD
+                for x in agents}
+
+    def _keepalived_states(self, host):
+        states = {}
+        result = self._remotes[host].execute(KEEPALIVED_CMD, verbose=False)
+        for line in result['stdout']:
+            router_id, _, state = line.strip().partition(' ')
+            if router_id in self.logs:
+                states[router_id] = KEEPALIVED_STATES.get(state, state)
+        return states
+
+    def sample(self):
+        """Read states of all routers and add them to logs"""
+        timestamp = time.time()
+        states = parallel_map(self._agents_states, self.router_ids)
+        for router_id, router_states in zip(self.router_ids, states):
+            self.logs[router_id].update(timestamp, router_states)
+        if not self._remotes:
+            return
+        hosts = list(self._remotes)
+        keepalived = dict(zip(hosts, parallel_map(self._keepalived_states,
+                                                  hosts)))
+        for router_id in self.router_ids:
+            self.keepalived_logs[router_id].update(timestamp, {
+                host: host_states[router_id]
+                for host, host_states in keepalived.items()
+                if router_id in host_states})
+
+    def _run(self):
+        while not self._stop.is_set():
+            start = time.time()
+            try:
+                self.sample()
+            except Exception:
+                logger.exception('Error during L3 HA states sampling')
+            self._stop.wait(max(0, self.interval - (time.time() - start)))
+
+    def start(self):
+        for node in self.controllers:
+            remote = node.ssh()
+            remote.reconnect()
+            self._remotes[node.data['fqdn']] = remote
+        self.sample()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(60)
+            self._thread = None
+        for remote in self._remotes.values():
+            remote.clear()
+        self._remotes = {}
+        self._log_split_brains()
+
+    def _log_split_brains(self):
+        for name, logs in (('neutron', self.logs),
+                           ('keepalived', self.keepalived_logs)):
+            for router_id, log in logs.items():
+                for start, end, hosts in log.split_brain_intervals():
+                    if end is None:
+                        duration = 'not finished'
+                    else:
+                        duration = '{0:.1f}s'.format(end - start)
+                    logger.warning(
+                        'Router {0} is active on {1} by {2} states: '
+                        '{3}'.format(router_id, ', '.join(hosts), name,
+                                     duration))
+
+    def wait_rescheduled(self, router_id, from_host, timeout_seconds=2 * 60):
+        """Wait until router is active on single host other than `from_host`
+
+        :returns: new active host
+        """
+        log = self.logs[router_id]
+
+        def new_active_host():
+            hosts = log.active_hosts
+            if len(hosts) == 1 and hosts[0] != from_host:
+                return hosts[0]
+
+        return wait(new_active_host, timeout_seconds=timeout_seconds,
+                    sleep_seconds=self.interval,
+                    waiting_for='router {0} rescheduled from {1}'.format(
+                        router_id, from_host))
+
+    def wait_active(self, router_id, host, timeout_seconds=60):
+        """Wait until router is active only on `host`"""
+        log = self.logs[router_id]
+        return wait(lambda: log.active_hosts == (host,),
+                    timeout_seconds=timeout_seconds,
+                    sleep_seconds=self.interval,
+                    waiting_for='router {0} is active on {1}'.format(
+                        router_id, host))
+
+    def split_brains(self):
+        """Return dict with routers ids as keys and split-brain intervals
+        from neutron and keepalived logs as values
+        """
+        result = {}
+        for router_id in self.router_ids:
+            intervals = (self.logs[router_id].split_brain_intervals() +
+                         self.keepalived_logs[router_id]
+                         .split_brain_intervals())
+            if intervals:
+                result[router_id] = intervals
+        return result
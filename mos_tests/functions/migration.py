@@ -0,0 +1,337 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Live migration harness with downtime and data integrity checks.
+
+Instances are migrated concurrently. For each instance the harness
+records migration duration, network downtime (measured with background
+ping of instance floating ip) and result of disk data checksum check.
+"""
+
+from collections import defaultdict
+import logging
+import re
+import signal
+import subprocess
+import threading
+import time
+
+from mos_tests.functions.common import parallel_map
+from mos_tests.functions.common import percentile
+from mos_tests.functions.common import wait
+
+
+logger = logging.getLogger(__name__)
+
+HOST_ATTR = 'OS-EXT-SRV-ATTR:hypervisor_hostname'
+
+# Minimal ping interval allowed for non-root users
+PING_INTERVAL = 0.2
+
+
+def write_data(remote, path, size_mb=1):
+    """Write random data to file on instance and return its checksum"""
+    remote.check_call(
+        'sudo sh -c "dd if=/dev/urandom of={0} bs=1M count={1} && '
+        'sync"'.format(path, size_mb))
+    return get_checksum(remote, path)
+
+
+def get_checksum(remote, path):
+    """Return md5 checksum of file on instance"""
+    result = remote.check_call('sudo md5sum {0}'.format(path))
+    return result.stdout_string.split()[0]
+
+
+class PingMonitor(object):
+    """Background ping with per-packet accounting
+
+    :param ip: address to ping
+    :param interval: seconds between packets
+    """
+
+    reply_re = re.compile(r'bytes from .*icmp_seq=(\d+)')
+    transmitted_re = re.compile(r'(\d+) packets transmitted')
+
+    def __init__(self, ip, interval=PING_INTERVAL):
+        self.ip = ip
+        self.interval = interval
+        self.received = []
+        self.transmitted = None
+        self._process = None
+        self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *err):
+        self.stop()
+
+    def _read(self):
+        for line in iter(self._process.stdout.readline, b''):
+            line = line.decode('utf-8', 'replace')
+            match = self.reply_re.search(line)
+            if match:
+                self.received.append(int(match.group(1)))
+                continue
+            match = self.transmitted_re.search(line)
+            if match:
+                self.transmitted = int(match.group(1))
+
+    def start(self):
+        self._process = subprocess.Popen(
+            ['ping', '-n', '-i', str(self.interval), self.ip],
+            stdout=subprocess.PIPE)
+        self._thread = threading.Thread(target=self._read)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        # SIGINT makes ping print statistics
+        self._process.send_signal(signal.SIGINT)
+        self._process.wait()
+        self._thread.join(10)
+
+    @property
+    def lost(self):
+        """Count of lost packets"""
+        transmitted = self.transmitted or max(self.received or [0])
+        return transmitted - len(set(self.received))
+
+    @property
+    def downtime(self):
+        """Longest period without replies in seconds"""
+        received = sorted(set(self.received))
+        if not received:
+            return None
+        transmitted = self.transmitted or received[-1]
+        # Sequence numbers start from 1
+        bounds = [0] + received + [transmitted + 1]
+        longest_gap = max(y - x - 1 for x, y in zip(bounds, bounds[1:]))
+        return longest_gap * self.interval
+
+
+class MigrationRecord(object):
+    """Result of live migration of single instance"""
+
+    def __init__(self, server_id, source, target):
+        self.server_id = server_id
+        self.source = source
+        self.target = target
+        self.started_at = None
+        self.finished_at = None
+        self.status = None
+        self.migration_status = None
+        self.downtime = None
+        self.lost = None
+        self.data_ok = None
+        self.error = None
+
+    @property
+    def duration(self):
+        if self.finished_at is None:
+            return None
+        return self.finished_at - self.started_at
+
+    @property
+    def succeeded(self):
+        return (self.status == 'ACTIVE' and self.error is None and
+                self.data_ok is not False)
+
+
+class MigrationReport(object):
+    """Live migrations results with aggregates by hypervisors pairs"""
+
+    def __init__(self, records):
+        self.records = records
+
+    @property
+    def failed(self):
+        return [x for x in self.records if not x.succeeded]
+
+    def by_hosts(self):
+        """Return dict with (source, target) as keys and dicts of aggregated
+        stats as values
+        """
+        groups = defaultdict(list)
+        for record in self.records:
+            groups[(record.source, record.target)].append(record)
+        stats = {}
+        for pair, records in groups.items():
+            durations = [x.duration for x in records
+                         if x.duration is not None]
+            downtimes = [x.downtime for x in records
+                         if x.downtime is not None]
+            stats[pair] = {
+                'count': len(records),
+                'failed': len([x for x in records if not x.succeeded]),
+                'duration_p50': percentile(durations, 50),
+                'duration_max': percentile(durations, 100),
+                'downtime_p50': percentile(downtimes, 50),
+                'downtime_max': percentile(downtimes, 100),
+                'lost': sum(x.lost or 0 for x in records),
+            }
+        return stats
+
+    def format(self):
+        """Return human readable report"""
+
+        def fmt(value):
+            return '-' if value is None else '{0:.1f}s'.format(value)
+
+        lines = []
+        for (source, target), x in sorted(self.by_hosts().items()):
+            lines.append(
+                '{0} -> {1}: {2[count]} migrations, {2[failed]} failed, '
+                'duration p50 {3} max {4}, downtime p50 {5} max {6}, '
+                '{2[lost]} packets lost'.format(
+                    source, target, x, fmt(x['duration_p50']),
+                    fmt(x['duration_max']), fmt(x['downtime_p50']),
+                    fmt(x['downtime_max'])))
+        return '\n'.join(lines)
+
+
+class LiveMigrationHarness(object):
+    """Concurrent live migrations of instances
+
+    :param os_conn: OpenStackActions
+    :param parallelism: max count of simultaneous migrations
+    :param block_migration: use block migration
+    :param timeout_seconds: timeout of single migration
+    :param poll_interval: seconds between instance status polls
+    """
+
+    def __init__(self, os_conn, parallelism=2, block_migration=True,
+                 timeout_seconds=10 * 60, poll_interval=1):
+        self.os_conn = os_conn
+        self.nova = os_conn.nova
+        self.parallelism = parallelism
+        self.block_migration = block_migration
+        self.timeout_seconds = timeout_seconds
+        self.poll_interval = poll_interval
+        self._statuses = {}
+        self._statuses_at = 0
+        self._statuses_lock = threading.Lock()
+
+    def pick_targets(self, servers):
+        """Return dict with servers ids as keys and target hypervisors
+        (other than current one, round-robin) as values
+        """
+        hypervisors = sorted(x.hypervisor_hostname
+                             for x in self.nova.hypervisors.list())
+        targets = {}
+        for i, server in enumerate(servers):
+            others = [x for x in hypervisors
+                      if x != getattr(server, HOST_ATTR)]
+            assert others, 'No hypervisors to migrate {0} to'.format(
+                server.id)
+            targets[server.id] = others[i % len(others)]
+        return targets
+
+    def _migration_statuses(self):
+        """Return dict with instances ids as keys and statuses of their last
+        migrations from os-migrations as values
+
+        Migrations are requested once per poll interval for all instances.
+        """
+        with self._statuses_lock:
+            if time.time() - self._statuses_at >= self.poll_interval:
+                try:
+                    migrations = self.nova.migrations.list()
+                except Exception as e:
+                    logger.debug('Migrations are not available: {0}'.format(
+                        e))
+                    migrations = []
+                self._statuses = {x.instance_uuid: x.status
+                                  for x in sorted(migrations,
+                                                  key=lambda x: x.id)}
+                self._statuses_at = time.time()
+            return self._statuses
+
+    def _is_finished(self, record):
+        server = self.nova.servers.get(record.server_id)
+        record.status = server.status
+        migration_status = self._migration_statuses().get(record.server_id)
+        if migration_status != record.migration_status:
+            logger.debug('Migration of {0}: {1}'.format(record.server_id,
+                                                        migration_status))
+            record.migration_status = migration_status
+        if server.status == 'ERROR':
+            raise Exception('Instance {0} is in ERROR state'.format(
+                server.id))
+        return (server.status == 'ACTIVE' and
+                getattr(server, HOST_ATTR) == record.target)
+
+    def _migrate(self, args):
+        server, target, ping_ip, get_remote, data_paths = args
+        record = MigrationRecord(server.id, getattr(server, HOST_ATTR),
+                                 target)
+        checksums = {}
+        if get_remote is not None and data_paths:
+            with get_remote(server) as remote:
+                checksums = {x: write_data(remote, x) for x in data_paths}
+        monitor = PingMonitor(ping_ip) if ping_ip else None
+        try:
+            if monitor:
+                monitor.start()
+            record.started_at = time.time()
+            self.nova.servers.live_migrate(
+                server, target, block_migration=self.block_migration,
+                disk_over_commit=False)
+            wait(lambda: self._is_finished(record),
+                 timeout_seconds=self.timeout_seconds,
+                 sleep_seconds=self.poll_interval,
+                 waiting_for='instance {0} migrated to {1}'.format(
+                     server.id, target))
+            record.finished_at = time.time()
+        except Exception as e:
+            logger.exception('Migration of {0} failed'.format(server.id))
+            record.error = e
+        finally:
+            if monitor:
+                monitor.stop()
+                record.downtime = monitor.downtime
+                record.lost = monitor.lost
+        if checksums and record.error is None:
+            with get_remote(server) as remote:
+                record.data_ok = all(get_checksum(remote, path) == checksum
+                                     for path, checksum in checksums.items())
+        return record
+
+    def migrate(self, servers, targets=None, ping_ips=None, get_remote=None,
+                data_paths=()):
+        """Live migrate instances and return MigrationReport
+
+        :param servers: list of nova servers
+        :param targets: dict with servers ids as keys and target
+            hypervisors as values (see `pick_targets` for default)
+        :param ping_ips: dict with servers ids as keys and addresses to
+            measure downtime as values
+        :param get_remote: function, which returns SSHClient to server;
+            used to check data on `data_paths`
+        :param data_paths: paths of files to write random data to before
+            migration and check it after
+        """
+        targets = targets or self.pick_targets(servers)
+        ping_ips = ping_ips or {}
+        start = time.time()
+        records = parallel_map(
+            self._migrate,
+            [(x, targets[x.id], ping_ips.get(x.id), get_remote, data_paths)
+             for x in servers],
+            workers=self.parallelism)
+        report = MigrationReport(records)
+        logger.info('{0} migrations in {1:.1f}s\n{2}'.format(
+            len(records), time.time() - start, report.format()))
+        return report
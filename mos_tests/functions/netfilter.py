@@ -0,0 +1,311 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Structured conntrack table and iptables rules of nodes.
+
+Conntrack entries and iptables rules are collected with single remote call
+and indexed once, so queries by zone, device or address don't rescan
+command output.
+"""
+
+from collections import defaultdict
+from collections import namedtuple
+import logging
+import shlex
+
+from six.moves import shlex_quote
+
+
+logger = logging.getLogger(__name__)
+
+SECTION = '====netfilter-section===='
+
+CONNTRACK_CMD = 'conntrack -L{args} 2>/dev/null'
+IPTABLES_CMD = 'iptables-save -t {table}'
+
+# Flags without values, like [UNREPLIED] or [ASSURED]
+UNREPLIED = 'UNREPLIED'
+
+
+class ConntrackEntry(namedtuple('ConntrackEntry', ['proto', 'state', 'flags',
+                                                   'orig', 'reply', 'zone',
+                                                   'mark'])):
+    """Conntrack table entry
+
+    `orig` and `reply` are dicts with tuple fields (src, dst, sport, id...),
+    `flags` is frozenset of flags like 'UNREPLIED' or 'ASSURED'.
+    """
+
+    @property
+    def id(self):
+        """ICMP id of original direction or None"""
+        value = self.orig.get('id')
+        return int(value) if value is not None else None
+
+    @property
+    def unreplied(self):
+        return UNREPLIED in self.flags
+
+    @property
+    def addresses(self):
+        """Set of all addresses of both directions"""
+        return {self.orig.get('src'), self.orig.get('dst'),
+                self.reply.get('src'), self.reply.get('dst')} - {None}
+
+    @classmethod
+    def parse(cls, line):
+        """Make entry from `conntrack -L` output line
+
+        Example of line:
+            icmp 1 29 src=10.0.0.4 dst=10.0.0.5 type=8 code=0 id=1 [UNREPLIED]
+            src=10.0.0.5 dst=10.0.0.4 type=0 code=0 id=1 mark=0 zone=1 use=1
+        """
+        tokens = line.split()
+        proto = tokens[0]
+        state = None
+        flags = set()
+        tuples = []
+        extra = {}
+        for token in tokens[3:]:
+            key, sep, value = token.partition('=')
+            if not sep:
+                if token.startswith('['):
+                    flags.add(token.strip('[]'))
+                else:
+                    state = token
+            elif key == 'src' and len(tuples) < 2:
+                tuples.append({key: value})
+            elif tuples and len(extra) == 0 and key not in ('mark', 'zone',
+                                                            'use', 'secctx'):
+                tuples[-1][key] = value
+            else:
+                extra[key] = value
+        while len(tuples) < 2:
+            tuples.append({})
+        zone = extra.get('zone')
+        return cls(proto=proto,
+                   state=state,
+                   flags=frozenset(flags),
+                   orig=tuples[0],
+                   reply=tuples[1],
+                   zone=int(zone) if zone is not None else None,
+                   mark=int(extra.get('mark', 0)))
+
+
+class ConntrackTable(object):
+    """Conntrack entries, indexed by zone and address"""
+
+    def __init__(self, entries=()):
+        self.entries = []
+        self._by_zone = defaultdict(list)
+        self._by_address = defaultdict(list)
+        for entry in entries:
+            self.add(entry)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def add(self, entry):
+        self.entries.append(entry)
+        self._by_zone[entry.zone].append(entry)
+        for address in entry.addresses:
+            self._by_address[address].append(entry)
+
+    def zones(self):
+        """Return set of zones of entries"""
+        return set(self._by_zone) - {None}
+
+    def select(self, zone=None, address=None, proto=None):
+        """Return list of entries, matched to all passed criteria
+
+        :param zone: conntrack zone
+        :param address: ip address in any direction of entry
+        :param proto: protocol name, like 'icmp' or 'tcp'
+        """
+        if address is not None:
+            entries = self._by_address.get(address, [])
+        elif zone is not None:
+            entries = self._by_zone.get(zone, [])
+        else:
+            entries = self.entries
+        return [x for x in entries
+                if (zone is None or x.zone == zone) and
+                (proto is None or x.proto == proto)]
+
+
+class Rule(namedtuple('Rule', ['chain', 'args', 'options', 'line'])):
+    """iptables rule from `iptables-save` output
+
+    `options` is dict with options names (without dashes) as keys, like
+    {'j': 'CT', 'physdev-in': 'tap123', 'zone': '1'}. Negated options have
+    '!' prefix in name.
+    """
+
+    @property
+    def target(self):
+        return self.options.get('j')
+
+    @property
+    def device(self):
+        """Incoming device of rule (physdev or interface) or None"""
+        return self.options.get('physdev-in') or self.options.get('i')
+
+    @property
+    def zone(self):
+        """Conntrack zone for CT target rule or None"""
+        value = self.options.get('zone')
+        return int(value) if value is not None else None
+
+    @classmethod
+    def parse(cls, line):
+        args = shlex.split(line)
+        chain = args[1]
+        options = {}
+        negate = False
+        name = None
+        for arg in args[2:]:
+            if arg == '!':
+                negate = True
+            elif arg.startswith('-') and not arg[1:].isdigit():
+                name = ('!' if negate else '') + arg.lstrip('-')
+                negate = False
+                # Options without values (like --physdev-is-bridged)
+                options[name] = None
+            elif name is not None:
+                if options[name] is None:
+                    options[name] = arg
+                else:
+                    options[name] += ' ' + arg
+        return cls(chain=chain, args=tuple(args[2:]), options=options,
+                   line=line.rstrip())
+
+    def __str__(self):
+        return self.line
+
+
+class IptablesTable(object):
+    """Chains of iptables table with rules in order"""
+
+    def __init__(self, name):
+        self.name = name
+        self.policies = {}
+        self.chains = defaultdict(list)
+
+    @classmethod
+    def parse(cls, lines):
+        """Make table from `iptables-save` output of single table"""
+        table = None
+        for line in lines:
+            if line.startswith('*'):
+                table = cls(line[1:].strip())
+            elif table is None:
+                continue
+            elif line.startswith(':'):
+                name, policy = line[1:].split()[:2]
+                table.policies[name] = policy
+                table.chains.setdefault(name, [])
+            elif line.startswith('-A '):
+                rule = Rule.parse(line)
+                table.chains[rule.chain].append(rule)
+        return table
+
+    def rules(self, chain=None, target=None):
+        """Return list of rules of `chain` (all chains by default)"""
+        if chain is not None:
+            rules = self.chains.get(chain, [])
+        else:
+            rules = [rule for x in self.chains.values() for rule in x]
+        return [x for x in rules if target is None or x.target == target]
+
+    def zone_devices(self, chain=None):
+        """Return dict with CT zones as keys and lists of devices as values"""
+        zones = defaultdict(list)
+        for rule in self.rules(chain, target='CT'):
+            if rule.zone is not None and rule.device is not None:
+                zones[rule.zone].append(rule.device)
+        return dict(zones)
+
+    def format(self, chain=None):
+        """Return rules in `iptables-save` format"""
+        return '\n'.join(str(x) for x in self.rules(chain))
+
+
+class NetfilterSnapshot(object):
+    """Conntrack table and iptables table of a node
+
+    :param host: node fqdn
+    :param conntrack: ConntrackTable
+    :param iptables: IptablesTable
+    """
+
+    def __init__(self, host, conntrack, iptables):
+        self.host = host
+        self.conntrack = conntrack
+        self.iptables = iptables
+
+    def __repr__(self):
+        return '<NetfilterSnapshot {0}: {1} conntrack entries>'.format(
+            self.host, len(self.conntrack))
+
+    @classmethod
+    def parse(cls, host, lines):
+        """Make snapshot from `make_command` output lines"""
+        conntrack = ConntrackTable()
+        lines = iter(lines)
+        for line in lines:
+            if line.startswith(SECTION):
+                break
+            if line.strip():
+                conntrack.add(ConntrackEntry.parse(line))
+        return cls(host, conntrack, IptablesTable.parse(lines))
+
+
+def make_command(proto=None, address=None, table='raw'):
+    """Return command to collect conntrack entries and iptables table
+
+    :param proto: collect only conntrack entries with this protocol
+    :param address: collect only conntrack entries with this original
+        source or destination address
+    :param table: iptables table name
+    """
+    args = ''
+    if proto is not None:
+        args += ' -p {0}'.format(shlex_quote(proto))
+    if address is None:
+        conntrack_cmd = CONNTRACK_CMD.format(args=args)
+    else:
+        # conntrack can't filter by source or destination at once
+        address = shlex_quote(address)
+        conntrack_cmd = '{{ {0}; {1}; }} | sort -u'.format(
+            CONNTRACK_CMD.format(args=args + ' -s ' + address),
+            CONNTRACK_CMD.format(args=args + ' -d ' + address))
+    return '{conntrack}; echo {sep}; {iptables}'.format(
+        conntrack=conntrack_cmd, sep=SECTION,
+        iptables=IPTABLES_CMD.format(table=table))
+
+
+def get_snapshot(node, proto=None, address=None, table='raw'):
+    """Return NetfilterSnapshot for fuel node
+
+    Conntrack entries are filtered on node side by `proto` and `address`
+    to keep transfer and parsing small on busy nodes.
+    """
+    cmd = make_command(proto=proto, address=address, table=table)
+    with node.ssh() as remote:
+        result = remote.check_call(cmd, verbose=False)
+    snapshot = NetfilterSnapshot.parse(node.data['fqdn'], result['stdout'])
+    logger.debug('Got {0!r}'.format(snapshot))
+    return snapshot
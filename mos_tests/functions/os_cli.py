@@ -13,10 +13,21 @@
 #    under the License.
 
 import json
+import logging
+import os
+import threading
 
 from tempest.lib.cli import output_parser as parser
 from tempest.lib import exceptions
 
+from mos_tests.environment.ssh import CommandResult
+
+
+logger = logging.getLogger(__name__)
+
+HELPER_PATH = os.path.join(os.path.dirname(__file__), 'scripts',
+                           'os_cli_helper.py')
+
 
 class Result(unicode):
     def listing(self):
@@ -29,10 +40,85 @@ class Result(unicode):
         return self.__class__(super(Result, self).__add__(other))
 
 
-def os_execute(remote, command, fail_ok=False, merge_stderr=False):
+class CLISession(object):
+    """Long-lived CLI session on remote host
+
+    Resident helper (see `scripts/os_cli_helper.py`) is started once with
+    sourced openrc over single SSH channel. Commands are sent to it and
+    results are read back as JSON lines, so python interpreter and clients
+    startup is paid once per session instead of once per command.
+
+    :param remote: SSHClient
+    """
+
+    remote_path = '/tmp/os_cli_helper.py'
+    log_path = '/tmp/os_cli_helper.log'
+
+    def __init__(self, remote):
+        self.remote = remote
+        self._chan = None
+        self._stdin = None
+        self._stdout = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *err):
+        self.close()
+
+    @property
+    def is_alive(self):
+        return self._chan is not None and not self._chan.exit_status_ready()
+
+    def start(self):
+        self.remote.upload(HELPER_PATH, self.remote_path)
+        self._chan, self._stdin, self._stdout, _ = self.remote.execute_async(
+            '. openrc && python -u {0} 2>>{1}'.format(self.remote_path,
+                                                     self.log_path))
+        return self
+
+    def execute(self, command):
+        """Execute command in session
+
+        :returns: CommandResult as `SSHClient.execute` does
+        """
+        with self._lock:
+            if not self.is_alive:
+                logger.warning('CLI session is not running, start it')
+                self.start()
+            logger.debug("Executing command in CLI session: '{0}'".format(
+                command))
+            self._stdin.write(json.dumps({'command': command}) + '\n')
+            self._stdin.flush()
+            line = self._stdout.readline()
+        if not line:
+            raise Exception('CLI session is closed, see {0} on {1} for '
+                            'details'.format(self.log_path, self.remote.host))
+        response = json.loads(line)
+        return CommandResult({
+            'exit_code': response['exit_code'],
+            'stdout': [response['stdout'].encode('utf-8')],
+            'stderr': [response['stderr'].encode('utf-8')],
+        })
+
+    def close(self):
+        if self._chan is None:
+            return
+        self._chan.shutdown_write()
+        self._chan.recv_exit_status()
+        self._chan.close()
+        self._chan = None
+
+
+def os_execute(remote, command, fail_ok=False, merge_stderr=False,
+               session=None):
     command = command.encode('utf-8')
-    command = '. openrc && {}'.format(command)
-    result = remote.execute(command)
+    if session is not None:
+        result = session.execute(command)
+    else:
+        command = '. openrc && {}'.format(command)
+        result = remote.execute(command)
     if not fail_ok and not result.is_ok:
         raise exceptions.CommandFailed(result['exit_code'],
                                        command,
@@ -48,8 +134,9 @@ class CLICLient(object):
 
     command = ''
 
-    def __init__(self, remote):
+    def __init__(self, remote, session=None):
         self.remote = remote
+        self.session = session
         super(CLICLient, self).__init__()
 
     def build_command(self, action, flags='', params='', prefix=''):
@@ -59,7 +146,7 @@ class CLICLient(object):
                 merge_stderr=False):
         command = self.build_command(action, flags, params, prefix)
         return os_execute(self.remote, command, fail_ok=fail_ok,
-                          merge_stderr=merge_stderr)
+                          merge_stderr=merge_stderr, session=self.session)
 
 
 class OpenStack(CLICLient):
@@ -0,0 +1,305 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Structured Open vSwitch state: ports and OpenFlow tables of nodes."""
+
+from collections import namedtuple
+import json
+import logging
+import re
+import time
+
+from mos_tests.functions.common import parallel_map
+from mos_tests.functions.common import wait
+
+
+logger = logging.getLogger(__name__)
+
+SECTION = '====ovs-section===='
+
+# All node state is collected with single remote call
+SNAPSHOT_CMD = (
+    'ovs-vsctl -f json --columns=name,ports list Bridge; '
+    'echo {sep}; '
+    'ovs-vsctl -f json --columns=_uuid,name,tag list Port; '
+    'for br in $(ovs-vsctl list-br); do '
+    'echo {sep} $br; ovs-ofctl dump-flows $br; '
+    'done').format(sep=SECTION)
+
+DEFAULT_PRIORITY = 32768
+
+# `ovs-ofctl dump-flows` fields, which are not part of flow match
+_STAT_FIELDS = {
+    'cookie', 'duration', 'table', 'n_packets', 'n_bytes', 'idle_age',
+    'hard_age', 'idle_timeout', 'hard_timeout', 'importance',
+    'send_flow_rem', 'reset_counts', 'check_overlap',
+}
+_FIELDS_SEPARATOR = re.compile(r',\s*')
+
+Port = namedtuple('Port', ['name', 'bridge', 'tag'])
+
+FlowDiff = namedtuple('FlowDiff', ['added', 'removed', 'changed'])
+
+
+class Flow(namedtuple('Flow', ['bridge', 'table', 'priority', 'match',
+                               'actions', 'cookie', 'n_packets', 'n_bytes',
+                               'duration'])):
+    """OpenFlow table entry
+
+    `match` is a tuple of match fields in dump order, `cookie` is int.
+    """
+
+    @property
+    def key(self):
+        """Flow identity: flows with same key are the same flow"""
+        return self.bridge, self.table, self.priority, self.match
+
+    @classmethod
+    def parse(cls, bridge, line):
+        """Make Flow from `ovs-ofctl dump-flows` output line"""
+        head, _, actions = line.strip().partition(' actions=')
+        stats = {}
+        match = []
+        priority = DEFAULT_PRIORITY
+        for field in _FIELDS_SEPARATOR.split(head.strip()):
+            name, _, value = field.partition('=')
+            if name in _STAT_FIELDS:
+                stats[name] = value
+            elif name == 'priority':
+                priority = int(value)
+            elif field:
+                match.append(field)
+        return cls(bridge=bridge,
+                   table=int(stats.get('table', 0)),
+                   priority=priority,
+                   match=tuple(match),
+                   actions=actions,
+                   cookie=int(stats.get('cookie', '0'), 16),
+                   n_packets=int(stats.get('n_packets', 0)),
+                   n_bytes=int(stats.get('n_bytes', 0)),
+                   duration=float(stats.get('duration', '0s').rstrip('s')))
+
+    def __str__(self):
+        return ('{0.bridge} table={0.table} priority={0.priority} {1} '
+                'actions={0.actions} cookie={0.cookie:#x}').format(
+                    self, ','.join(self.match))
+
+
+class FlowTable(object):
+    """Flows of all bridges of one node, indexed by flow key"""
+
+    def __init__(self, flows=()):
+        self.flows = {}
+        for flow in flows:
+            self.flows[flow.key] = flow
+
+    def __len__(self):
+        return len(self.flows)
+
+    def __iter__(self):
+        return iter(self.flows.values())
+
+    def __contains__(self, key):
+        return key in self.flows
+
+    def __getitem__(self, key):
+        return self.flows[key]
+
+    def select(self, bridge=None, table=None):
+        """Return list of flows for bridge and/or table"""
+        return [flow for flow in self
+                if (bridge is None or flow.bridge == bridge) and
+                (table is None or flow.table == table)]
+
+    def cookies(self, bridges=None):
+        """Return set of cookies of flows of `bridges` (all by default)"""
+        return {flow.cookie for flow in self
+                if bridges is None or flow.bridge in bridges}
+
+    def diff(self, other, fields=('actions',)):
+        """Compare with `other` (earlier) flow table
+
+        :param other: FlowTable to compare with
+        :param fields: flow fields to compare for flows with same key
+        :returns: FlowDiff with lists of added and removed flows and list
+            of (old, new) pairs of changed flows
+        """
+        added = [flow for key, flow in self.flows.items()
+                 if key not in other.flows]
+        removed = [flow for key, flow in other.flows.items()
+                   if key not in self.flows]
+        changed = []
+        for key, flow in self.flows.items():
+            old = other.flows.get(key)
+            if old is None:
+                continue
+            if any(getattr(old, x) != getattr(flow, x) for x in fields):
+                changed.append((old, flow))
+        return FlowDiff(added=added, removed=removed, changed=changed)
+
+
+def _ovsdb_value(value):
+    """Convert ovsdb json value to python one"""
+    if isinstance(value, list):
+        kind, data = value
+        if kind == 'set':
+            return [_ovsdb_value(x) for x in data]
+        if kind == 'map':
+            return {k: _ovsdb_value(v) for k, v in data}
+        return data
+    return value
+
+
+def _ovsdb_records(output):
+    data = json.loads(output)
+    return [dict(zip(data['headings'], [_ovsdb_value(x) for x in row]))
+            for row in data['data']]
+
+
+class OvsSnapshot(object):
+    """Ports and flows of a node at some moment
+
+    :param host: node fqdn
+    :param ports: list of Port
+    :param flows: FlowTable
+    """
+
+    def __init__(self, host, ports, flows, timestamp=None):
+        self.host = host
+        self.ports = {port.name: port for port in ports}
+        self.flows = flows
+        self.timestamp = timestamp or time.time()
+
+    def __repr__(self):
+        return '<OvsSnapshot {0}: {1} ports, {2} flows>'.format(
+            self.host, len(self.ports), len(self.flows))
+
+    @classmethod
+    def parse(cls, host, lines):
+        """Make snapshot from `SNAPSHOT_CMD` output lines"""
+        sections = [[]]
+        bridges = []
+        for line in lines:
+            if line.startswith(SECTION):
+                sections.append([])
+                bridges.append(line[len(SECTION):].strip())
+            else:
+                sections[-1].append(line)
+
+        port_bridges = {}
+        for bridge in _ovsdb_records(''.join(sections[0])):
+            ports = bridge['ports']
+            if not isinstance(ports, list):
+                ports = [ports]
+            for port_uuid in ports:
+                port_bridges[port_uuid] = bridge['name']
+        ports = [Port(name=x['name'], bridge=port_bridges.get(x['_uuid']),
+                      tag=x['tag'] if x['tag'] != [] else None)
+                 for x in _ovsdb_records(''.join(sections[1]))]
+
+        flows = []
+        for bridge, flow_lines in zip(bridges[1:], sections[2:]):
+            flows.extend(Flow.parse(bridge, x) for x in flow_lines
+                         if ' actions=' in x)
+        return cls(host, ports, FlowTable(flows))
+
+    def port_tags(self):
+        """Returns dict with ports as keys and tags as values"""
+        return {name: port.tag for name, port in self.ports.items()
+                if port.tag is not None}
+
+    def diff(self, other, fields=('actions',)):
+        """Flows difference with `other` (earlier) snapshot"""
+        return self.flows.diff(other.flows, fields=fields)
+
+    def is_restored(self, other, bridges=None):
+        """Check that flows of `other` snapshot are reinstalled
+
+        No one of `bridges` flows should have `other` cookies. Flows, which
+        are removed during reinstall, are not checked here (see
+        `removed_flows`).
+        """
+        stale = self.flows.cookies(bridges) & other.flows.cookies(bridges)
+        return not stale
+
+    def removed_flows(self, other, bridges=None):
+        """Return list of `bridges` flows of `other` snapshot, which are
+        absent in this one
+        """
+        return [flow for flow in self.diff(other).removed
+                if bridges is None or flow.bridge in bridges]
+
+
+def get_snapshot(node):
+    """Return OvsSnapshot for fuel node"""
+    with node.ssh() as remote:
+        result = remote.check_call(SNAPSHOT_CMD, verbose=False)
+    return OvsSnapshot.parse(node.data['fqdn'], result['stdout'])
+
+
+def get_snapshots(nodes):
+    """Collect OvsSnapshot from all nodes in parallel
+
+    :returns: dict with nodes fqdn as keys and snapshots as values
+    """
+    snapshots = parallel_map(get_snapshot, nodes)
+    return {x.host: x for x in snapshots}
+
+
+def format_diff(diff):
+    """Return human readable FlowDiff representation"""
+    lines = ['+ {0}'.format(x) for x in diff.added]
+    lines += ['- {0}'.format(x) for x in diff.removed]
+    for old, new in diff.changed:
+        lines += ['~ {0}'.format(old), '  {0}'.format(new)]
+    return '\n'.join(lines)
+
+
+def wait_flows_restored(nodes, snapshots, bridges=('br-int', 'br-tun'),
+                        timeout_seconds=5 * 60):
+    """Wait until flows from `snapshots` are reinstalled on `nodes`
+
+    Flows are reinstalled, when `bridges` flows get new cookie. After that
+    flows of `snapshots`, which are absent on nodes, are reported as
+    failure.
+
+    :param nodes: fuel nodes to check
+    :param snapshots: dict with OvsSnapshot made before agents restart
+    :param bridges: bridges, which flows should get new cookie
+    :returns: dict with nodes fqdn as keys and reinstall time (seconds since
+        start of waiting) as values
+    """
+    start = time.time()
+    pending = {node.data['fqdn']: node for node in nodes}
+    restored = {}
+    removed = {}
+
+    def check():
+        current = get_snapshots(pending.values())
+        for host, snapshot in current.items():
+            if snapshot.is_restored(snapshots[host], bridges=bridges):
+                restored[host] = snapshot.timestamp - start
+                logger.info('Flows on {0} reinstalled in {1:.1f}s'.format(
+                    host, restored[host]))
+                removed[host] = snapshot.removed_flows(snapshots[host],
+                                                       bridges=bridges)
+                del pending[host]
+        return not pending
+
+    wait(check, timeout_seconds=timeout_seconds, sleep_seconds=1,
+         waiting_for='ovs flows to be reinstalled')
+    lost = ['{0}: {1}'.format(host, flow)
+            for host, flows in sorted(removed.items()) for flow in flows]
+    assert not lost, 'Flows are not reinstalled:\n{0}'.format(
+        '\n'.join(lost))
+    return restored
@@ -0,0 +1,173 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Pacemaker resources management with batched operations."""
+
+from collections import defaultdict
+from contextlib import contextmanager
+import logging
+import time
+from xml.etree import ElementTree
+
+from mos_tests.functions.common import wait
+
+
+logger = logging.getLogger(__name__)
+
+# Old pacemaker supports only --as-xml, new one - only --output-as
+CRM_MON_CMD = 'crm_mon --as-xml 2>/dev/null || crm_mon --output-as=xml'
+
+ACTIVE_ROLES = ('Started', 'Master', 'Slave')
+
+
+class ClusterStatus(object):
+    """Resources placement from `crm_mon` xml output
+
+    :param placement: dict with resources names as keys and dicts
+        {node: role} as values
+    :param online: set of online nodes names
+    """
+
+    def __init__(self, placement, online):
+        self.placement = placement
+        self.online = online
+        self.timestamp = time.time()
+
+    @classmethod
+    def parse(cls, xml):
+        root = ElementTree.fromstring(xml)
+        online = {x.get('name') for x in root.iter('node')
+                  if x.get('online') == 'true'}
+        placement = defaultdict(dict)
+        for resource in root.iter('resource'):
+            # Clone instances may have `:N` suffix
+            name = resource.get('id').split(':')[0]
+            for node in resource.iter('node'):
+                placement[name][node.get('name')] = resource.get('role')
+        return cls(dict(placement), online)
+
+    def running_on(self, resource, roles=ACTIVE_ROLES):
+        """Return set of nodes, where resource is in one of `roles`"""
+        return {node for node, role in self.placement.get(resource,
+                                                          {}).items()
+                if role in roles}
+
+
+class Pacemaker(object):
+    """Pacemaker cluster, managed through one of controllers
+
+    Operations, called inside `batch` context, are executed with single
+    remote call on exit from it.
+
+    :param remote: connected SSHClient to controller
+    """
+
+    def __init__(self, remote):
+        self.remote = remote
+        self.applied_at = None
+        self._pending = None
+
+    def _run(self, commands, tolerant=False):
+        if self._pending is not None:
+            self._pending.extend(commands)
+            return
+        if tolerant:
+            # All commands are executed even if some of them fail, exit
+            # code is of the last one only, so stderr is checked too
+            result = self.remote.execute('; '.join(commands))
+            if not result.is_ok or result.stderr_string.strip():
+                logger.warning('Some of commands failed: {0}'.format(
+                    result.stderr_string))
+        else:
+            self.remote.check_call(' && '.join(commands))
+        self.applied_at = time.time()
+
+    @contextmanager
+    def batch(self):
+        """Collect operations and apply them at once on exit"""
+        self._pending = []
+        try:
+            yield self
+            commands = self._pending
+        finally:
+            self._pending = None
+        if commands:
+            self._run(commands)
+
+    def ban(self, resource, nodes):
+        logger.info('Ban {0} on {1}'.format(resource, ', '.join(nodes)))
+        self._run(['pcs resource ban {0} {1}'.format(resource, node)
+                   for node in nodes])
+
+    def clear(self, resource, nodes=None, tolerant=False):
+        """Clear bans of resource on `nodes` (on all nodes by default)
+
+        :param tolerant: try to clear on all nodes and log failures
+            instead of raising (e.g. for teardown)
+        """
+        if nodes is None:
+            logger.info('Clear {0}'.format(resource))
+            self._run(['pcs resource clear {0}'.format(resource)],
+                      tolerant=tolerant)
+            return
+        logger.info('Clear {0} on {1}'.format(resource, ', '.join(nodes)))
+        self._run(['pcs resource clear {0} {1}'.format(resource, node)
+                   for node in nodes], tolerant=tolerant)
+
+    def disable(self, resource):
+        logger.info('Disable {0}'.format(resource))
+        self._run(['pcs resource disable {0}'.format(resource)])
+
+    def enable(self, resource):
+        logger.info('Enable {0}'.format(resource))
+        self._run(['pcs resource enable {0}'.format(resource)])
+
+    def status(self):
+        """Return current ClusterStatus"""
+        result = self.remote.check_call(CRM_MON_CMD, verbose=False)
+        return ClusterStatus.parse(result.stdout_string)
+
+    def elapsed(self):
+        """Return seconds since last applied operation"""
+        if self.applied_at is None:
+            return None
+        return time.time() - self.applied_at
+
+    def wait_resource(self, resource, started_on=(), stopped_on=(),
+                      timeout_seconds=3 * 60):
+        """Wait until resource is started on and stopped on nodes
+
+        :param resource: resource name
+        :param started_on: nodes, where resource should be active
+        :param stopped_on: nodes, where resource should not be active
+        :returns: seconds from last applied operation to convergence
+        """
+        started_on = set(started_on)
+        stopped_on = set(stopped_on)
+        start = self.applied_at or time.time()
+        statuses = []
+
+        def predicate():
+            status = self.status()
+            statuses.append(status)
+            running = status.running_on(resource)
+            return started_on <= running and not stopped_on & running
+
+        wait(predicate, timeout_seconds=timeout_seconds,
+             sleep_seconds=(1, 10, 2),
+             waiting_for='{0} to be started on {1} and stopped on {2}'.format(
+                 resource, sorted(started_on), sorted(stopped_on)))
+        elapsed = statuses[-1].timestamp - start
+        logger.info('Pacemaker converged {0} in {1:.1f}s'.format(
+            resource, elapsed))
+        return elapsed
@@ -0,0 +1,218 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Streaming pcap reader with VXLAN/Ethernet/ARP/IPv4/ICMP decoding.
+
+Capture file is read record by record, so memory usage doesn't depend on
+capture size. Each packet is reduced to a `Flow` (vni, protocol, source and
+destination addresses) and only flow counters are kept.
+"""
+
+from collections import Counter
+from collections import namedtuple
+import logging
+import socket
+import struct
+
+
+logger = logging.getLogger(__name__)
+
+VXLAN_PORT = 4789
+
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+
+ETH_P_IP = 0x0800
+ETH_P_ARP = 0x0806
+ETH_P_VLAN = (0x8100, 0x88a8)
+
+IP_PROTOCOLS = {
+    1: 'icmp',
+    6: 'tcp',
+    17: 'udp',
+}
+
+# magic number -> (byte order, timestamp fraction resolution)
+_MAGIC = {
+    b'\xd4\xc3\xb2\xa1': ('<', 1e6),
+    b'\xa1\xb2\xc3\xd4': ('>', 1e6),
+    b'\x4d\x3c\xb2\xa1': ('<', 1e9),
+    b'\xa1\xb2\x3c\x4d': ('>', 1e9),
+}
+
+PCAP_HEADER_SIZE = 24
+
+_ETHERNET = struct.Struct('!6s6sH')
+_SLL = struct.Struct('!HHH8sH')
+_VLAN = struct.Struct('!HH')
+_ARP = struct.Struct('!HHBBH')
+_IPV4 = struct.Struct('!BBHHHBBH4s4s')
+_UDP = struct.Struct('!HHHH')
+_VXLAN = struct.Struct('!BxxxI')
+
+
+Flow = namedtuple('Flow', ['vni', 'proto', 'src', 'dst'])
+
+
+def iter_records(path, chunk_size=1024 * 1024):
+    """Yield (timestamp, linktype, packet data) for each record of pcap file
+
+    Last truncated record (tcpdump was killed during write) is skipped.
+    """
+    with open(path, 'rb', chunk_size) as f:
+        header = f.read(PCAP_HEADER_SIZE)
+        if len(header) < PCAP_HEADER_SIZE:
+            logger.warning('Capture {0} is empty'.format(path))
+            return
+        if header[:4] not in _MAGIC:
+            raise ValueError('{0} is not a pcap file'.format(path))
+        byte_order, resolution = _MAGIC[header[:4]]
+        linktype = struct.unpack(byte_order + 'I', header[20:24])[0]
+        record = struct.Struct(byte_order + 'IIII')
+        while True:
+            record_header = f.read(record.size)
+            if len(record_header) < record.size:
+                return
+            ts_sec, ts_frac, incl_len, _ = record.unpack(record_header)
+            data = f.read(incl_len)
+            if len(data) < incl_len:
+                return
+            yield ts_sec + ts_frac / resolution, linktype, data
+
+
+def _strip_vlan(ethertype, payload):
+    while ethertype in ETH_P_VLAN and len(payload) >= _VLAN.size:
+        _, ethertype = _VLAN.unpack_from(payload)
+        payload = payload[_VLAN.size:]
+    return ethertype, payload
+
+
+def _decode_ethernet(data):
+    if len(data) < _ETHERNET.size:
+        return None, b''
+    _, _, ethertype = _ETHERNET.unpack_from(data)
+    return _strip_vlan(ethertype, data[_ETHERNET.size:])
+
+
+def _decode_link(linktype, data):
+    if linktype == LINKTYPE_ETHERNET:
+        return _decode_ethernet(data)
+    if linktype == LINKTYPE_LINUX_SLL:
+        if len(data) < _SLL.size:
+            return None, b''
+        ethertype = _SLL.unpack_from(data)[-1]
+        return _strip_vlan(ethertype, data[_SLL.size:])
+    if linktype == LINKTYPE_RAW:
+        return ETH_P_IP, data
+    return None, b''
+
+
+def _decode_arp(vni, payload):
+    if len(payload) < _ARP.size:
+        return Flow(vni, 'arp', None, None)
+    _, _, hlen, plen, _ = _ARP.unpack_from(payload)
+    spa = _ARP.size + hlen
+    tpa = spa + plen + hlen
+    if plen != 4 or len(payload) < tpa + plen:
+        return Flow(vni, 'arp', None, None)
+    return Flow(vni, 'arp',
+                socket.inet_ntoa(payload[spa:spa + plen]),
+                socket.inet_ntoa(payload[tpa:tpa + plen]))
+
+
+def decode(linktype, data, vxlan_port=VXLAN_PORT):
+    """Decode packet to `Flow`
+
+    VXLAN (UDP to `vxlan_port`) packets are decoded to inner frame flow with
+    `vni` set; `vni` is None for not encapsulated traffic.
+    """
+    vni = None
+    ethertype, payload = _decode_link(linktype, data)
+    while True:
+        if ethertype == ETH_P_ARP:
+            return _decode_arp(vni, payload)
+        if ethertype != ETH_P_IP or len(payload) < _IPV4.size:
+            return Flow(vni, 'other', None, None)
+        (ver_ihl, _, _, _, frag, _, proto, _,
+         src, dst) = _IPV4.unpack_from(payload)
+        src = socket.inet_ntoa(src)
+        dst = socket.inet_ntoa(dst)
+        l4 = payload[(ver_ihl & 0x0f) * 4:]
+        is_fragment = frag & 0x1fff != 0
+        if (proto == 17 and vni is None and not is_fragment and
+                len(l4) >= _UDP.size + _VXLAN.size):
+            _, dport, _, _ = _UDP.unpack_from(l4)
+            if dport == vxlan_port:
+                _, vni = _VXLAN.unpack_from(l4, _UDP.size)
+                vni >>= 8
+                ethertype, payload = _decode_ethernet(
+                    l4[_UDP.size + _VXLAN.size:])
+                continue
+        return Flow(vni, IP_PROTOCOLS.get(proto, 'ip'), src, dst)
+
+
+class Capture(object):
+    """Flow index for pcap file, built in one pass over capture
+
+    :param path: path to pcap file
+    :param vxlan_port: UDP port to decode as VXLAN
+    """
+
+    def __init__(self, path, vxlan_port=VXLAN_PORT):
+        self.path = path
+        self.packets = 0
+        self.flows = Counter()
+        self.vnis = Counter()
+        self.protocols = Counter()
+        self.last_seen = {}
+        for timestamp, linktype, data in iter_records(path):
+            self.add(decode(linktype, data, vxlan_port=vxlan_port),
+                     timestamp)
+        logger.debug('{0} packets, {1} flows in {2}'.format(
+            self.packets, len(self.flows), path))
+
+    def add(self, flow, timestamp=None):
+        self.packets += 1
+        self.flows[flow] += 1
+        self.last_seen[flow] = timestamp
+        self.protocols[flow.proto] += 1
+        if flow.vni is not None:
+            self.vnis[flow.vni] += 1
+
+    def select(self, **criteria):
+        """Return flows counter, filtered by `Flow` fields values
+
+        Example: capture.select(proto='arp', src='10.0.0.1')
+        """
+        return Counter({
+            flow: count for flow, count in self.flows.items()
+            if all(getattr(flow, k) == v for k, v in criteria.items())})
+
+    def count(self, **criteria):
+        """Return packets count for flows matched to criteria"""
+        return sum(self.select(**criteria).values())
+
+    def last_time(self, **criteria):
+        """Return timestamp of last packet matched to criteria or None"""
+        times = [self.last_seen[flow] for flow in self.select(**criteria)]
+        return max(times) if times else None
+
+    @staticmethod
+    def format(flows):
+        """Return human readable flows counter representation"""
+        lines = []
+        for flow, count in flows.most_common():
+            lines.append('vni={0.vni} {0.proto} {0.src} > {0.dst}: '
+                         '{1} packets'.format(flow, count))
+        return '\n'.join(lines)
@@ -0,0 +1,182 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Resident helper of `os_cli.CLISession`, which runs on controller.
+
+Reads requests from stdin and writes responses to stdout, one JSON
+document per line. Request is `{"command": "<shell command>"}`, response
+is `{"exit_code": 0, "stdout": "...", "stderr": "..."}`.
+
+`openstack`, `glance` and `murano` commands (with optional `env VAR=value`
+prefix) are executed in process of helper, so python interpreter and
+clients are loaded only once. Other commands and commands with shell
+syntax are executed with bash. Stdin of commands is always closed (as with
+`<&-`).
+"""
+
+import inspect
+import json
+import logging
+import os
+import re
+import shlex
+import subprocess
+import sys
+import traceback
+
+
+SHELLS = {
+    'openstack': 'openstackclient.shell',
+    'glance': 'glanceclient.shell',
+    'murano': 'muranoclient.shell',
+}
+
+CLOSED_STDIN = '<&-'
+SHELL_CHARS = set('|&;<>()$`\\*?[]{}~\n')
+ENV_VAR_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*=')
+
+
+class Capture(object):
+    """File-like object which collects output as unicode"""
+
+    encoding = 'utf-8'
+    errors = 'replace'
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        if isinstance(data, bytes):
+            data = data.decode('utf-8', 'replace')
+        self.parts.append(data)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+    def getvalue(self):
+        return u''.join(self.parts)
+
+
+def patch_glance_stdin():
+    """Make glanceclient treat stdin as closed, like with `<&-`"""
+    try:
+        from glanceclient.common import utils
+    except ImportError:
+        return
+    get_data_file = utils.get_data_file
+
+    def patched(args):
+        if getattr(args, 'file', None) is None:
+            return None
+        return get_data_file(args)
+
+    utils.get_data_file = patched
+
+
+def parse(command):
+    """Return (environment, argv) for in-process run or None for shell"""
+    command = command.replace(CLOSED_STDIN, ' ')
+    if any(x in SHELL_CHARS for x in command):
+        return None
+    try:
+        argv = shlex.split(command.encode('utf-8'))
+    except ValueError:
+        return None
+    argv = [x.decode('utf-8') for x in argv]
+    environment = {}
+    if argv and argv[0] == 'env':
+        argv.pop(0)
+        while argv and ENV_VAR_RE.match(argv[0]):
+            name, value = argv.pop(0).split('=', 1)
+            environment[name] = value
+    if not argv or argv[0] not in SHELLS:
+        return None
+    return environment, argv
+
+
+def run_shell(command):
+    process = subprocess.Popen(['bash', '-c', command.encode('utf-8')],
+                               stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE)
+    stdout, stderr = process.communicate()
+    return (process.returncode, stdout.decode('utf-8', 'replace'),
+            stderr.decode('utf-8', 'replace'))
+
+
+def run_in_process(environment, argv):
+    main = __import__(SHELLS[argv[0]], fromlist=['main']).main
+    stdout, stderr = Capture(), Capture()
+    saved_streams = sys.stdout, sys.stderr
+    saved_argv = sys.argv
+    saved_environ = dict(os.environ)
+    sys.stdout, sys.stderr = stdout, stderr
+    sys.argv = [x.encode('utf-8') for x in argv]
+    os.environ.update((k, v.encode('utf-8'))
+                      for k, v in environment.items())
+    try:
+        if inspect.getargspec(main).args:
+            exit_code = main(sys.argv[1:])
+        else:
+            exit_code = main()
+    except SystemExit as e:
+        exit_code = e.code
+    except Exception:
+        traceback.print_exc()
+        exit_code = 1
+    finally:
+        sys.stdout, sys.stderr = saved_streams
+        sys.argv = saved_argv
+        os.environ.clear()
+        os.environ.update(saved_environ)
+        # Clients add handlers to root logger on each run
+        logging.getLogger().handlers = []
+    if exit_code is None:
+        exit_code = 0
+    elif not isinstance(exit_code, int):
+        stderr.write(u'{0}\n'.format(exit_code))
+        exit_code = 1
+    return exit_code, stdout.getvalue(), stderr.getvalue()
+
+
+def main():
+    # Keep private copies of request and response streams, so neither
+    # clients nor bash commands can read requests or spoil responses
+    requests = os.fdopen(os.dup(0), 'r')
+    responses = os.fdopen(os.dup(1), 'w')
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(2, 1)
+    patch_glance_stdin()
+
+    for line in iter(requests.readline, ''):
+        command = json.loads(line)['command']
+        parsed = parse(command)
+        if parsed is None:
+            exit_code, stdout, stderr = run_shell(command)
+        else:
+            exit_code, stdout, stderr = run_in_process(*parsed)
+        responses.write(json.dumps({'exit_code': exit_code,
+                                    'stdout': stdout,
+                                    'stderr': stderr}) + '\n')
+        responses.flush()
+
+
+if __name__ == '__main__':
+    main()
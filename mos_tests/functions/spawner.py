@@ -0,0 +1,307 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Quota-aware rate-limited spawner of many instances.
+
+Boot requests are issued through token bucket with bounded count of
+instances in flight (requested, but not ACTIVE yet). All instances are
+tracked with single `servers.list` call per poll; instances failed on
+scheduling are deleted and booted again. Each instance gets timestamps of
+boot request, ACTIVE status and ssh availability.
+"""
+
+from collections import deque
+import logging
+import threading
+import time
+
+from mos_tests.functions.common import parallel_map
+from mos_tests.functions.common import percentile
+
+
+logger = logging.getLogger(__name__)
+
+# Substrings of instance fault message, which are worth to retry
+RETRY_FAULTS = ('No valid host', 'Exceeded maximum number of retries')
+
+
+class TokenBucket(object):
+    """Thread-safe token bucket
+
+    :param rate: tokens per second
+    :param burst: max count of accumulated tokens
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.time()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until token is available and take it"""
+        while True:
+            with self._lock:
+                now = time.time()
+                self._tokens = min(self.burst, self._tokens +
+                                   (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+
+
+class InstanceRecord(object):
+    """Boot history of single instance"""
+
+    def __init__(self, name, boot_kwargs):
+        self.name = name
+        self.boot_kwargs = boot_kwargs
+        self.server_id = None
+        self.attempts = 0
+        self.status = None
+        self.fault = None
+        self.requested_at = None
+        self.active_at = None
+        self.ssh_ready_at = None
+
+    @property
+    def boot_time(self):
+        """Seconds from boot request to ACTIVE status"""
+        if self.active_at is None:
+            return None
+        return self.active_at - self.requested_at
+
+    @property
+    def ssh_time(self):
+        """Seconds from boot request to ssh availability"""
+        if self.ssh_ready_at is None:
+            return None
+        return self.ssh_ready_at - self.requested_at
+
+
+class SpawnResult(object):
+    """Records of spawned instances with latency statistics"""
+
+    def __init__(self, records, elapsed):
+        self.records = records
+        self.elapsed = elapsed
+
+    @property
+    def server_ids(self):
+        return [x.server_id for x in self.records if x.status == 'ACTIVE']
+
+    @property
+    def failed(self):
+        return [x for x in self.records if x.status != 'ACTIVE']
+
+    def percentiles(self, attr, percents=(50, 90, 95, 99, 100)):
+        """Return dict with percents as keys and percentiles of `attr`
+        ('boot_time' or 'ssh_time') of records as values
+        """
+        values = [getattr(x, attr) for x in self.records]
+        values = [x for x in values if x is not None]
+        return {p: percentile(values, p) for p in percents}
+
+    def format(self):
+        """Return human readable summary"""
+        lines = ['{0} instances in {1:.1f}s, {2} failed, {3} retries'.format(
+            len(self.records), self.elapsed, len(self.failed),
+            sum(x.attempts - 1 for x in self.records if x.attempts))]
+        for attr in ('boot_time', 'ssh_time'):
+            percentiles = self.percentiles(attr)
+            if percentiles[100] is None:
+                continue
+            lines.append('{0}: {1}'.format(attr, ', '.join(
+                'p{0}={1:.1f}s'.format(p, percentiles[p])
+                for p in sorted(percentiles))))
+        return '\n'.join(lines)
+
+
+class Spawner(object):
+    """Boot many instances with respect to quotas and capacity
+
+    :param os_conn: OpenStackActions
+    :param image_id: image id ('' for boot from volume)
+    :param flavor: flavor id
+    :param rate: boot requests per second
+    :param burst: max count of boot requests at once
+    :param max_in_flight: max count of instances, which are not ACTIVE yet
+    :param retries: count of reboots of instance after scheduling failure
+    :param wait_for_ssh: track ssh availability of ACTIVE instances
+    :param poll_interval: seconds between instances statuses polls
+    :param boot_kwargs: other `nova.servers.create` arguments
+    """
+
+    def __init__(self, os_conn, image_id, flavor, rate=2, burst=5,
+                 max_in_flight=20, retries=2, wait_for_ssh=False,
+                 poll_interval=5, **boot_kwargs):
+        self.os_conn = os_conn
+        self.nova = os_conn.nova
+        self.image_id = image_id
+        self.flavor = flavor
+        self.bucket = TokenBucket(rate, burst)
+        self.max_in_flight = max_in_flight
+        self.retries = retries
+        self.wait_for_ssh = wait_for_ssh
+        self.poll_interval = poll_interval
+        self.boot_kwargs = boot_kwargs
+        self.records = []
+
+    @property
+    def server_ids(self):
+        """Ids of all instances booted by last `spawn` call"""
+        return [x.server_id for x in self.records if x.server_id is not None]
+
+    def capacity(self):
+        """Return max count of instances of flavor, allowed by tenant quotas
+        (with current usage), or None if quotas are unlimited
+        """
+        flavor = self.nova.flavors.get(self.flavor)
+        limits = self.nova.limits.get().absolute
+        limits = {x.name: x.value for x in limits}
+        counts = []
+        for max_key, used_key, size in (
+                ('maxTotalInstances', 'totalInstancesUsed', 1),
+                ('maxTotalCores', 'totalCoresUsed', flavor.vcpus),
+                ('maxTotalRAMSize', 'totalRAMUsed', flavor.ram)):
+            if limits.get(max_key, -1) >= 0:
+                counts.append(
+                    (limits[max_key] - limits.get(used_key, 0)) // size)
+        logger.info('Limits: {0}'.format(limits))
+        if not counts:
+            return None
+        return max(min(counts), 0)
+
+    def hypervisors_capacity(self):
+        """Return count of instances of flavor, which fit into free RAM of
+        hypervisors without overcommit
+
+        It's an estimation only: nova scheduler applies
+        ram_allocation_ratio, which is not available through API.
+        """
+        flavor = self.nova.flavors.get(self.flavor)
+        stats = self.nova.hypervisors.statistics()
+        logger.info('Hypervisors free RAM: {0}MB'.format(stats.free_ram_mb))
+        return max(stats.free_ram_mb // flavor.ram, 0)
+
+    def _boot(self, record):
+        self.bucket.acquire()
+        kwargs = dict(self.boot_kwargs)
+        kwargs.update(record.boot_kwargs)
+        record.attempts += 1
+        record.status = 'BUILD'
+        record.requested_at = time.time()
+        try:
+            server = self.nova.servers.create(record.name, self.image_id,
+                                              self.flavor, **kwargs)
+            record.server_id = server.id
+        except Exception as e:
+            logger.warning('Boot of {0} failed: {1}'.format(record.name, e))
+            record.status = 'ERROR'
+            record.fault = str(e)
+
+    def _poll(self, records, prefix):
+        """Update statuses of records with single request"""
+        servers = {x.id: x for x in self.nova.servers.list(
+            search_opts={'name': '^' + prefix})}
+        now = time.time()
+        for record in records:
+            if record.status != 'BUILD' or record.server_id is None:
+                continue
+            server = servers.get(record.server_id)
+            if server is None:
+                continue
+            if server.status == 'ACTIVE':
+                record.status = 'ACTIVE'
+                record.active_at = now
+            elif server.status == 'ERROR':
+                record.status = 'ERROR'
+                record.fault = getattr(server, 'fault', {}).get('message')
+        if self.wait_for_ssh:
+            not_ready = [x for x in records if x.status == 'ACTIVE' and
+                         x.ssh_ready_at is None and x.server_id in servers]
+            ready = parallel_map(
+                lambda x: self.os_conn.is_server_ssh_ready(
+                    servers[x.server_id]), not_ready)
+            now = time.time()
+            for record, is_ready in zip(not_ready, ready):
+                if is_ready:
+                    record.ssh_ready_at = now
+
+    def _should_retry(self, record):
+        return (record.attempts <= self.retries and
+                any(x in (record.fault or '') for x in RETRY_FAULTS))
+
+    def spawn(self, count, prefix, boot_kwargs=None, timeout_seconds=None):
+        """Boot `count` instances and wait for them
+
+        :param count: count of instances
+        :param prefix: instances names prefix
+        :param boot_kwargs: list of per-instance `servers.create` arguments
+        :param timeout_seconds: timeout for all instances, by default
+            5 minutes plus time to issue all boot requests
+        :returns: SpawnResult
+        """
+        capacity = self.capacity()
+        assert capacity is None or count <= capacity, (
+            'Only {0} instances can be booted, but {1} are requested'.format(
+                capacity, count))
+        free = self.hypervisors_capacity()
+        if count > free:
+            logger.warning('{0} instances are requested, but only {1} fit '
+                           'into free RAM of hypervisors without '
+                           'overcommit'.format(count, free))
+        if timeout_seconds is None:
+            timeout_seconds = 5 * 60 + count / self.bucket.rate
+        boot_kwargs = boot_kwargs or [{}] * count
+        records = [InstanceRecord('{0}_{1}'.format(prefix, i), kwargs)
+                   for i, kwargs in enumerate(boot_kwargs)]
+        self.records = records
+        queue = deque(records)
+        in_flight = []
+        start = time.time()
+
+        def is_done(record):
+            if self.wait_for_ssh and record.status == 'ACTIVE':
+                return record.ssh_ready_at is not None
+            return record.status in ('ACTIVE', 'ERROR')
+
+        while queue or in_flight:
+            assert time.time() - start < timeout_seconds, (
+                'Instances are not ACTIVE in {0}s:\n{1}'.format(
+                    timeout_seconds, SpawnResult(records,
+                                                 timeout_seconds).format()))
+            to_boot = []
+            while queue and len(in_flight) + len(to_boot) < self.max_in_flight:
+                to_boot.append(queue.popleft())
+            parallel_map(self._boot, to_boot, workers=self.bucket.burst)
+            in_flight.extend(to_boot)
+            time.sleep(self.poll_interval)
+            self._poll(in_flight, prefix)
+            for record in [x for x in in_flight if is_done(x)]:
+                in_flight.remove(record)
+                if record.status == 'ERROR' and self._should_retry(record):
+                    logger.info('Retry boot of {0}: {1}'.format(
+                        record.name, record.fault))
+                    if record.server_id is not None:
+                        self.nova.servers.delete(record.server_id)
+                    record.server_id = None
+                    queue.append(record)
+
+        result = SpawnResult(records, time.time() - start)
+        logger.info(result.format())
+        return result
@@ -0,0 +1,202 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Heat stack waiter, driven by events API.
+
+Stack events (including events of nested stacks) are followed with marker,
+so each poll returns only new events. Stack itself is requested only when
+there are no new events or when stack-level event arrives. Poll interval
+grows while stack is idle and drops back on new events. Events are also
+used to collect per-resource timings.
+"""
+
+from collections import OrderedDict
+from datetime import datetime
+import logging
+import time
+
+from heatclient.exc import HTTPNotFound
+
+
+logger = logging.getLogger(__name__)
+
+TIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+
+def parse_time(value):
+    """Parse heat event time like '2016-05-04T11:04:10Z'"""
+    return datetime.strptime(value[:19], TIME_FORMAT)
+
+
+def event_stack_name(event):
+    """Return name of stack of event from its links"""
+    for link in getattr(event, 'links', []):
+        if link.get('rel') == 'stack':
+            return link['href'].rstrip('/').split('/')[-2]
+
+
+class ResourceTiming(object):
+    """Timestamps of last action of single stack resource"""
+
+    def __init__(self, stack_name, resource_name):
+        self.stack_name = stack_name
+        self.resource_name = resource_name
+        self.action = None
+        self.status = None
+        self.reason = None
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def name(self):
+        return '{0}/{1}'.format(self.stack_name, self.resource_name)
+
+    @property
+    def duration(self):
+        """Seconds from IN_PROGRESS to final event of last action"""
+        if self.started_at is None or self.finished_at is None:
+            return None
+        return (self.finished_at - self.started_at).total_seconds()
+
+    def update(self, event):
+        action, _, status = event.resource_status.partition('_')
+        event_time = parse_time(event.event_time)
+        if status == 'IN_PROGRESS' or action != self.action:
+            self.action = action
+            self.started_at = event_time
+            self.finished_at = None
+        if status != 'IN_PROGRESS':
+            self.finished_at = event_time
+        self.status = event.resource_status
+        self.reason = event.resource_status_reason
+
+
+class StackWatcher(object):
+    """Follower of stack events
+
+    :param heat: heat client
+    :param stack_id: stack id
+    :param nested_depth: depth of nested stacks to follow events of
+    :param skip_existing: ignore events, which exist before first poll
+        (for watching of update of existing stack)
+    :param min_interval: seconds between polls while there are new events
+    :param max_interval: max seconds between polls of idle stack
+    :param backoff: multiplier of interval for each idle poll
+    """
+
+    def __init__(self, heat, stack_id, nested_depth=3, skip_existing=False,
+                 min_interval=1, max_interval=15, backoff=1.5):
+        self.heat = heat
+        self.stack_id = stack_id
+        self.nested_depth = nested_depth
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.marker = None
+        self.resources = OrderedDict()
+        self.requests = 0
+        if skip_existing:
+            self.skip_existing()
+
+    def _list_events(self, **kwargs):
+        self.requests += 1
+        try:
+            return self.heat.events.list(self.stack_id,
+                                         nested_depth=self.nested_depth,
+                                         **kwargs)
+        except HTTPNotFound:
+            return []
+
+    def skip_existing(self):
+        """Move marker to the last existing event"""
+        events = self._list_events(sort_dir='desc', limit=1)
+        if events:
+            self.marker = events[0].id
+
+    def poll(self):
+        """Return list of new events and update resources timings"""
+        kwargs = {'sort_dir': 'asc'}
+        if self.marker is not None:
+            kwargs['marker'] = self.marker
+        events = self._list_events(**kwargs)
+        for event in events:
+            stack_name = event_stack_name(event)
+            key = (stack_name, event.resource_name)
+            if key not in self.resources:
+                self.resources[key] = ResourceTiming(*key)
+            self.resources[key].update(event)
+        if events:
+            self.marker = events[-1].id
+        return events
+
+    def stack_status(self):
+        """Return current status of stack"""
+        self.requests += 1
+        try:
+            return self.heat.stacks.get(self.stack_id).stack_status
+        except HTTPNotFound:
+            return 'DELETE_COMPLETE'
+
+    def _is_stack_event(self, event):
+        return event.physical_resource_id == self.stack_id
+
+    def wait(self, timeout_seconds=10 * 60):
+        """Wait until stack is not IN_PROGRESS
+
+        :returns: last stack status (it's IN_PROGRESS on timeout)
+        """
+        end_time = time.time() + timeout_seconds
+        interval = self.min_interval
+        while True:
+            events = self.poll()
+            status = None
+            if not events or any(self._is_stack_event(x) for x in events):
+                status = self.stack_status()
+                if not status.endswith('_IN_PROGRESS'):
+                    break
+            if time.time() > end_time:
+                status = status or self.stack_status()
+                logger.warning('Stack {0} is still {1} after {2}s'.format(
+                    self.stack_id, status, timeout_seconds))
+                break
+            if events:
+                interval = self.min_interval
+            else:
+                interval = min(interval * self.backoff, self.max_interval)
+            time.sleep(interval)
+        logger.info('Stack {0} is {1} ({2} requests)\n{3}'.format(
+            self.stack_id, status, self.requests, self.format()))
+        return status
+
+    def timings(self):
+        """Return list of ResourceTiming, longest first"""
+        return sorted(self.resources.values(),
+                      key=lambda x: x.duration or 0, reverse=True)
+
+    def failed(self):
+        """Return list of ResourceTiming of failed resources"""
+        return [x for x in self.resources.values()
+                if x.status and x.status.endswith('_FAILED')]
+
+    def format(self, top=10):
+        """Return report of `top` longest resources and failed ones"""
+        lines = []
+        for timing in self.timings()[:top]:
+            if timing.duration is None:
+                continue
+            lines.append('{0}: {1} in {2:.0f}s'.format(
+                timing.name, timing.status, timing.duration))
+        for timing in self.failed():
+            lines.append('{0}: {1}: {2}'.format(timing.name, timing.status,
+                                                timing.reason))
+        return '\n'.join(lines)
@@ -0,0 +1,243 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Remote tcpdump captures with compressed transfer over ssh."""
+
+from contextlib import contextmanager
+import logging
+import threading
+import time
+import uuid
+import zlib
+
+from six.moves import shlex_quote
+
+from mos_tests.environment.ssh import CalledProcessError
+from mos_tests.functions.common import gen_temp_file
+from mos_tests.functions.common import wait
+from mos_tests.functions.pcap import PCAP_HEADER_SIZE
+
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+
+def gunzip_channel(chan, target, skip=0):
+    """Decompress gzip stream from ssh channel to file object
+
+    :param chan: paramiko channel with gzip stream on stdout
+    :param target: file object to write decompressed data to
+    :param skip: count of decompressed bytes to drop from stream start
+    :returns: tuple (received bytes, written bytes)
+    """
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    received = written = 0
+    while True:
+        chunk = chan.recv(CHUNK_SIZE)
+        if chunk:
+            data = decompressor.decompress(chunk)
+        else:
+            data = decompressor.flush()
+        if skip:
+            dropped = min(skip, len(data))
+            data = data[dropped:]
+            skip -= dropped
+        target.write(data)
+        received += len(chunk)
+        written += len(data)
+        if not chunk:
+            return received, written
+
+
+class RemoteCapture(object):
+    """tcpdump, running on remote node
+
+    Capture is streamed gzip compressed over ssh channel to local `path`
+    while tcpdump runs. If `ring_size` is set, tcpdump writes remote ring
+    buffer (`ring_count` files of `ring_size` MB) instead, and it is fetched
+    compressed on stop.
+
+    :param remote: connected SSHClient to node
+    :param path: local path to write pcap file to
+    :param interface: interface to capture on
+    :param bpf_filter: capture filter expression
+    :param snaplen: bytes to capture from each packet, 0 for whole packet
+    :param netns: network namespace to run tcpdump in
+    :param ring_size: size of remote ring buffer file in MB
+    :param ring_count: count of remote ring buffer files
+    """
+
+    def __init__(self, remote, path, interface='any', bpf_filter='',
+                 snaplen=0, netns=None, ring_size=None, ring_count=10):
+        self.remote = remote
+        self.path = path
+        self.interface = interface
+        self.bpf_filter = bpf_filter
+        self.snaplen = snaplen
+        self.netns = netns
+        self.ring_size = ring_size
+        self.ring_count = ring_count
+
+        self.bytes_received = 0
+        self.bytes_written = 0
+        self.duration = None
+
+        self._remote_path = '/tmp/capture-{0}'.format(uuid.uuid4().hex[:8])
+        self._pidfile = self._remote_path + '.pid'
+        self._ring_path = self._remote_path + '.pcap'
+        self._chan = None
+        self._thread = None
+        self._stderr = b''
+        self._start_time = None
+
+    def __repr__(self):
+        return '<RemoteCapture {0}:{1} {2!r}>'.format(
+            self.remote.host, self.interface, self.bpf_filter)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *err):
+        self.stop()
+
+    @property
+    def command(self):
+        tcpdump = 'tcpdump -U -n -s {snaplen} -i {interface}'.format(
+            snaplen=self.snaplen, interface=self.interface)
+        if self.ring_size:
+            tcpdump += ' -C {size} -W {count} -w {path}'.format(
+                size=self.ring_size, count=self.ring_count,
+                path=self._ring_path)
+        else:
+            tcpdump += ' -w -'
+        if self.bpf_filter:
+            tcpdump += ' {0}'.format(shlex_quote(self.bpf_filter))
+        if self.netns is not None:
+            tcpdump = 'ip netns exec {0} {1}'.format(self.netns, tcpdump)
+        # Save tcpdump pid to be able to stop exactly this capture
+        cmd = 'sh -c {0}'.format(shlex_quote(
+            'echo $$ > {0}; exec {1}'.format(self._pidfile, tcpdump)))
+        if not self.ring_size:
+            cmd += ' | gzip -1 -c'
+        return cmd
+
+    def _is_listening(self):
+        while self._chan.recv_stderr_ready():
+            self._stderr += self._chan.recv_stderr(CHUNK_SIZE)
+        if b'listening on' in self._stderr:
+            return True
+        if self._chan.exit_status_ready():
+            raise CalledProcessError(self.command,
+                                     self._chan.recv_exit_status(),
+                                     [self._stderr])
+        return False
+
+    def _receive(self):
+        with open(self.path, 'wb') as f:
+            self.bytes_received, self.bytes_written = gunzip_channel(
+                self._chan, f)
+
+    def start(self):
+        logger.info('Start tcpdump on {0}'.format(self.remote.host))
+        self._start_time = time.time()
+        self._chan, _, _, _ = self.remote.execute_async(self.command)
+        try:
+            wait(self._is_listening, timeout_seconds=60, sleep_seconds=0.5,
+                 waiting_for='tcpdump to start on {0}'.format(
+                     self.remote.host))
+        except Exception:
+            self.stop()
+            raise
+        if not self.ring_size:
+            self._thread = threading.Thread(target=self._receive)
+            self._thread.daemon = True
+            self._thread.start()
+        return self
+
+    def _kill(self, signal):
+        self.remote.execute(
+            'test -f {pid} && kill -{signal} $(cat {pid})'.format(
+                pid=self._pidfile, signal=signal), verbose=False)
+
+    def _fetch_ring(self):
+        result = self.remote.execute('ls -tr {0}*'.format(self._ring_path))
+        files = [x.strip() for x in result['stdout']]
+        with open(self.path, 'wb') as f:
+            for i, name in enumerate(files):
+                chan, _, _, _ = self.remote.execute_async(
+                    'gzip -1 -c {0}'.format(name))
+                # Each ring file starts with own pcap header
+                received, written = gunzip_channel(
+                    chan, f, skip=PCAP_HEADER_SIZE if i else 0)
+                chan.recv_exit_status()
+                chan.close()
+                self.bytes_received += received
+                self.bytes_written += written
+
+    def stop(self):
+        """Stop tcpdump and wait for capture transfer to finish"""
+        if self._chan is None:
+            return
+        try:
+            self._kill('INT')
+            try:
+                wait(self._chan.exit_status_ready, timeout_seconds=30,
+                     sleep_seconds=0.5,
+                     waiting_for='tcpdump to stop on {0}'.format(
+                         self.remote.host))
+            except Exception:
+                self._kill('KILL')
+            if self._thread is not None:
+                self._thread.join(60)
+            if self.ring_size:
+                self._fetch_ring()
+        finally:
+            self._chan.close()
+            self._chan = None
+            self.remote.execute('rm -f {0}*'.format(self._remote_path),
+                                verbose=False)
+            self.duration = time.time() - self._start_time
+        logger.info(
+            'tcpdump on {host} is stopped: {written} bytes captured '
+            '({received} bytes transferred) in {duration:.1f}s'.format(
+                host=self.remote.host, written=self.bytes_written,
+                received=self.bytes_received, duration=self.duration))
+
+
+@contextmanager
+def capture_on_nodes(nodes, **kwargs):
+    """Run RemoteCapture on each node in `nodes` before enter, stop after
+
+    Yields dict with node fqdn as keys and RemoteCapture as values. Captures
+    are written to temporary files.
+
+    :param nodes: list of fuel nodes
+    :param kwargs: RemoteCapture arguments
+    """
+    remotes = []
+    captures = {}
+    try:
+        for node in nodes:
+            remote = node.ssh()
+            remotes.append(remote)
+            remote.reconnect()
+            path = gen_temp_file(prefix='capture', suffix='.pcap').name
+            captures[node.data['fqdn']] = RemoteCapture(
+                remote, path, **kwargs).start()
+        yield captures
+    finally:
+        for capture in captures.values():
+            capture.stop()
+        for remote in remotes:
+            remote.clear()
@@ -0,0 +1,273 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Declarative network topology builder.
+
+Topology is described with dict (it can be loaded from yaml as well)::
+
+    {
+        'networks': {
+            'net01': {'cidr': '192.168.1.0/24'},
+            'net02': {'cidr': '192.168.2.0/24'},
+        },
+        'routers': {
+            'router01': {'gateway': True, 'networks': ['net01', 'net02']},
+        },
+        'security_groups': {
+            'ssh': {},  # rules allowing ssh and ping by default
+        },
+        'keypairs': ['instancekey'],
+        'servers': {
+            'server01': {'network': 'net01', 'host': 'node-4.domain.tld',
+                         'security_groups': ['ssh'], 'keypair': 'instancekey',
+                         'floating_ip': True},
+        },
+    }
+
+Resources are created by stages; resources inside a stage don't depend on
+each other and are created concurrently:
+
+    1. networks, routers, security groups and keypairs
+    2. subnets and routers gateways
+    3. routers interfaces and servers
+    4. floating ips
+"""
+
+import logging
+import time
+
+from mos_tests.environment.provisioning import SSH_PING_RULES
+from mos_tests.functions.common import parallel_map
+from mos_tests.functions.common import wait
+
+
+logger = logging.getLogger(__name__)
+
+
+class Topology(object):
+    """Created topology resources, addressed by names from spec
+
+    :param os_conn: OpenStackActions, which was used to create resources
+    """
+
+    def __init__(self, os_conn):
+        self.os_conn = os_conn
+        self.networks = {}
+        self.subnets = {}
+        self.routers = {}
+        self.security_groups = {}
+        self.keypairs = {}
+        self.servers = {}
+        self.floating_ips = {}
+        self.router_interfaces = []
+        self.router_gateways = []
+
+    def __repr__(self):
+        return ('<Topology: {0} networks, {1} routers, {2} servers>'.format(
+            len(self.networks), len(self.routers), len(self.servers)))
+
+    def server_ips(self, name):
+        """Return dict with fixed and floating ip of server"""
+        return self.os_conn.get_nova_instance_ips(self.servers[name])
+
+    def teardown(self):
+        """Delete all created resources in reverse order"""
+        os_conn = self.os_conn
+        parallel_map(os_conn.nova.floating_ips.delete,
+                     self.floating_ips.values())
+        self.floating_ips = {}
+
+        servers = list(self.servers.values())
+        parallel_map(lambda x: x.delete(), servers)
+        wait(lambda: not [x for x in os_conn.nova.servers.list()
+                          if x.id in [y.id for y in servers]],
+             timeout_seconds=3 * 60, sleep_seconds=5,
+             waiting_for='topology servers to be deleted')
+        self.servers = {}
+
+        parallel_map(lambda x: os_conn.neutron.remove_interface_router(
+            x[0], {'subnet_id': x[1]}), self.router_interfaces)
+        self.router_interfaces = []
+        parallel_map(os_conn.neutron.remove_gateway_router,
+                     self.router_gateways)
+        self.router_gateways = []
+        parallel_map(lambda x: os_conn.neutron.delete_router(x['id']),
+                     self.routers.values())
+        self.routers = {}
+
+        parallel_map(lambda x: os_conn.delete_subnet(x['id']),
+                     self.subnets.values())
+        self.subnets = {}
+        parallel_map(lambda x: os_conn.delete_network(x['id']),
+                     self.networks.values())
+        self.networks = {}
+
+        parallel_map(os_conn.nova.security_groups.delete,
+                     self.security_groups.values())
+        self.security_groups = {}
+        parallel_map(os_conn.nova.keypairs.delete, self.keypairs.values())
+        self.keypairs = {}
+
+
+class TopologyBuilder(object):
+    """Create resources from topology spec
+
+    :param os_conn: OpenStackActions
+    :param spec: topology description (see module docstring)
+    :param workers: max count of concurrent API calls
+    """
+
+    def __init__(self, os_conn, spec, workers=10):
+        self.os_conn = os_conn
+        self.spec = spec
+        self.workers = workers
+        self.topology = Topology(os_conn)
+
+    def _run_stage(self, name, tasks):
+        """Run (function, args) tasks concurrently"""
+        if not tasks:
+            return
+        start = time.time()
+        parallel_map(lambda task: task[0](*task[1:]), tasks,
+                     workers=self.workers)
+        logger.info('Topology stage "{0}": {1} tasks in {2:.1f}s'.format(
+            name, len(tasks), time.time() - start))
+
+    def _create_network(self, name):
+        network = self.os_conn.create_network(name=name)['network']
+        self.topology.networks[name] = network
+
+    def _create_subnet(self, name, params):
+        subnet = self.os_conn.create_subnet(
+            network_id=self.topology.networks[name]['id'],
+            name=params.get('subnet_name', '{0}__subnet'.format(name)),
+            cidr=params['cidr'],
+            dns_nameservers=params.get('dns_nameservers'))['subnet']
+        self.topology.subnets[name] = subnet
+
+    def _create_router(self, name, params):
+        router = self.os_conn.create_router(
+            name=name, distributed=params.get('distributed', False))['router']
+        self.topology.routers[name] = router
+
+    def _add_gateway(self, name):
+        router_id = self.topology.routers[name]['id']
+        self.os_conn.router_gateway_add(
+            router_id=router_id, network_id=self.os_conn.ext_network['id'])
+        self.topology.router_gateways.append(router_id)
+
+    def _add_interface(self, name, network):
+        router_id = self.topology.routers[name]['id']
+        subnet_id = self.topology.subnets[network]['id']
+        self.os_conn.router_interface_add(router_id=router_id,
+                                          subnet_id=subnet_id)
+        self.topology.router_interfaces.append((router_id, subnet_id))
+
+    def _create_security_group(self, name, params):
+        group = self.os_conn.nova.security_groups.create(
+            name, params.get('description', name))
+        self.os_conn.create_security_group_rules(
+            group.id, params.get('rules', SSH_PING_RULES))
+        self.topology.security_groups[name] = group
+
+    def _create_keypair(self, name):
+        self.topology.keypairs[name] = self.os_conn.create_key(key_name=name)
+
+    def _create_server(self, name, params):
+        topology = self.topology
+        kwargs = {
+            'nics': [{'net-id': topology.networks[params['network']]['id']}],
+        }
+        if 'host' in params:
+            kwargs['availability_zone'] = 'nova:{0}'.format(params['host'])
+        if 'security_groups' in params:
+            kwargs['security_groups'] = [
+                topology.security_groups[x].id
+                for x in params['security_groups']]
+        if 'keypair' in params:
+            kwargs['key_name'] = topology.keypairs[params['keypair']].name
+        for key in ('image_id', 'flavor'):
+            if key in params:
+                kwargs[key] = params[key]
+        topology.servers[name] = self.os_conn.create_server(
+            name=name, wait_for_active=False, wait_for_avaliable=False,
+            **kwargs)
+
+    def _assign_floating_ip(self, name):
+        server = self.topology.servers[name]
+        self.topology.floating_ips[name] = self.os_conn.assign_floating_ip(
+            server)
+
+    def _wait_servers(self, wait_for_ssh):
+        os_conn = self.os_conn
+        servers = self.topology.servers
+        pending = set(servers)
+
+        def is_all_active():
+            for name in list(pending):
+                if os_conn.is_server_active(servers[name]):
+                    servers[name] = os_conn.get_instance_detail(servers[name])
+                    pending.discard(name)
+            return not pending
+
+        wait(is_all_active, timeout_seconds=5 * 60, sleep_seconds=5,
+             waiting_for='topology servers to become ACTIVE')
+        if wait_for_ssh and os_conn.env is not None:
+            wait(lambda: all(parallel_map(os_conn.is_server_ssh_ready,
+                                          servers.values())),
+                 timeout_seconds=5 * 60, sleep_seconds=5,
+                 waiting_for='topology servers available via ssh')
+
+    def build(self, wait_for_ssh=True):
+        """Create all resources from spec
+
+        :param wait_for_ssh: wait until servers are available via ssh
+        :returns: Topology
+        """
+        spec = self.spec
+        networks = spec.get('networks', {})
+        routers = spec.get('routers', {})
+        servers = spec.get('servers', {})
+        start = time.time()
+
+        self._run_stage('networks, routers, security groups, keypairs', (
+            [(self._create_network, x) for x in networks] +
+            [(self._create_router, x, y) for x, y in routers.items()] +
+            [(self._create_security_group, x, y)
+             for x, y in spec.get('security_groups', {}).items()] +
+            [(self._create_keypair, x) for x in spec.get('keypairs', [])]))
+
+        self._run_stage('subnets, gateways', (
+            [(self._create_subnet, x, y) for x, y in networks.items()] +
+            [(self._add_gateway, x) for x, y in routers.items()
+             if y.get('gateway')]))
+
+        self._run_stage('interfaces, servers', (
+            [(self._add_interface, x, net) for x, y in routers.items()
+             for net in y.get('networks', [])] +
+            [(self._create_server, x, y) for x, y in servers.items()]))
+        if servers:
+            self._wait_servers(wait_for_ssh)
+
+        self._run_stage('floating ips', [
+            (self._assign_floating_ip, x) for x, y in servers.items()
+            if y.get('floating_ip')])
+
+        logger.info('{0!r} is built in {1:.1f}s'.format(
+            self.topology, time.time() - start))
+        return self.topology
+
+
+def build_topology(os_conn, spec, wait_for_ssh=True):
+    """Create resources from topology spec and return Topology"""
+    return TopologyBuilder(os_conn, spec).build(wait_for_ssh=wait_for_ssh)
@@ -96,33 +96,28 @@ def controller_remote(env):
         yield remote
 
 
-@pytest.fixture
-def openstack_client(controller_remote):
-    return os_cli.OpenStack(controller_remote)
-
-
 @pytest.fixture(params=['1', '2'], ids=['api v1', 'api v2'])
-def glance_remote(request, controller_remote):
+def glance_remote(request, controller_remote, cli_session):
     # TODO(gdyuldin) Replace with glance fixture after
     # https://review.openstack.org/284355 will be merged
     flags = '--os-image-api-version {0.param}'.format(request)
-    return partial(os_cli.Glance(controller_remote), flags=flags,
-                   prefix='env PYTHONIOENCODING=UTF-8')
+    return partial(os_cli.Glance(controller_remote, session=cli_session),
+                   flags=flags, prefix='env PYTHONIOENCODING=UTF-8')
 
 
 @pytest.yield_fixture
-def project(openstack_client, suffix):
+def project(os_conn, suffix):
     project_name = "project_{}".format(suffix[:6])
-    project = openstack_client.project_create(project_name)
+    project = os_conn.identity.project_create(project_name)
     yield project
-    openstack_client.project_delete(project['id'])
+    os_conn.identity.project_delete(project['id'])
 
 
 @pytest.yield_fixture
-def user(openstack_client, suffix, project):
+def user(os_conn, suffix, project):
     name = "user_{}".format(suffix[:6])
     password = "password"
-    user = openstack_client.user_create(name=name, password=password,
-                                project=project['id'])
+    user = os_conn.identity.user_create(name=name, password=password,
+                                        project=project['id'])
     yield user
-    openstack_client.user_delete(user['id'])
+    os_conn.identity.user_delete(user['id'])
@@ -52,7 +52,7 @@ def check_image_active(glance, image):
 def calc_md5(filename):
     with open(filename, 'r') as f:
         md5 = hashlib.md5()
-        for chunk in iter(lambda: f.read(1024), ''):
+        for chunk in iter(lambda: f.read(1024 ** 2), ''):
             md5.update(chunk)
     return md5.hexdigest()
 
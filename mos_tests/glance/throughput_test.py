@@ -0,0 +1,74 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import logging
+
+from glanceclient import Client as GlanceClient
+import pytest
+
+from mos_tests.functions.glance_bench import GlanceBench
+from mos_tests.functions.glance_bench import MB
+from mos_tests import settings
+
+
+logger = logging.getLogger(__name__)
+
+pytestmark = pytest.mark.undestructive
+
+
+def get_glance_client(os_conn, api_version):
+    endpoint = os_conn.keystone.service_catalog.url_for(
+        service_type='image', endpoint_type='publicURL')
+    return GlanceClient(str(api_version), endpoint=endpoint,
+                        token=os_conn.keystone.auth_token,
+                        cacert=os_conn.path_to_cert)
+
+
+def get_glance_backend(env):
+    """Return default store of glance-api on first controller"""
+    with env.get_nodes_by_role('controller')[0].ssh() as remote:
+        result = remote.execute(
+            "awk -F ' *= *' '/^default_store/ {print $2}' "
+            "/etc/glance/glance-api.conf")
+    return result.stdout_string or 'unknown'
+
+
+@pytest.mark.parametrize('api_version', [1, 2], ids=['api v1', 'api v2'])
+def test_upload_download_throughput(env, os_conn, api_version, suffix):
+    """Measure throughput of images upload and download
+
+    Scenario:
+        1. For each size from GLANCE_BENCH_SIZES and each count of clients
+            from GLANCE_BENCH_CONCURRENCY:
+            1. Upload images with generated data by all clients at once
+            2. Download all images at once
+            3. Check that checksums of sent and received data are equal
+                to checksums, reported by glance
+            4. Delete images
+        2. Log throughput and latencies report
+    """
+    bench = GlanceBench(get_glance_client(os_conn, api_version), api_version)
+    tags = {'backend': get_glance_backend(env)}
+    reports = []
+    for size in settings.GLANCE_BENCH_SIZES:
+        for concurrency in settings.GLANCE_BENCH_CONCURRENCY:
+            reports.append(bench.run(
+                size * MB, concurrency,
+                prefix='bench_{0}_{1}'.format(suffix[:6], size), tags=tags))
+
+    logger.info('Glance throughput:\n{0}'.format(
+        '\n'.join(x.format() for x in reports)))
+    failed = [x for report in reports for x in report.failed]
+    assert not failed, '{0} transfers failed or have wrong checksums'.format(
+        len(failed))
@@ -21,6 +21,7 @@ import pytest
 
 from mos_tests.functions.base import OpenStackTestCase
 from mos_tests.functions import common as common_functions
+from mos_tests.functions.image_cache import get_or_upload_image
 from mos_tests import settings
 
 
@@ -564,31 +565,22 @@ class HeatIntegrationTests(OpenStackTestCase):
         """
         stack_name = 'image_stack'
         template_name = 'cirros_image_tmpl.yaml'
-        template_path = os.path.join(self.templates_dir, template_name)
-        try:
-            create_template = common_functions.read_template(
-                self.templates_dir, template_name)
-            sid = common_functions.create_stack(
-                self.heat, stack_name, create_template)
-            self.uid_list.append(sid)
-            first_resource_id = common_functions.get_resource_id(
-                self.heat, sid)
-            format_change = {'disk_format': 'ami', 'container_format': 'ami'}
-            common_functions.update_template_file(
-                template_path, 'format', **format_change)
-            update_template = common_functions.read_template(
-                self.templates_dir, template_name)
-            common_functions.update_stack(self.heat, sid, update_template)
-            second_resource_id = common_functions.get_resource_id(
-                self.heat, sid)
-            self.assertNotEqual(first_resource_id, second_resource_id,
-                                msg='Resource id should be changed'
-                                    ' after modifying stack')
-        finally:
-            back_format_change = {'disk_format': 'qcow2',
-                                  'container_format': 'bare'}
-            common_functions.update_template_file(
-                template_path, 'format', **back_format_change)
+        create_template = common_functions.read_template(
+            self.templates_dir, template_name)
+        sid = common_functions.create_stack(
+            self.heat, stack_name, create_template)
+        self.uid_list.append(sid)
+        first_resource_id = common_functions.get_resource_id(
+            self.heat, sid)
+        format_change = {'disk_format': 'ami', 'container_format': 'ami'}
+        update_template = common_functions.change_template(
+            self.templates_dir, template_name, 'format', **format_change)
+        common_functions.update_stack(self.heat, sid, update_template)
+        second_resource_id = common_functions.get_resource_id(
+            self.heat, sid)
+        self.assertNotEqual(first_resource_id, second_resource_id,
+                            msg='Resource id should be changed'
+                                ' after modifying stack')
 
     @pytest.mark.testrail_id('631883')
     def test_heat_stack_update_in_place(self):
@@ -603,7 +595,6 @@ class HeatIntegrationTests(OpenStackTestCase):
         """
         stack_name = 'vm_stack'
         template_name = 'nova_server.yaml'
-        template_path = os.path.join(self.templates_dir, template_name)
         try:
             networks = self.neutron.list_networks()
             if len(networks['networks']) < 2:
@@ -617,10 +608,8 @@ class HeatIntegrationTests(OpenStackTestCase):
             first_resource_id = common_functions.get_specific_resource_id(
                 self.heat, sid, 'vm')
             flavor_change = {'flavor': 'm1.small'}
-            common_functions.update_template_file(template_path, 'flavor',
-                                                  **flavor_change)
-            update_template = common_functions.read_template(
-                self.templates_dir, template_name)
+            update_template = common_functions.change_template(
+                self.templates_dir, template_name, 'flavor', **flavor_change)
             common_functions.update_stack(self.heat, sid, update_template,
                                           parameters)
             second_resource_id = common_functions.get_specific_resource_id(
@@ -630,9 +619,6 @@ class HeatIntegrationTests(OpenStackTestCase):
                 msg='Resource id should not be changed after modifying stack')
         finally:
             common_functions.delete_stack(self.heat, sid)
-            back_flavor_change = {'flavor': 'm1.tiny'}
-            common_functions.update_template_file(template_path, 'flavor',
-                                                  **back_flavor_change)
 
     @pytest.mark.testrail_id('631867')
     def test_heat_stack_show(self):
@@ -1119,7 +1105,7 @@ class HeatIntegrationTests(OpenStackTestCase):
 
         Steps:
         1. Download custom Fedora image
-        2. Create image in Glance and check status
+        2. Create image in Glance (or reuse cached one) and check status
         3. With Nova create new key-pair
         4. Find internal network ID
         5. Find name of public network
@@ -1139,21 +1125,14 @@ class HeatIntegrationTests(OpenStackTestCase):
         # Download image on node. Like: /tmp/fedora-software-config.qcow2
         image_path = self.fedora_docker_image()
 
-        # Create image in Glance
-        image = self.glance.images.create(name=image_name,
-                                          os_distro='Fedora',
-                                          disk_format='qcow2',
-                                          visibility='public',
-                                          container_format='bare')
-        # Check that status is 'queued'
-        if image.status != 'queued':
-            raise AssertionError("ERROR: Image status after creation is:"
-                                 "[{0}]. "
-                                 "Expected [queued]".format(image.status))
-
-        # Put image-file in created Image
-        with open(image_path, 'rb') as image_content:
-            self.glance.images.upload(image.id, image_content)
+        # Create image in Glance or reuse image with the same content.
+        # Image is not deleted after test to be reused by next runs
+        image = get_or_upload_image(self.glance, image_path,
+                                    name='543346_Fedora-docker',
+                                    os_distro='Fedora',
+                                    disk_format='qcow2',
+                                    visibility='public',
+                                    container_format='bare')
 
         # Check that status of image is 'active'
         self.assertEqual(
@@ -1201,7 +1180,7 @@ class HeatIntegrationTests(OpenStackTestCase):
                                             template,
                                             {'key': image_name,
                                              'flavor': 'm1.small',
-                                             'image': image_name,
+                                             'image': image.id,
                                              'public_net': pub_network_name,
                                              'int_network_id': int_network_id,
                                              'timeout': 600},
@@ -1248,7 +1227,5 @@ class HeatIntegrationTests(OpenStackTestCase):
         common_functions.delete_stack(self.heat, docker_uid)
         # Delete host stack with tearDown:
         self.uid_list.append(uid)
-        # Delete image:
-        self.glance.images.delete(image.id)
         # Delete keypair:
         keypair.delete()
@@ -0,0 +1,88 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import logging
+import os
+
+import pytest
+import yaml
+
+from mos_tests.functions import common
+from mos_tests.functions.heat_load import DELETE
+from mos_tests.functions.heat_load import HeatLoad
+from mos_tests.functions.heat_load import unique_parameters
+from mos_tests import settings
+
+
+logger = logging.getLogger(__name__)
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'templates')
+
+
+def dump(data):
+    return yaml.safe_dump(data, default_flow_style=False)
+
+
+@pytest.yield_fixture
+def heat_load(os_conn):
+    load = HeatLoad(os_conn.heat, concurrency=settings.HEAT_LOAD_CONCURRENCY)
+    yield load
+    # Remove stacks, which are left after failed steps
+    created = {x.stack_id for x in load.operations if x.stack_id}
+    deleted = {x.stack_id for x in load.operations
+               if x.action == DELETE and x.done_at is not None}
+    for stack_id in created - deleted:
+        common.delete_stack(os_conn.heat, stack_id)
+
+
+@pytest.mark.undestructive
+@pytest.mark.parametrize('template_name', settings.HEAT_LOAD_TEMPLATES)
+def test_stacks_load(heat_load, template_name):
+    """Create, update and delete many stacks from template at once
+
+    Steps:
+        1. Create HEAT_LOAD_STACKS stacks from template
+        2. Wait for all stacks to be CREATE_COMPLETE
+        3. Update all stacks with additional resource
+        4. Wait for all stacks to be UPDATE_COMPLETE
+        5. Delete all stacks
+        6. Wait for all stacks to be deleted
+        7. Check that there are no failed operations
+    """
+    data = common.load_template(TEMPLATES_DIR, template_name)
+    count = settings.HEAT_LOAD_STACKS
+
+    def parameters(i):
+        return unique_parameters(data, i)
+
+    created = heat_load.create(dump(data), count,
+                               prefix='load_{0}'.format(
+                                   template_name.split('.')[0]),
+                               parameters=parameters)
+    heat_load.wait(created)
+
+    data['resources'] = data.get('resources') or {}
+    data['resources']['load_update'] = {'type': 'OS::Heat::RandomString'}
+    updated = heat_load.update(created, dump(data), parameters=parameters)
+    heat_load.wait(updated)
+
+    deleted = heat_load.delete(created)
+    heat_load.wait(deleted)
+
+    report = heat_load.report()
+    logger.info('{0} stacks of {1}:\n{2}'.format(count, template_name,
+                                                 report.format()))
+    assert not report.failed, '\n'.join(
+        '{0.action} of {0.name}: {0.error}'.format(x) for x in report.failed)
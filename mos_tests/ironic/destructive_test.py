@@ -16,16 +16,16 @@ import json
 import os
 import shutil
 import socket
-import tarfile
 import time
 
 from Crypto.PublicKey import RSA
 from ironicclient import client
 import pytest
-from six.moves import urllib
 
 from mos_tests.environment import devops_client
 from mos_tests.functions import common
+from mos_tests.functions.image_cache import get_or_upload_image
+from mos_tests.functions.image_cache import ImageCache
 from mos_tests import settings
 
 
@@ -111,25 +111,21 @@ def flavor(baremetal_node, os_conn):
     flavor.delete()
 
 
-@pytest.yield_fixture
+@pytest.fixture
 def ubuntu_image(os_conn):
-    image = os_conn.glance.images.create(
+    # Image is cached locally and in Glance, so it's not deleted
+    cache = ImageCache()
+    path = cache.extract(cache.get(settings.IRONIC_IMAGE_URL))
+    return get_or_upload_image(
+        os_conn.glance, path,
         name='ironic_trusty',
         disk_format='raw',
         container_format='bare',
+        cache=cache,
         hypervisor_type='baremetal',
         cpu_arch='x86_64',
         fuel_disk_info=json.dumps(settings.IRONIC_GLANCE_DISK_INFO))
 
-    src = urllib.request.urlopen(settings.IRONIC_IMAGE_URL)
-    with tarfile.open(fileobj=src, mode='r|gz') as tar:
-        img = tar.extractfile(tar.firstmember)
-        os_conn.glance.images.upload(image.id, img)
-    src.close()
-
-    yield image
-    os_conn.glance.images.delete(image.id)
-
 
 @pytest.yield_fixture
 def ironic_node(baremetal_node, os_conn, ironic, server_ssh_credentials):
@@ -51,27 +51,29 @@ def patch_murano_policy(env, role_name):
 
 
 @pytest.yield_fixture
-def role(openstack_client, role_name):
-    role = openstack_client.role_create(name=role_name)
+def role(os_conn, role_name):
+    role = os_conn.identity.role_create(name=role_name)
     yield role
-    openstack_client.role_delete(name=role_name)
+    os_conn.identity.role_delete(role['id'])
 
 
 @pytest.yield_fixture
-def user_env(openstack_client, suffix, role):
+def user_env(os_conn, suffix, role):
     name = 'test_user_{0}'.format(suffix[:4])
-    user = openstack_client.user_create(name=name, password='password',
+    user = os_conn.identity.user_create(name=name, password='password',
                                         project='services')
-    openstack_client.assign_role_to_user(role['name'], user['name'],
+    os_conn.identity.assign_role_to_user(role['id'], user['id'],
                                          user['project_id'])
     yield ('env OS_TENANT_NAME=services OS_PROJECT_NAME=services '
            'OS_USERNAME={name} OS_PASSWORD=password'.format(**user))
-    openstack_client.user_delete(name=name)
+    os_conn.identity.user_delete(user['id'])
 
 
 @pytest.fixture
-def murano_cli(controller_remote, user_env):
-    return functools.partial(os_cli.Murano(controller_remote), prefix=user_env)
+def murano_cli(controller_remote, user_env, cli_session):
+    return functools.partial(
+        os_cli.Murano(controller_remote, session=cli_session),
+        prefix=user_env)
 
 
 @pytest.yield_fixture
@@ -82,7 +84,8 @@ def package(murano_cli):
         params='{0} --exists-action s'.format(fqn),
         flags='--murano-repo-url=http://storage.apps.openstack.org'
     ).listing()
-    package = [x for x in packages if x['FQN'] == fqn][0]
+    package = next((x for x in packages if x['FQN'] == fqn), None)
+    assert package is not None, 'Package {0} is not imported'.format(fqn)
     yield package
     murano_cli('package-delete', params=package['ID'])
 
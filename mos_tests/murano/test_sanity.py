@@ -29,10 +29,11 @@ from selenium.webdriver.common import by
 from selenium.webdriver.support import expected_conditions as EC  # noqa
 from selenium.webdriver.support import ui
 from six.moves import configparser
-from six.moves.urllib import request
 from xvfbwrapper import Xvfb
 
 from mos_tests.functions import common
+from mos_tests.functions.image_cache import get_or_upload_image
+from mos_tests.functions.image_cache import ImageCache
 from mos_tests import settings
 
 logger = logging.getLogger(__name__)
@@ -342,18 +343,17 @@ class TestDeployEnvInNetwork(base.ApplicationTestCase):
         image_properties = {
             'murano_image_info': '{"type": "linux", "title": "testDeploy"}'
         }
-        image = cls.glance.images.create(name="testDeploy",
-                                         disk_format='qcow2',
-                                         container_format='bare',
-                                         properties=image_properties)
-
-        image.update(data=request.urlopen(settings.MURANO_IMAGE_URL))
+        # Image is cached locally and in Glance, so it's not deleted
+        path = ImageCache().get(settings.MURANO_IMAGE_URL)
+        image = get_or_upload_image(cls.glance, path,
+                                    name="testDeploy",
+                                    disk_format='qcow2',
+                                    container_format='bare',
+                                    **image_properties)
         cls.apache_image_id = image.id
 
         yield
 
-        cls.glance.images.delete(image.id)
-
     @pytest.yield_fixture
     def apache_package(self, apache_image):
         app_name = 'ApacheHTTPServer'
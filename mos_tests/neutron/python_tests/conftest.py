@@ -16,6 +16,8 @@ import logging
 
 import pytest
 
+from mos_tests.functions.pacemaker import Pacemaker
+
 
 logger = logging.getLogger(__name__)
 
@@ -27,9 +29,9 @@ def clear_l3_ban(env, os_conn):
     controllers = env.get_nodes_by_role('controller')
     ip = controllers[0].data['ip']
     with env.get_ssh_to_node(ip) as remote:
-        for node in controllers:
-            remote.execute("pcs resource clear p_neutron-l3-agent {0}".format(
-                node.data['fqdn']))
+        Pacemaker(remote).clear('p_neutron-l3-agent',
+                                [node.data['fqdn'] for node in controllers],
+                                tolerant=True)
 
 
 @pytest.fixture
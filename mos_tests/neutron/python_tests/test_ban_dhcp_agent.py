@@ -17,11 +17,14 @@ import logging
 import pytest
 
 from mos_tests.functions.common import wait
+from mos_tests.functions.pacemaker import Pacemaker
 from mos_tests.neutron.python_tests import base
 
 
 logger = logging.getLogger(__name__)
 
+DHCP_AGENT_RESOURCE = 'p_neutron-dhcp-agent'
+
 
 @pytest.mark.check_env_('is_ha', 'has_2_or_more_computes')
 @pytest.mark.usefixtures("setup")
@@ -73,30 +76,36 @@ class TestBaseDHCPAgent(base.TestBase):
                     network['id']))
         current_agents = list_dhcp_agents()
 
-        # ban dhcp agent on provided node
         with self.env.get_ssh_to_node(host) as remote:
-            remote.execute(
-                "pcs resource ban p_neutron-dhcp-agent {0}".format(
-                    node_to_ban))
-
-        logger.info("Ban DHCP agent on node {0}".format(node_to_ban))
-
-        # Wait to die banned dhcp agent
-        if wait_for_die:
-            err_msg = "Awaiting ban of DHCP agent: {0}"
-            wait(
-                lambda: (node_to_ban not in list_dhcp_agents()),
-                timeout_seconds=60 * 3,
-                sleep_seconds=(1, 60, 5),
-                waiting_for=err_msg.format(node_to_ban))
-        # Wait to reschedule dhcp agent
-        if wait_for_rescheduling:
-            err_msg = "New DHCP agent wasn't rescheduled"
-            wait(
-                lambda: (set(list_dhcp_agents()) - set(current_agents)),
-                timeout_seconds=60 * 3,
-                sleep_seconds=(1, 60, 5),
-                waiting_for=err_msg)
+            pacemaker = Pacemaker(remote)
+            # ban dhcp agent on provided node
+            pacemaker.ban(DHCP_AGENT_RESOURCE, [node_to_ban])
+
+            logger.info("Ban DHCP agent on node {0}".format(node_to_ban))
+
+            # Wait to die banned dhcp agent
+            if wait_for_die:
+                pacemaker.wait_resource(DHCP_AGENT_RESOURCE,
+                                        stopped_on=[node_to_ban])
+                err_msg = "Awaiting ban of DHCP agent: {0}"
+                wait(
+                    lambda: (node_to_ban not in list_dhcp_agents()),
+                    timeout_seconds=60 * 3,
+                    sleep_seconds=(1, 60, 5),
+                    waiting_for=err_msg.format(node_to_ban))
+                logger.info("Neutron DHCP agent on {0} is dead in "
+                            "{1:.1f}s".format(node_to_ban,
+                                              pacemaker.elapsed()))
+            # Wait to reschedule dhcp agent
+            if wait_for_rescheduling:
+                err_msg = "New DHCP agent wasn't rescheduled"
+                wait(
+                    lambda: (set(list_dhcp_agents()) - set(current_agents)),
+                    timeout_seconds=60 * 3,
+                    sleep_seconds=(1, 60, 5),
+                    waiting_for=err_msg)
+                logger.info("Neutron DHCP agent is rescheduled in "
+                            "{0:.1f}s".format(pacemaker.elapsed()))
         return node_to_ban
 
     def clear_dhcp_agent(self, node_to_clear, host, network_name=None,
@@ -118,23 +127,27 @@ class TestBaseDHCPAgent(base.TestBase):
                 lambda: self.os_conn.get_node_with_dhcp_for_network(
                     network['id']))
 
-        # clear dhcp agent on provided node
         with self.env.get_ssh_to_node(host) as remote:
-            remote.execute(
-                "pcs resource clear p_neutron-dhcp-agent {0}".format(
-                    node_to_clear))
-
-        logger.info("Clear DHCP agent on node {0}".format(node_to_clear))
-
-        # Wait to reschedule dhcp agent
-        if wait_for_rescheduling:
-            err_msg = (
-                "Wait for DHCP agent ({0}) rescheduling after clear from ban")
-            wait(
-                lambda: (node_to_clear in list_dhcp_agents()),
-                timeout_seconds=60 * 3,
-                sleep_seconds=(1, 60, 5),
-                waiting_for=err_msg.format(node_to_clear))
+            pacemaker = Pacemaker(remote)
+            # clear dhcp agent on provided node
+            pacemaker.clear(DHCP_AGENT_RESOURCE, [node_to_clear])
+
+            logger.info("Clear DHCP agent on node {0}".format(node_to_clear))
+
+            # Wait to reschedule dhcp agent
+            if wait_for_rescheduling:
+                pacemaker.wait_resource(DHCP_AGENT_RESOURCE,
+                                        started_on=[node_to_clear])
+                err_msg = ("Wait for DHCP agent ({0}) rescheduling after "
+                           "clear from ban")
+                wait(
+                    lambda: (node_to_clear in list_dhcp_agents()),
+                    timeout_seconds=60 * 3,
+                    sleep_seconds=(1, 60, 5),
+                    waiting_for=err_msg.format(node_to_clear))
+                logger.info("Neutron DHCP agent on {0} is rescheduled in "
+                            "{1:.1f}s".format(node_to_clear,
+                                              pacemaker.elapsed()))
         return node_to_clear
 
     def kill_dnsmasq(self, host):
@@ -196,7 +209,7 @@ class TestBaseDHCPAgent(base.TestBase):
         self.net_name = int_net['network']['name']
         router = self.create_router_between_nets(self.os_conn.ext_network,
                                                  sub_net)
-        self.instance_keypair = self.os_conn.create_key(key_name='instancekey')
+        self.instance_keypair = self.os_conn.get_or_create_key('instancekey')
 
         # create instance and assign floating ip to it
         self.instance = self.create_cirros_instance_with_ssh(
@@ -14,31 +14,25 @@
 
 from collections import defaultdict
 import logging
-import re
 import time
 
 import pytest
 
 from mos_tests.environment.os_actions import OpenStackActions
 from mos_tests.functions.common import wait
+from mos_tests.functions import netfilter
 from mos_tests.neutron.python_tests.base import TestBase
 
 logger = logging.getLogger(__name__)
 
 
 @pytest.yield_fixture
-def projects(openstack_client):
-    names = ['A', 'B']
-    projects = []
-    for name in names:
-        project = openstack_client.project_create(name)
-        projects.append(project)
-        openstack_client('role add',
-                         params='--user admin --project {0} '
-                                'admin -f json'.format(name))
+def projects(os_conn):
+    projects = os_conn.identity.projects_create(['A', 'B'])
+    for project in projects:
+        os_conn.identity.assign_role_to_user('admin', 'admin', project['id'])
     yield projects
-    for name in names:
-        openstack_client.project_delete(name)
+    os_conn.identity.projects_delete([x['id'] for x in projects])
 
 
 @pytest.yield_fixture
@@ -88,9 +82,7 @@ def sec_groups(projects, os_conn):
                     'cidr': '0.0.0.0/0',
                 }
             ]
-        for ruleset in rulesets:
-            os_conn.nova.security_group_rules.create(
-                group['id'], **ruleset)
+        os_conn.create_security_group_rules(group['id'], rulesets)
     yield groups
     for group in groups:
         os_conn.neutron.delete_security_group(group['id'])
@@ -183,50 +175,32 @@ def restart_ping(os_clients, env, servers, group_num=None):
 
 
 def is_ping_has_same_id(compute):
-    id_expr = re.compile(r'id=(?P<id>\d+)')
-    with compute.ssh() as remote:
-        output = remote.execute('conntrack -L | grep 10.0.0.4 | grep icmp')
+    snapshot = netfilter.get_snapshot(compute, proto='icmp',
+                                      address='10.0.0.4')
+    entries = snapshot.conntrack.select(address='10.0.0.4')
 
-    if 'UNREPLIED' not in output.stdout_string:
+    if not any(x.unreplied for x in entries):
         return False
     ids_data = defaultdict(set)
-    for line in output['stdout']:
-        id_val = int(id_expr.search(line).group('id'))
-        ids_data[id_val].add('[UNREPLIED]' in line)
+    for entry in entries:
+        ids_data[entry.id].add(entry.unreplied)
     last_id = max(ids_data.keys())
     return ids_data[last_id] == set([True, False])
 
 
 def check_zones_assigment_to_devices(compute):
     __tracebackhide__ = True
-    with compute.ssh() as remote:
-        conntrack_output = remote.check_call(
-            'conntrack -L | grep 10.0.0.4 | grep icmp')
-        iptables_output = remote.check_call('iptables -L -t raw')
-
-    zones = set()
-    for line in conntrack_output['stdout']:
-        zone = re.search(r'zone=(?P<zone>\d+)', line).group('zone')
-        zones.add(zone)
-
-    for start, line in enumerate(iptables_output['stdout']):
-        if 'Chain neutron-openvswi-PREROUTING' in line:
-            break
-    start += 2
-    zones_devices = defaultdict(list)
-
-    for line in iptables_output['stdout'][start:]:
-        data = re.split('\s+', line, maxsplit=6)
-        if data[:-1] != ['CT', 'all', '--', 'anywhere', 'anywhere', 'PHYSDEV']:
-            continue
-        dev_data = re.search(
-            r'match --physdev-in (?P<dev>.+?) CTzone (?P<zone>\d+)', data[-1]
-        ).groupdict()
-        if dev_data['zone'] not in zones:
-            continue
-        zones_devices[dev_data['zone']].append(dev_data['dev'])
-
-    iptables_output = ''.join(iptables_output['stdout'][start - 2:])
+    chain = 'neutron-openvswi-PREROUTING'
+    snapshot = netfilter.get_snapshot(compute, proto='icmp',
+                                      address='10.0.0.4')
+
+    zones = {x.zone for x in snapshot.conntrack.select(address='10.0.0.4')}
+    zones_devices = {
+        zone: devices
+        for zone, devices in snapshot.iptables.zone_devices(chain).items()
+        if zone in zones}
+
+    iptables_output = snapshot.iptables.format(chain)
     for devices in zones_devices.values():
         if len(devices) != 2:
             pytest.fail('Count of devices for some zone is not 2\n{}'.format(
@@ -39,7 +39,7 @@ class TestDHCPAgent(TestBase):
                        if x.get('router:external')][0]
         self.zone = self.os_conn.nova.availability_zones.find(zoneName="nova")
         self.hosts = self.zone.hosts.keys()[:2]
-        self.instance_keypair = self.os_conn.create_key(key_name='instancekey')
+        self.instance_keypair = self.os_conn.get_or_create_key('instancekey')
         self.security_group = self.os_conn.create_sec_group_for_ssh()
         self.networks = []
 
@@ -85,11 +85,11 @@ class TestDHCPAgent(TestBase):
         # According to the test requirements 50 networks should be created
         # However during implementation found that only about 34 nets
         # can be created for one tenant. Need to clarify that situation.
-        for x in range(30):
-            net_id = self.os_conn.add_net(self.router['id'])
-            self.networks.append(net_id)
-            logger.info('Total networks created at the moment {}'.format(
-                        len(self.networks)))
+        net_ids = self.os_conn.add_nets(self.router['id'], count=30)
+        self.networks.extend(net_ids)
+        logger.info('Total networks created at the moment {}'.format(
+                    len(self.networks)))
+        for x, net_id in enumerate(net_ids):
             srv = self.os_conn.create_server(
                 name='instanseNo{}'.format(x),
                 key_name=self.instance_keypair.name,
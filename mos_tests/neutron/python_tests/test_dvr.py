@@ -38,7 +38,7 @@ class TestDVRBase(base.TestBase):
         """Init Openstack variables"""
         self.zone = self.os_conn.nova.availability_zones.find(zoneName="nova")
         self.security_group = self.os_conn.create_sec_group_for_ssh()
-        self.instance_keypair = self.os_conn.create_key(key_name='instancekey')
+        self.instance_keypair = self.os_conn.get_or_create_key('instancekey')
         self.hosts = self.zone.hosts.keys()
 
     def reset_computes(self, hostnames, env_name):
@@ -139,7 +139,7 @@ class TestDVR(TestDVRBase):
         """
         self.zone = self.os_conn.nova.availability_zones.find(zoneName="nova")
         self.security_group = self.os_conn.create_sec_group_for_ssh()
-        self.instance_keypair = self.os_conn.create_key(key_name='instancekey')
+        self.instance_keypair = self.os_conn.get_or_create_key('instancekey')
         net, subnet = self.create_internal_network_with_subnet(1)
         router = self.os_conn.create_router(name='router01',
                                             distributed=distributed_router)
@@ -16,6 +16,7 @@ from paramiko.ssh_exception import NoValidConnectionsError
 from paramiko.ssh_exception import SSHException
 import pytest
 
+from mos_tests.environment.provisioning import SSH_PING_RULES
 from mos_tests.functions.common import wait
 from mos_tests.neutron.python_tests.base import TestBase
 
@@ -37,17 +38,16 @@ class TestFloatingIP(TestBase):
         ext_net = [x for x in exist_networks
                    if x.get('router:external')][0]
         zone = self.os_conn.nova.availability_zones.find(zoneName="nova")
-        security_group = self.os_conn.create_sec_group_for_ssh()
+        security_group = self.os_conn.get_or_create_sec_group(
+            SSH_PING_RULES + [{
+                'ip_protocol': 'tcp',
+                'from_port': 1,
+                'to_port': 65535,
+                'cidr': '0.0.0.0/0',
+            }])
         hostname = zone.hosts.keys()[0]
         cidr = "10.1.1.0/24"
-        self.instance_keypair = self.os_conn.create_key(key_name='instancekey')
-
-        self.os_conn.nova.security_group_rules.create(
-            security_group.id,
-            ip_protocol='tcp',
-            from_port=1,
-            to_port=65535,
-            cidr='0.0.0.0/0')
+        self.instance_keypair = self.os_conn.get_or_create_key('instancekey')
 
         net, subnet = self.create_internal_network_with_subnet(cidr=cidr)
         # create router
@@ -19,11 +19,14 @@ import pytest
 
 from mos_tests.environment.devops_client import DevopsClient
 from mos_tests.functions.common import wait
+from mos_tests.functions.pacemaker import Pacemaker
 from mos_tests.neutron.python_tests.base import TestBase
 
 
 logger = logging.getLogger(__name__)
 
+L3_AGENT_RESOURCE = 'p_neutron-l3-agent'
+
 
 @pytest.mark.check_env_(
     'is_ha '
@@ -49,7 +52,7 @@ class TestL3Agent(TestBase):
         self.zone = self.os_conn.nova.availability_zones.find(zoneName="nova")
         self.security_group = self.os_conn.create_sec_group_for_ssh()
         self.hosts = self.zone.hosts.keys()[:2]
-        self.instance_keypair = self.os_conn.create_key(key_name='instancekey')
+        self.instance_keypair = self.os_conn.get_or_create_key('instancekey')
 
         # create router
         router = self.os_conn.create_router(name="router01")
@@ -98,29 +101,37 @@ class TestL3Agent(TestBase):
             name=router_name)['routers'][0]
         node_with_l3 = self.os_conn.get_l3_agent_hosts(router['id'])[0]
 
-        # ban l3 agent on this node
         with self.env.get_ssh_to_node(_ip) as remote:
-            remote.execute(
-                "pcs resource ban p_neutron-l3-agent {0}".format(node_with_l3))
-
-        logger.info("Ban L3 agent on node {0}".format(node_with_l3))
-
-        # wait for l3 agent died
-        if wait_for_die:
-            wait(
-                lambda: self.os_conn.get_l3_for_router(
-                    router['id'])['agents'][0]['alive'] is False,
-                timeout_seconds=60 * 3, waiting_for="L3 agent is die",
-                sleep_seconds=(1, 60)
-            )
-
-        # Wait to migrate l3 agent on new controller
-        if wait_for_migrate:
-            waiting_for = "l3 agent migrate from {0}"
-            wait(lambda: not node_with_l3 == self.os_conn.get_l3_agent_hosts(
-                 router['id'])[0], timeout_seconds=60 * 3,
-                 waiting_for=waiting_for.format(node_with_l3),
-                 sleep_seconds=(1, 60))
+            pacemaker = Pacemaker(remote)
+            # ban l3 agent on this node
+            pacemaker.ban(L3_AGENT_RESOURCE, [node_with_l3])
+
+            logger.info("Ban L3 agent on node {0}".format(node_with_l3))
+
+            # wait for l3 agent died
+            if wait_for_die:
+                pacemaker.wait_resource(L3_AGENT_RESOURCE,
+                                        stopped_on=[node_with_l3])
+                wait(
+                    lambda: self.os_conn.get_l3_for_router(
+                        router['id'])['agents'][0]['alive'] is False,
+                    timeout_seconds=60 * 3, waiting_for="L3 agent is die",
+                    sleep_seconds=(1, 60)
+                )
+                logger.info("Neutron L3 agent on {0} is dead in "
+                            "{1:.1f}s".format(node_with_l3,
+                                              pacemaker.elapsed()))
+
+            # Wait to migrate l3 agent on new controller
+            if wait_for_migrate:
+                waiting_for = "l3 agent migrate from {0}"
+                wait(lambda: not node_with_l3 ==
+                     self.os_conn.get_l3_agent_hosts(router['id'])[0],
+                     timeout_seconds=60 * 3,
+                     waiting_for=waiting_for.format(node_with_l3),
+                     sleep_seconds=(1, 60))
+                logger.info("Router is migrated from {0} in {1:.1f}s".format(
+                    node_with_l3, pacemaker.elapsed()))
         return node_with_l3
 
     def clear_l3_agent(self, _ip, router_name, node, wait_for_alive=False):
@@ -137,19 +148,22 @@ class TestL3Agent(TestBase):
         router = self.os_conn.neutron.list_routers(
             name=router_name)['routers'][0]
         with self.env.get_ssh_to_node(_ip) as remote:
-            remote.execute(
-                "pcs resource clear p_neutron-l3-agent {0}".format(node))
-
-        logger.info("Clear L3 agent on node {0}".format(node))
-
-        # wait for l3 agent alive
-        if wait_for_alive:
-            wait(
-                lambda: self.os_conn.get_l3_for_router(
-                    router['id'])['agents'][0]['alive'] is True,
-                timeout_seconds=60 * 3, waiting_for="L3 agent is alive",
-                sleep_seconds=(1, 60)
-            )
+            pacemaker = Pacemaker(remote)
+            pacemaker.clear(L3_AGENT_RESOURCE, [node])
+
+            logger.info("Clear L3 agent on node {0}".format(node))
+
+            # wait for l3 agent alive
+            if wait_for_alive:
+                pacemaker.wait_resource(L3_AGENT_RESOURCE, started_on=[node])
+                wait(
+                    lambda: self.os_conn.get_l3_for_router(
+                        router['id'])['agents'][0]['alive'] is True,
+                    timeout_seconds=60 * 3, waiting_for="L3 agent is alive",
+                    sleep_seconds=(1, 60)
+                )
+                logger.info("Neutron L3 agent is alive in {0:.1f}s".format(
+                    pacemaker.elapsed()))
 
     def drop_rabbit_port(self, router_name):
         """Drop rabbit port and wait until router rescheduling
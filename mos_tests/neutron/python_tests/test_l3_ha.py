@@ -20,6 +20,7 @@ import re
 import signal
 import subprocess
 import threading
+import time
 
 import pytest
 from six.moves.queue import Empty
@@ -27,6 +28,9 @@ from six.moves.queue import Queue
 
 from mos_tests.environment.devops_client import DevopsClient
 from mos_tests.functions.common import wait
+from mos_tests.functions.l3_ha import L3HATracker
+from mos_tests.functions import pcap
+from mos_tests.functions.tcpdump import capture_on_nodes
 from mos_tests.neutron.python_tests.base import TestBase
 from mos_tests import settings
 
@@ -226,7 +230,7 @@ class TestL3HA(TestBase):
         """Init Openstack variables"""
         self.zone = self.os_conn.nova.availability_zones.find(zoneName="nova")
         self.security_group = self.os_conn.create_sec_group_for_ssh()
-        self.instance_keypair = self.os_conn.create_key(key_name='instancekey')
+        self.instance_keypair = self.os_conn.get_or_create_key('instancekey')
 
     @pytest.fixture
     def router(self, variables):
@@ -478,12 +482,19 @@ class TestL3HA(TestBase):
                 }
             })
         # Create 19 nets, subnets, routers
-        for i in range(1, 20):
-            net, subnet = self.create_internal_network_with_subnet(suffix=i)
+        indexes = range(1, 20)
+        networks = self.os_conn.create_networks(
+            ['net%02d' % i for i in indexes])
+        subnets = self.os_conn.create_subnets([
+            {'network_id': net['id'],
+             'name': 'net%02d__subnet' % i,
+             'cidr': '192.168.%d.0/24' % i}
+            for i, net in zip(indexes, networks)])
+        for subnet in subnets:
             router = self.os_conn.create_router(name="router01")
             self.os_conn.router_interface_add(
                 router_id=router['router']['id'],
-                subnet_id=subnet['subnet']['id'])
+                subnet_id=subnet['id'])
 
         # Create 2 networks, subnets, vms, add router between subnets
         router20_21 = self.os_conn.create_router(name="router01")
@@ -503,23 +514,38 @@ class TestL3HA(TestBase):
         server21 = self.os_conn.nova.servers.find(name='server21')
         server21_ip = self.os_conn.get_nova_instance_ips(server21)['fixed']
 
-        agent = self.get_active_l3_agents_for_router(
-            router20_21['router']['id'])[0]
+        router_id = router20_21['router']['id']
+        agent = self.get_active_l3_agents_for_router(router_id)[0]
         node_to_ban = agent['host']
 
-        # Ban l3 agent
-        with self.background_ping(vm=server20,
-                                  vm_keypair=self.instance_keypair,
-                                  ip_to_ping=server21_ip) as ping_result:
-            with self.env.leader_controller.ssh() as remote:
-                logger.info("Ban L3 agent on node {0}".format(node_to_ban))
-                remote.check_call(
-                    "pcs resource ban p_neutron-l3-agent {0}".format(
-                        node_to_ban))
-                new_agent = self.wait_router_rescheduled(
-                    router_id=router['router']['id'],
-                    from_node=node_to_ban)
-                node_to_ban = new_agent['host']
+        router_ids = [x['id'] for x in self.os_conn.neutron.list_routers()[
+            'routers']]
+        controllers = self.env.get_nodes_by_role('controller')
+        with L3HATracker(self.os_conn, router_ids,
+                         controllers=controllers) as tracker:
+            banned_routers = [
+                x for x in router_ids
+                if tracker.logs[x].active_hosts == (node_to_ban,)]
+
+            # Ban l3 agent
+            with self.background_ping(vm=server20,
+                                      vm_keypair=self.instance_keypair,
+                                      ip_to_ping=server21_ip) as ping_result:
+                with self.env.leader_controller.ssh() as remote:
+                    logger.info("Ban L3 agent on node {0}".format(node_to_ban))
+                    ban_time = time.time()
+                    remote.check_call(
+                        "pcs resource ban p_neutron-l3-agent {0}".format(
+                            node_to_ban))
+                    tracker.wait_rescheduled(router_id, from_host=node_to_ban)
+
+            for x in banned_routers:
+                tracker.wait_rescheduled(x, from_host=node_to_ban)
+                failover_time = tracker.logs[x].failover_time(node_to_ban,
+                                                              since=ban_time)
+                logger.info('Router {0} failover time is {1}'.format(
+                    x, '-' if failover_time is None else '{0:.1f}s'.format(
+                        failover_time)))
 
         assert ping_result['sent'] - ping_result['received'] < 10
 
@@ -630,46 +656,6 @@ class TestL3HA(TestBase):
             10. Check that tcpdump results and active l3 agents statuses
             11. Check that ping lost less than 10 packets
         """
-        def start_tcpdump_in_background(node, router_id, active_qg_iface_id):
-            """Start tcpdump on l3ha-router provided port.
-
-            :param node: node on which start tcpdump
-            :param router_id: router id on which start tcpdump
-            :param active_qg_iface_id: interface id on which start tcpdump
-            :return: thread with executing command over ssh
-            """
-            logger.info('Start tcpdump on {0}'.format(node.data['fqdn']))
-            cmd_for_tcpdump = (
-                'ip netns exec qrouter-{router_id} '
-                'tcpdump -n -l -tttt -i {qg_port_id} icmp 2>&1 | '
-                'tee /tmp/tcpdump.log'.format(
-                    router_id=router_id, qg_port_id=active_qg_iface_id))
-
-            def start_tcpdump():
-                with node.ssh() as remote:
-                    res = remote.execute(cmd_for_tcpdump)
-                    return res
-
-            tcpdump_thread = threading.Thread(target=start_tcpdump)
-            tcpdump_thread.start()
-            return tcpdump_thread
-
-        def get_last_package_datetime(node):
-            """Get last package time from tcpdump log on provided node
-
-            :param node: node on which we need to analyze log
-            :return: last time from log or None, if log is empty
-            """
-            with node.ssh() as remote:
-                res = remote.execute("grep 'ICMP echo reply' /tmp/tcpdump.log")
-                if res['exit_code'] != 0:
-                    return None
-                res = remote.execute(
-                    "grep 'ICMP echo reply' /tmp/tcpdump.log | "
-                    "tail -1 | cut -d ' ' -f 1,2")
-                last_checked = res['stdout'][0].strip()
-                return last_checked
-
         instance = self.os_conn.nova.servers.find(name="server02")
         instance_ip = (
             self.os_conn.get_nova_instance_ips(instance)['floating'])
@@ -687,38 +673,30 @@ class TestL3HA(TestBase):
             active_l3_qg_port_for_router_id[:11])
 
         # Start tcpdump on all controllers
-        tcpdump_threads = []
-        for controller in controllers:
-            tcpdump_threads.append(
-                start_tcpdump_in_background(
-                    controller, router_id, active_qg_iface_id))
-        # Ban l3 agent
-        with self.background_ping_from_host(
-                ip_to_ping=instance_ip) as ping_result:
-            with controllers[0].ssh() as remote:
-                logger.info("Ban active l3 agent")
-                remote.check_call(
-                    "pcs resource ban p_neutron-l3-agent {0}".format(
-                        active_hostname))
-                new_active_agent = self.wait_router_rescheduled(
-                    router_id=router['router']['id'],
-                    from_node=active_hostname)
-                new_active_hostname = new_active_agent['host']
-
-        # kill tcpdump on controllers
-        for controller in controllers:
-            logger.info('Killing tcpdump on {0}'.format(
-                controller.data['fqdn']))
-            with controller.ssh() as remote:
-                remote.execute('killall tcpdump')
-        # joining threads with ssh execute tcpdump
-        for thread in tcpdump_threads:
-            thread.join(0)
+        with capture_on_nodes(
+                controllers, interface=active_qg_iface_id, bpf_filter='icmp',
+                netns='qrouter-{0}'.format(router_id)) as captures:
+            # Ban l3 agent
+            with self.background_ping_from_host(
+                    ip_to_ping=instance_ip) as ping_result:
+                with controllers[0].ssh() as remote:
+                    logger.info("Ban active l3 agent")
+                    remote.check_call(
+                        "pcs resource ban p_neutron-l3-agent {0}".format(
+                            active_hostname))
+                    new_active_agent = self.wait_router_rescheduled(
+                        router_id=router['router']['id'],
+                        from_node=active_hostname)
+                    new_active_hostname = new_active_agent['host']
+
         # check that l3 active agents matching with tcpdump results
-        last_active_node = self.env.find_node_by_fqdn(active_hostname)
-        new_active_node = self.env.find_node_by_fqdn(new_active_hostname)
-        last_tcpdump_results = get_last_package_datetime(last_active_node)
-        new_tcpdump_results = get_last_package_datetime(new_active_node)
+        # (echo replies are sent from instance floating ip)
+        last_tcpdump_results = pcap.Capture(
+            captures[active_hostname].path).last_time(
+                proto='icmp', src=instance_ip)
+        new_tcpdump_results = pcap.Capture(
+            captures[new_active_hostname].path).last_time(
+                proto='icmp', src=instance_ip)
         assert (last_tcpdump_results and new_tcpdump_results) is not None
         assert last_tcpdump_results < new_tcpdump_results
         assert (ping_result['sent'] - ping_result['received']) < 10
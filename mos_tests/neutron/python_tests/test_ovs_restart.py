@@ -21,6 +21,10 @@ import time
 import pytest
 
 from mos_tests.functions.common import wait
+from mos_tests.functions.image_cache import get_or_upload_image
+from mos_tests.functions import ovs
+from mos_tests.functions.pacemaker import Pacemaker
+from mos_tests.functions.topology import build_topology
 from mos_tests.neutron.python_tests.base import TestBase
 from mos_tests import settings
 
@@ -62,42 +66,42 @@ class OvsBase(TestBase):
 
     def setup_rules_for_default_sec_group(self):
         """Add necessary rules to default security group."""
-        default_sec_group = [
-            group for group in self.os_conn.nova.security_groups.list()
-            if group.name == "default"][0]
-
-        self.os_conn.nova.security_group_rules.create(
-            default_sec_group.id,
-            ip_protocol='tcp',
-            from_port=22,
-            to_port=22,
-            cidr='0.0.0.0/0')
-        self.os_conn.nova.security_group_rules.create(
-            default_sec_group.id,
-            ip_protocol='icmp',
-            from_port=-1,
-            to_port=-1,
-            cidr='0.0.0.0/0')
-        self.os_conn.nova.security_group_rules.create(
-            default_sec_group.id,
-            ip_protocol='tcp',
-            from_port=1,
-            to_port=65535,
-            cidr='0.0.0.0/0')
-        self.os_conn.nova.security_group_rules.create(
-            default_sec_group.id,
-            ip_protocol='udp',
-            from_port=1,
-            to_port=65535,
-            cidr='0.0.0.0/0')
+        default_sec_group = self.os_conn.resolver.get('security_groups',
+                                                      'default')
+
+        self.os_conn.create_security_group_rules(default_sec_group.id, [
+            {
+                'ip_protocol': 'tcp',
+                'from_port': 22,
+                'to_port': 22,
+                'cidr': '0.0.0.0/0',
+            },
+            {
+                'ip_protocol': 'icmp',
+                'from_port': -1,
+                'to_port': -1,
+                'cidr': '0.0.0.0/0',
+            },
+            {
+                'ip_protocol': 'tcp',
+                'from_port': 1,
+                'to_port': 65535,
+                'cidr': '0.0.0.0/0',
+            },
+            {
+                'ip_protocol': 'udp',
+                'from_port': 1,
+                'to_port': 65535,
+                'cidr': '0.0.0.0/0',
+            },
+        ])
 
     def disable_ovs_agents_on_controller(self):
         """Disable openvswitch-agents on a controller."""
         controller = self.env.get_nodes_by_role('controller')[0]
 
         with controller.ssh() as remote:
-            remote.check_call(
-                'pcs resource disable {}'.format(self.ovs_agent_name))
+            Pacemaker(remote).disable(self.ovs_agent_name)
 
     def restart_ovs_agents_on_computes(self):
         """Restart openvswitch-agents on all computes."""
@@ -113,49 +117,38 @@ class OvsBase(TestBase):
         controller = self.env.get_nodes_by_role('controller')[0]
 
         with controller.ssh() as remote:
-            remote.check_call(
-                'pcs resource enable {}'.format(self.ovs_agent_name))
+            Pacemaker(remote).enable(self.ovs_agent_name)
 
     def ban_ovs_agents_controllers(self):
         """Ban openvswitch-agents on all controllers."""
         controllers = self.env.get_nodes_by_role('controller')
 
+        nodes = [node.data['fqdn'] for node in controllers]
+
         with controllers[0].ssh() as remote:
-            for node in controllers:
-                remote.check_call(
-                    'pcs resource ban {resource_name} {fqdn}'.format(
-                        resource_name=self.ovs_agent_name, **node.data))
+            Pacemaker(remote).ban(self.ovs_agent_name, nodes)
 
     def clear_ovs_agents_controllers(self):
         """Clear openvswitch-agents on all controllers."""
         controllers = self.env.get_nodes_by_role('controller')
 
+        nodes = [node.data['fqdn'] for node in controllers]
+
         with controllers[0].ssh() as remote:
-            for node in controllers:
-                remote.check_call(
-                    'pcs resource clear {resource_name} {fqdn}'.format(
-                        resource_name=self.ovs_agent_name, **node.data))
+            Pacemaker(remote).clear(self.ovs_agent_name, nodes)
 
     def get_current_cookie(self, compute):
         """Get the value of the cookie parameter for br-int or br-tun bridge.
             :param compute: Compute node where the server is scheduled
             :return: cookie value
         """
-        with compute.ssh() as remote:
-            result = remote.execute('ovs-ofctl dump-flows br-int')
-            result_tun = remote.execute('ovs-ofctl dump-flows br-tun')
-        assert result['exit_code'] == 0
-        result_out = result['stdout']
-        if result_tun['stderr'] != ['ovs-ofctl: br-tun is not a bridge or a '
-                                    'socket\n']:
-            assert result_tun['exit_code'] == 0
-            result_out.extend(result_tun['stdout'])
-        cookie_lines = filter(lambda x: x.find(' cookie=') != -1, result_out)
-        cookie_values = map(lambda x: x.split(',')[0].partition(' cookie=')[2],
-                            cookie_lines)
-        assert cookie_values[0] != 0
-        assert cookie_values.count(cookie_values[0]) == len(cookie_values)
-        return cookie_values[0]
+        snapshot = ovs.get_snapshot(compute)
+        cookies = snapshot.flows.cookies(bridges=('br-int', 'br-tun'))
+        assert len(cookies) == 1, 'Flows have different cookies: {0}'.format(
+            [hex(x) for x in cookies])
+        cookie = cookies.pop()
+        assert cookie != 0
+        return cookie
 
 
 @pytest.mark.check_env_("has_2_or_more_computes")
@@ -174,32 +167,30 @@ class TestOVSRestartTwoVms(OvsBase):
                 on different computes
             4. Go to vm1 console and send pings to vm2
         """
-        self.instance_keypair = self.os_conn.create_key(key_name='instancekey')
         zone = self.os_conn.nova.availability_zones.find(zoneName="nova")
         vm_hosts = zone.hosts.keys()[:2]
 
         self.setup_rules_for_default_sec_group()
 
-        # create router
-        router = self.os_conn.create_router(name="router01")
-
-        # create 2 networks and 2 instances
+        # create router, 2 networks and 2 instances
+        spec = {
+            'networks': {},
+            'routers': {'router01': {'networks': []}},
+            'keypairs': ['instancekey'],
+            'servers': {},
+        }
         for i, hostname in enumerate(vm_hosts, 1):
-            net, subnet = self.create_internal_network_with_subnet(suffix=i)
-            self.os_conn.router_interface_add(
-                router_id=router['router']['id'],
-                subnet_id=subnet['subnet']['id'])
-            self.os_conn.create_server(
-                name='server%02d' % i,
-                availability_zone='{}:{}'.format(zone.zoneName, hostname),
-                key_name=self.instance_keypair.name,
-                nics=[{'net-id': net['network']['id']}])
+            net = 'net%02d' % i
+            spec['networks'][net] = {'cidr': '192.168.%d.0/24' % i}
+            spec['routers']['router01']['networks'].append(net)
+            spec['servers']['server%02d' % i] = {
+                'network': net, 'host': hostname, 'keypair': 'instancekey'}
+        topology = build_topology(self.os_conn, spec)
+        self.instance_keypair = topology.keypairs['instancekey']
 
         # check pings
-        self.server1 = self.os_conn.nova.servers.find(name="server01")
-        self.server2_ip = self.os_conn.get_nova_instance_ips(
-            self.os_conn.nova.servers.find(name="server02")
-        ).values()[0]
+        self.server1 = topology.servers['server01']
+        self.server2_ip = topology.server_ips('server02').values()[0]
 
         self.check_ping_from_vm(self.server1, self.instance_keypair,
                                 self.server2_ip, timeout=3 * 60)
@@ -326,27 +317,6 @@ class TestOVSRestartTwoVms(OvsBase):
 class TestPortTags(OvsBase):
     """Check that port tags aren't change after ovs-agent restart"""
 
-    def get_ports_tags_data(self, lines):
-        """Returns dict with ports as keys and tags as values"""
-        port_tags = {}
-        last_offset = 0
-        port = None
-        for line in lines[1:]:
-            line = line.rstrip()
-            key, val = line.split(None, 1)
-            offset = len(line) - len(line.lstrip())
-            if port is None:
-                if key.lower() == 'port':
-                    port = val.strip('"')
-                    last_offset = offset
-                    continue
-            elif offset <= last_offset:
-                port = None
-            elif key.lower() == 'tag:':
-                port_tags[port] = val
-                port = None
-        return port_tags
-
     @pytest.mark.testrail_id('542664')
     def test_port_tags_immutable(self):
         """Check that ports tags don't change their values after
@@ -364,13 +334,8 @@ class TestPortTags(OvsBase):
         """
 
         def get_ovs_port_tags(nodes):
-            ovs_cfg = {}
-            for node in nodes:
-                with node.ssh() as remote:
-                    result = remote.check_call('ovs-vsctl show')
-                    ports_tags = self.get_ports_tags_data(result['stdout'])
-                    ovs_cfg[node.data['fqdn']] = ports_tags
-            return ovs_cfg
+            return {host: snapshot.port_tags()
+                    for host, snapshot in ovs.get_snapshots(nodes).items()}
 
         nodes = self.env.get_all_nodes()
 
@@ -379,11 +344,11 @@ class TestPortTags(OvsBase):
 
         # ban and clear ovs-agents on controllers
         controller = self.env.get_nodes_by_role('controller')[0]
-        cmd = "pcs resource {{action}} {resource}".format(
-            resource=self.ovs_agent_name)
         with controller.ssh() as remote:
-            remote.check_call(cmd.format(action='disable'))
-            remote.check_call(cmd.format(action='enable'))
+            pacemaker = Pacemaker(remote)
+            with pacemaker.batch():
+                pacemaker.disable(self.ovs_agent_name)
+                pacemaker.enable(self.ovs_agent_name)
 
         # restart ovs-agents on computes
         for node in self.env.get_nodes_by_role('compute'):
@@ -423,7 +388,7 @@ class TestOVSRestartsOneNetwork(OvsBase):
                        if x.get('router:external')][0]
         self.zone = self.os_conn.nova.availability_zones.find(zoneName="nova")
         self.hosts = self.zone.hosts.keys()
-        self.instance_keypair = self.os_conn.create_key(key_name='instancekey')
+        self.instance_keypair = self.os_conn.get_or_create_key('instancekey')
         self.setup_rules_for_default_sec_group()
 
         # create router
@@ -546,7 +511,7 @@ class TestOVSRestartTwoVmsOnSingleCompute(OvsBase):
             3. Launch vm1 and vm2 in net01 network on a single compute compute
             4. Go to vm1 console and send pings to vm2
         """
-        self.instance_keypair = self.os_conn.create_key(key_name='instancekey')
+        self.instance_keypair = self.os_conn.get_or_create_key('instancekey')
         zone = self.os_conn.nova.availability_zones.find(zoneName="nova")
         host = zone.hosts.keys()[0]
 
@@ -644,12 +609,10 @@ class TestOVSRestartWithIperfTraffic(OvsBase):
         :param full_path: full path to image file
         :return: image object for Glance
         """
-        image = self.os_conn.glance.images.create(name="image_ubuntu",
-                                                  disk_format='qcow2',
-                                                  container_format='bare')
-        with open(full_path, 'rb') as image_file:
-            self.os_conn.glance.images.upload(image['id'], image_file)
-        return image
+        return get_or_upload_image(self.os_conn.glance, full_path,
+                                   name="image_ubuntu",
+                                   disk_format='qcow2',
+                                   container_format='bare')
 
     def get_lost_percentage(self, output):
         """Get lost percentage
@@ -849,7 +812,7 @@ class TestOVSRestartAddFlows(OvsBase):
             3. Launch vm1 in net01 network
             4. Get list of openvswitch-agents
         """
-        self.instance_keypair = self.os_conn.create_key(key_name='instancekey')
+        self.instance_keypair = self.os_conn.get_or_create_key('instancekey')
         zone = self.os_conn.nova.availability_zones.find(zoneName="nova")
         host = zone.hosts.keys()[0]
 
@@ -897,6 +860,7 @@ class TestOVSRestartAddFlows(OvsBase):
                    if i.data['fqdn'] == node_name][0]
 
         before_value = self.get_current_cookie(compute)
+        snapshots = ovs.get_snapshots([compute])
 
         # Check that all ovs agents are alive
         self.os_conn.wait_agents_alive(self.ovs_agent_ids)
@@ -916,6 +880,9 @@ class TestOVSRestartAddFlows(OvsBase):
         # Then check that all ovs agents are alive
         self.os_conn.wait_agents_alive(self.ovs_agent_ids)
 
+        # Wait for all flows to be reinstalled with new cookie
+        ovs.wait_flows_restored([compute], snapshots)
+
         # sleep is used to check that system will be stable for some time
         # after restarting service
         time.sleep(30)
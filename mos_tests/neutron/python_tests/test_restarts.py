@@ -46,7 +46,7 @@ class TestRestarts(TestBase):
                        if x.get('router:external')][0]
         self.zone = self.os_conn.nova.availability_zones.find(zoneName="nova")
         self.hosts = self.zone.hosts.keys()[:2]
-        self.instance_keypair = self.os_conn.create_key(key_name='instancekey')
+        self.instance_keypair = self.os_conn.get_or_create_key('instancekey')
         self.security_group = self.os_conn.create_sec_group_for_ssh()
         self.networks = []
 
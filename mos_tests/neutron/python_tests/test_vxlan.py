@@ -12,104 +12,75 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from collections import Counter
 from contextlib import contextmanager
-from distutils.spawn import find_executable
 import logging
-import subprocess
-import threading
 
 import pytest
 
 from mos_tests.functions.common import gen_temp_file
+from mos_tests.functions import pcap
+from mos_tests.functions.tcpdump import RemoteCapture
 from mos_tests.neutron.python_tests.base import TestBase
 
 
 logger = logging.getLogger(__name__)
 
 
+# Enough to decode headers of vxlan encapsulated ARP and ICMP packets
+SNAPLEN = 128
+
+
 @contextmanager
-def tcpdump(ip, env, log_path, tcpdump_args):
-    """Start tcpdump on vxlan port before enter and stop it after
+def tcpdump(ip, env, log_path, bpf_filter='', interface='any'):
+    """Start tcpdump with `bpf_filter` before enter and stop it after
 
-    Log will download to log_path argument
+    Capture will be written to log_path argument
     """
-    def tcpdump(ip):
-        logger.info('Start tcpdump on {0}'.format(ip))
-        with env.get_ssh_to_node(ip) as remote:
-            result = remote.execute(
-                'tcpdump -U {0} -w /tmp/vxlan.log'.format(tcpdump_args))
-            assert result['exit_code'] == 0
-
-    thread = threading.Thread(target=tcpdump, args=(ip,))
-    try:
-        # Start tcpdump
-        thread.start()
-        yield
-    except Exception:
-        raise
-    else:
-        # Download log
-        with env.get_ssh_to_node(ip) as remote:
-            remote.download('/tmp/vxlan.log', log_path)
-    finally:
-        # Kill tcpdump
-        with env.get_ssh_to_node(ip) as remote:
-            remote.execute('killall tcpdump')
-        thread.join(0)
+    with env.get_ssh_to_node(ip) as remote:
+        with RemoteCapture(remote, log_path, interface=interface,
+                           bpf_filter=bpf_filter, snaplen=SNAPLEN):
+            yield
 
 
 def tcpdump_vxlan(ip, env, log_path):
     """Start tcpdump on vxlan port before enter and stop it after
 
-    Log will download to log_path argument
+    Capture will be written to log_path argument
     """
-    return tcpdump(ip, env, log_path, '-U -vvni any port 4789')
-
+    return tcpdump(ip, env, log_path, bpf_filter='port 4789')
 
-def _run_tshark_on_vxlan(log_file, cond):
-    tshark = find_executable('tshark')
-    return subprocess.check_output([
-        tshark, '-d', 'udp.port==4789,vxlan', '-r', log_file,
-        '-Y', '{0}'.format(cond)])
 
-
-def check_all_traffic_has_vni(vni, log_file):
+def check_all_traffic_has_vni(vni, capture):
     __tracebackhide__ = True
-    output = _run_tshark_on_vxlan(log_file, 'vxlan.vni!={0}'.format(vni))
-    if output.strip():
-        pytest.fail(
-            "Log contains records with another VNI\n{0}".format(output))
+    flows = Counter({flow: count for flow, count in capture.flows.items()
+                     if flow.vni not in (None, vni)})
+    if flows:
+        pytest.fail("Log contains records with another VNI\n{0}".format(
+            capture.format(flows)))
 
 
-def get_arp_traffic(src_ip, dst_ip, log_file):
-    cond = (
-        "arp.dst.proto_ipv4=={dst_ip} and "
-        "arp.src.proto_ipv4=={src_ip}".format(dst_ip=dst_ip, src_ip=src_ip))
-    return _run_tshark_on_vxlan(log_file, cond)
+def get_arp_traffic(src_ip, dst_ip, capture):
+    return capture.select(proto='arp', src=src_ip, dst=dst_ip)
 
 
-def check_no_arp_traffic(src_ip, dst_ip, log_file):
+def check_no_arp_traffic(src_ip, dst_ip, capture):
     __tracebackhide__ = True
-    output = get_arp_traffic(src_ip, dst_ip, log_file)
-    if output.strip():
-        pytest.fail("Log contains ARP traffic\n{0}".format(output))
+    flows = get_arp_traffic(src_ip, dst_ip, capture)
+    if flows:
+        pytest.fail("Log contains ARP traffic\n{0}".format(
+            capture.format(flows)))
 
 
-def check_arp_traffic(src_ip, dst_ip, log_file):
+def check_arp_traffic(src_ip, dst_ip, capture):
     __tracebackhide__ = True
-    output = get_arp_traffic(src_ip, dst_ip, log_file)
-    if not output.strip():
+    if not get_arp_traffic(src_ip, dst_ip, capture):
         pytest.fail("Log not contains ARP traffic")
 
 
-def check_icmp_traffic(src_ip, dst_ip, log_file):
+def check_icmp_traffic(src_ip, dst_ip, capture):
     __tracebackhide__ = True
-    cond = "icmp and ip.src=={src_ip} and ip.dst=={dst_ip}".format(
-        src_ip=src_ip,
-        dst_ip=dst_ip
-    )
-    output = _run_tshark_on_vxlan(log_file, cond)
-    if not output.strip():
+    if not capture.select(proto='icmp', src=src_ip, dst=dst_ip):
         pytest.fail(
             "Log not contains ICMP traffic from {src_ip} to {dst_ip}".format(
                 src_ip=src_ip,
@@ -126,7 +97,7 @@ class TestVxlanBase(TestBase):
         """Init Openstack variables"""
         self.zone = self.os_conn.nova.availability_zones.find(zoneName="nova")
         self.security_group = self.os_conn.create_sec_group_for_ssh()
-        self.instance_keypair = self.os_conn.create_key(key_name='instancekey')
+        self.instance_keypair = self.os_conn.get_or_create_key('instancekey')
 
     @pytest.fixture
     def router(self, variables):
@@ -138,7 +109,6 @@ class TestVxlanBase(TestBase):
         return router
 
 
-@pytest.mark.requires_('tshark')
 class TestVxlan(TestVxlanBase):
     """Simple Vxlan tests"""
 
@@ -204,7 +174,7 @@ class TestVxlan(TestVxlanBase):
 
         # Check log
         vni = network['network']['provider:segmentation_id']
-        check_all_traffic_has_vni(vni, log_file.name)
+        check_all_traffic_has_vni(vni, pcap.Capture(log_file.name))
 
     @pytest.mark.testrail_id('542632')
     @pytest.mark.check_env_('has_2_or_more_computes')
@@ -278,9 +248,9 @@ class TestVxlan(TestVxlanBase):
 
         # Check traffic
         check_all_traffic_has_vni(net1['provider:segmentation_id'],
-                                  log_file1.name)
+                                  pcap.Capture(log_file1.name))
         check_all_traffic_has_vni(net2['provider:segmentation_id'],
-                                  log_file2.name)
+                                  pcap.Capture(log_file2.name))
 
 
 @pytest.mark.check_env_('is_l2pop')
@@ -295,16 +265,15 @@ class TestVxlanL2pop(TestVxlanBase):
         """
 
     @pytest.mark.testrail_id(
-        '542633', params={'tcpdump_args': '-vvni any port 4789'})
+        '542633', params={'bpf_filter': 'port 4789'})
     @pytest.mark.testrail_id(
-        '542637', params={'tcpdump_args': '-n src host {source_ip} -i any'})
-    @pytest.mark.requires_('tshark')
+        '542637', params={'bpf_filter': 'src host {source_ip}'})
     @pytest.mark.check_env_('has_2_or_more_computes')
-    @pytest.mark.parametrize('tcpdump_args', [
-        '-vvni any port 4789',
-        '-n src host {source_ip} -i any'
+    @pytest.mark.parametrize('bpf_filter', [
+        'port 4789',
+        'src host {source_ip}'
     ], ids=['filter by vxlan port', 'filter by source_ip'])
-    def test_broadcast_traffic_propagation(self, router, tcpdump_args):
+    def test_broadcast_traffic_propagation(self, router, bpf_filter):
         """Check broadcast traffic propagation for network segments
 
         Scenario:
@@ -360,26 +329,26 @@ class TestVxlanL2pop(TestVxlanBase):
         with tcpdump(
             ip=compute2.data['ip'], env=self.env,
             log_path=broadcast_log_file.name,
-            tcpdump_args=tcpdump_args.format(source_ip=server1_ip)
+            bpf_filter=bpf_filter.format(source_ip=server1_ip)
         ):
             cmd = 'sudo arping -I eth0 -c 4 {0}; true'.format(server2_ip)
             self.run_on_vm(server1, self.instance_keypair, cmd)
 
         check_no_arp_traffic(src_ip=server1_ip, dst_ip=server2_ip,
-                             log_file=broadcast_log_file.name)
+                             capture=pcap.Capture(broadcast_log_file.name))
 
         # Initiate unicast traffic from server1 to server2
         unicast_log_file = gen_temp_file(prefix='unicast', suffix='.log')
         with tcpdump(
             ip=compute2.data['ip'], env=self.env,
             log_path=unicast_log_file.name,
-            tcpdump_args=tcpdump_args.format(source_ip=server1_ip)
+            bpf_filter=bpf_filter.format(source_ip=server1_ip)
         ):
             cmd = 'ping -c 4 {0}; true'.format(server2_ip)
             self.run_on_vm(server1, self.instance_keypair, cmd)
 
         check_icmp_traffic(src_ip=server1_ip, dst_ip=server2_ip,
-                           log_file=unicast_log_file.name)
+                           capture=pcap.Capture(unicast_log_file.name))
 
     @pytest.mark.testrail_id('542636')
     @pytest.mark.check_env_('has_3_or_more_computes')
@@ -509,7 +478,6 @@ class TestVxlanL2pop(TestVxlanBase):
                 assert any([x in stdout for x in compute3.ip_list])
 
     @pytest.mark.testrail_id('542638')
-    @pytest.mark.requires_('tshark')
     @pytest.mark.check_env_('has_2_or_more_computes')
     def test_broadcast_traffic_propagation_single_net(self, router):
         """Check broadcast traffic between instances placed in a single
@@ -565,15 +533,14 @@ class TestVxlanL2pop(TestVxlanBase):
         with tcpdump(
             ip=compute2.data['ip'], env=self.env,
             log_path=broadcast_log_file.name,
-            tcpdump_args=' -n src host {ip} -i {interface}'.format(
-                ip=server1_ip,
-                interface=server2_tap,)
+            bpf_filter='src host {0}'.format(server1_ip),
+            interface=server2_tap
         ):
             cmd = 'sudo arping -I eth0 -c 4 {0}; true'.format(server2_ip)
             self.run_on_vm(server1, self.instance_keypair, cmd)
 
         check_arp_traffic(src_ip=server1_ip, dst_ip=server2_ip,
-                          log_file=broadcast_log_file.name)
+                          capture=pcap.Capture(broadcast_log_file.name))
 
         server3_port = self.os_conn.get_port_by_fixed_ip(server3_ip)
         server3_tap = 'tap{}'.format(server3_port['id'][:11])
@@ -581,12 +548,11 @@ class TestVxlanL2pop(TestVxlanBase):
         with tcpdump(
             ip=compute2.data['ip'], env=self.env,
             log_path=broadcast_log_file.name,
-            tcpdump_args=' -n src host {ip} -i {interface}'.format(
-                ip=server1_ip,
-                interface=server3_tap,)
+            bpf_filter='src host {0}'.format(server1_ip),
+            interface=server3_tap
         ):
             cmd = 'sudo arping -I eth0 -c 4 {0}; true'.format(server2_ip)
             self.run_on_vm(server1, self.instance_keypair, cmd)
 
         check_no_arp_traffic(src_ip=server1_ip, dst_ip=server2_ip,
-                             log_file=broadcast_log_file.name)
+                             capture=pcap.Capture(broadcast_log_file.name))
@@ -12,17 +12,17 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import subprocess
-from time import sleep
-from time import time
-
 import paramiko
 import pytest
 import six
 
+from mos_tests.environment.provisioning import SSH_PING_RULES
 from mos_tests.environment.ssh import SSHClient
 from mos_tests.functions.base import OpenStackTestCase
 from mos_tests.functions import common as common_functions
+from mos_tests.functions.migration import LiveMigrationHarness
+from mos_tests.functions.spawner import Spawner
+from mos_tests import settings
 
 
 @pytest.mark.undestructive
@@ -37,29 +37,11 @@ class NovaIntegrationTests(OpenStackTestCase):
         self.volumes = []
         self.flavors = []
         self.keys = []
+        self.fip_pool = None
+        self.pooled_floating_ips = []
 
-        self.sec_group = self.nova.security_groups.create('security_nova',
-                                                          'Security group, '
-                                                          'created for Nova '
-                                                          'automatic tests')
-        rules = [
-            {
-                # ssh
-                'ip_protocol': 'tcp',
-                'from_port': 22,
-                'to_port': 22,
-                'cidr': '0.0.0.0/0',
-            },
-            {
-                # ping
-                'ip_protocol': 'icmp',
-                'from_port': -1,
-                'to_port': -1,
-                'cidr': '0.0.0.0/0',
-            }
-        ]
-        for rule in rules:
-            self.nova.security_group_rules.create(self.sec_group.id, **rule)
+        self.sec_group = self.os_conn.get_or_create_sec_group(
+            SSH_PING_RULES, prefix='security_nova')
 
     def tearDown(self):
         for inst in self.instances:
@@ -68,6 +50,9 @@ class NovaIntegrationTests(OpenStackTestCase):
         for fip in self.floating_ips:
             common_functions.delete_floating_ip(self.nova, fip)
         self.floating_ips = []
+        for fip in self.pooled_floating_ips:
+            self.fip_pool.release(fip)
+        self.pooled_floating_ips = []
         for volume in self.volumes:
             common_functions.delete_volume(self.cinder, volume)
         self.volumes = []
@@ -77,7 +62,12 @@ class NovaIntegrationTests(OpenStackTestCase):
         for key in self.keys:
             common_functions.delete_keys(self.nova, key.name)
         self.keys = []
-        self.nova.security_groups.delete(self.sec_group)
+
+    def acquire_floating_ips(self, count):
+        """Take floating IPs from session-wide pool for this test"""
+        self.fip_pool = self.os_conn.get_floating_ip_pool(size=10)
+        self.pooled_floating_ips = self.fip_pool.acquire(count)
+        return self.pooled_floating_ips
 
     @pytest.mark.check_env_("is_any_compute_suitable_for_max_flavor")
     @pytest.mark.testrail_id('543358')
@@ -263,37 +253,27 @@ class NovaIntegrationTests(OpenStackTestCase):
             4. Add the floating ips to the instances
             5. Ping the instances by the floating ips
         """
-        initial_instances = self.nova.servers.list()
         primary_name = "testVM_543356"
-        count = 10
-        image_dict = {im.name: im.id for im in self.nova.images.list()}
-        image_id = image_dict["TestVM"]
-        flavor_dict = {f.name: f.id for f in self.nova.flavors.list()}
-        flavor_id = flavor_dict["m1.micro"]
-        networks = self.neutron.list_networks()["networks"]
-        net_dict = {net["name"]: net["id"] for net in networks}
-        net_internal_id = net_dict["admin_internal_net"]
-
-        self.floating_ips = [self.nova.floating_ips.create()
-                             for _ in xrange(count)]
-        fip_new = [fip_info.ip for fip_info in self.floating_ips]
+        count = settings.NOVA_MASSIVE_SPAWN_COUNT
+        image_id = self.resolver.id('images', "TestVM")
+        flavor_id = self.resolver.id('flavors', "m1.micro")
+        net_internal_id = self.resolver.id('networks', "admin_internal_net")
+
+        fip_new = [fip_info.ip
+                   for fip_info in self.acquire_floating_ips(count)]
         fip_all = [fip_info.ip for fip_info in self.nova.floating_ips.list()]
         for fip in fip_new:
             self.assertIn(fip, fip_all)
 
-        self.nova.servers.create(primary_name, image_id, flavor_id,
-                                 max_count=count,
-                                 security_groups=[self.sec_group.name],
-                                 nics=[{"net-id": net_internal_id}])
-        start_time = time()
-        timeout = 5
-        while len(self.nova.servers.list()) < len(initial_instances) + count \
-                and time() < start_time + timeout * 60:
-            sleep(5)
-
-        instances = [inst for inst in self.nova.servers.list()
-                     if inst not in initial_instances]
-        self.instances = [inst.id for inst in instances]
+        spawner = Spawner(self.os_conn, image_id, flavor_id,
+                          security_groups=[self.sec_group.name],
+                          nics=[{"net-id": net_internal_id}])
+        try:
+            spawner.spawn(count, primary_name)
+        finally:
+            self.instances = spawner.server_ids
+
+        instances = [self.nova.servers.get(x) for x in self.instances]
         for inst_id in self.instances:
             self.assertTrue(common_functions.check_inst_status(self.nova,
                                                                inst_id,
@@ -326,16 +306,11 @@ class NovaIntegrationTests(OpenStackTestCase):
             5. Add the floating ips to the instances
             6. Ping the instances by the floating ips
         """
-        initial_instances = self.nova.servers.list()
-        count = 10
+        count = settings.NOVA_MASSIVE_SPAWN_COUNT
         primary_name = "testVM_543357"
-        image_dict = {im.name: im.id for im in self.nova.images.list()}
-        image_id = image_dict["TestVM"]
-        flavor_dict = {f.name: f.id for f in self.nova.flavors.list()}
-        flavor_id = flavor_dict["m1.tiny"]
-        networks = self.neutron.list_networks()["networks"]
-        net_dict = {net["name"]: net["id"] for net in networks}
-        net_internal_id = net_dict["admin_internal_net"]
+        image_id = self.resolver.id('images', "TestVM")
+        flavor_id = self.resolver.id('flavors', "m1.tiny")
+        net_internal_id = self.resolver.id('networks', "admin_internal_net")
 
         initial_volumes = self.cinder.volumes.list()
         for i in xrange(count):
@@ -343,30 +318,25 @@ class NovaIntegrationTests(OpenStackTestCase):
         self.volumes = [volume for volume in self.cinder.volumes.list()
                         if volume not in initial_volumes]
         msg = "Count of created volumes is incorrect!"
-        self.assertEqual(len(self.volumes), 10, msg)
+        self.assertEqual(len(self.volumes), count, msg)
 
-        self.floating_ips = [self.nova.floating_ips.create()
-                             for _ in xrange(count)]
-        fip_new = [fip_info.ip for fip_info in self.floating_ips]
+        fip_new = [fip_info.ip
+                   for fip_info in self.acquire_floating_ips(count)]
         fip_all = [fip_info.ip for fip_info in self.nova.floating_ips.list()]
         for fip in fip_new:
             self.assertIn(fip, fip_all)
 
-        for volume in self.volumes:
-            bdm = {'vda': volume.id}
-            self.nova.servers.create(primary_name, '', flavor_id,
-                                     security_groups=[self.sec_group.name],
-                                     block_device_mapping=bdm,
-                                     nics=[{"net-id": net_internal_id}])
-        start_time = time()
-        timeout = 5
-        while len(self.nova.servers.list()) < len(initial_instances) + count \
-                and time() < start_time + timeout * 60:
-            sleep(5)
-
-        instances = [inst for inst in self.nova.servers.list()
-                     if inst not in initial_instances]
-        self.instances = [inst.id for inst in instances]
+        spawner = Spawner(self.os_conn, '', flavor_id,
+                          security_groups=[self.sec_group.name],
+                          nics=[{"net-id": net_internal_id}])
+        try:
+            spawner.spawn(count, primary_name, boot_kwargs=[
+                {'block_device_mapping': {'vda': volume.id}}
+                for volume in self.volumes])
+        finally:
+            self.instances = spawner.server_ids
+
+        instances = [self.nova.servers.get(x) for x in self.instances]
         for inst_id in self.instances:
             self.assertTrue(common_functions.check_inst_status(self.nova,
                                                                inst_id,
@@ -397,7 +367,7 @@ class NovaIntegrationTests(OpenStackTestCase):
              4. Ping the instance by the floating ip
              5. Execute live migration
              6. Check current hypervisor and status of instance
-             7. Check that packets loss was minimal
+             7. Check that network downtime was minimal
         """
         networks = self.neutron.list_networks()['networks']
         net = [net['id'] for net in networks if not net['router:external']][0]
@@ -420,32 +390,15 @@ class NovaIntegrationTests(OpenStackTestCase):
         inst.add_floating_ip(floating_ip.ip)
         ping = common_functions.ping_command(floating_ip.ip)
         self.assertTrue(ping, "Instance is not reachable")
-        hypervisors = {h.hypervisor_hostname: h for h
-                       in self.nova.hypervisors.list()}
-        old_hyper = getattr(inst, "OS-EXT-SRV-ATTR:hypervisor_hostname")
-        new_hyper = [h for h in hypervisors.keys() if h != old_hyper][0]
-        ping = subprocess.Popen(["/bin/ping", "-c100", "-i1", floating_ip.ip],
-                                stdout=subprocess.PIPE)
-        self.nova.servers.live_migrate(inst, new_hyper, block_migration=True,
-                                       disk_over_commit=False)
-        inst = self.nova.servers.get(inst.id)
-        timeout = 5
-        end_time = time() + 60 * timeout
-        while getattr(inst, "OS-EXT-SRV-ATTR:hypervisor_hostname") != \
-                new_hyper:
-            if time() > end_time:
-                msg = "Hypervisor is not changed after live migration"
-                raise AssertionError(msg)
-            sleep(1)
-            inst = self.nova.servers.get(inst.id)
-        self.assertEqual(inst.status, 'ACTIVE')
-        ping.wait()
-        output = ping.stdout.read().split('\n')[-3].split()
-        packets = {'transmitted': int(output[0]), 'received': int(output[3])}
-        loss = packets['transmitted'] - packets['received']
-        if loss > 5:
-            msg = "Packets loss exceeds the limit, {} packets were lost"
-            raise AssertionError(msg.format(loss))
+        harness = LiveMigrationHarness(self.os_conn, parallelism=1,
+                                       timeout_seconds=5 * 60)
+        report = harness.migrate([self.nova.servers.get(inst.id)],
+                                 ping_ips={inst.id: floating_ip.ip})
+        self.assertFalse(report.failed, "Live migration failed")
+        downtime = report.records[0].downtime
+        if downtime is None or downtime > 5:
+            msg = "Network downtime exceeds the limit: {} seconds"
+            raise AssertionError(msg.format(downtime))
 
     @pytest.mark.testrail_id('542824')
     def test_live_migration_of_v_ms_with_data_on_root_and_ephemeral_disk(self):
@@ -457,14 +410,14 @@ class NovaIntegrationTests(OpenStackTestCase):
              2. Create a floating ip
              3. Create an instance from an image with 'm1.ephemeral' flavor
              4. Add the floating ip to the instance
-             5. Ssh to instance and create timestamp on root and ephemeral
-                disks
+             5. Ssh to instance and write random data with checksum on
+                root and ephemeral disks
              6. Ping the instance by the floating ip
              7. Execute live migration
              8. Check current hypervisor and status of instance
-             9. Check that packets loss was minimal
-             10. Ssh to instance and check timestamp on root and ephemeral
-                 disks
+             9. Check that network downtime was minimal
+             10. Ssh to instance and check checksum of data on root and
+                 ephemeral disks
         """
         networks = self.neutron.list_networks()['networks']
         net = [net['id'] for net in networks if not net['router:external']][0]
@@ -493,60 +446,22 @@ class NovaIntegrationTests(OpenStackTestCase):
         inst.add_floating_ip(floating_ip.ip)
         ping = common_functions.ping_command(floating_ip.ip, i=10)
         self.assertTrue(ping, "Instance is not reachable")
-        out = []
-        with SSHClient(host=floating_ip.ip, username="cirros", password=None,
-                       private_keys=[private_key]) as vm_r:
-            out.append(vm_r.execute("sudo sh -c 'date > /timestamp.txt'"))
-            out.append(vm_r.execute("sudo sh -c 'date > /mnt/timestamp.txt'"))
-            out.append(vm_r.execute("sudo -i cat /timestamp.txt"))
-            out.append(vm_r.execute("sudo -i cat /mnt/timestamp.txt"))
-
-        for i in out:
-            if i.get('stderr'):
-                raise Exception("ssh commands were executed with errors")
-
-        root_data = out[-2]['stdout'][0]
-        ephem_data = out[-1]['stdout'][0]
-
-        # live migration
-        hypervisors = {h.hypervisor_hostname: h for h in
-                       self.nova.hypervisors.list()}
-        old_hyper = getattr(inst, "OS-EXT-SRV-ATTR:hypervisor_hostname")
-        new_hyper = [h for h in hypervisors.keys() if h != old_hyper][0]
-        ping = subprocess.Popen(["/bin/ping", "-c100", "-i1", floating_ip.ip],
-                                stdout=subprocess.PIPE)
-        self.nova.servers.live_migrate(inst, new_hyper, block_migration=True,
-                                       disk_over_commit=False)
-        inst = self.nova.servers.get(inst.id)
-        timeout = 10
-        end_time = time() + 60 * timeout
-        while getattr(inst, "OS-EXT-SRV-ATTR:hypervisor_hostname") != \
-                new_hyper:
-            if time() > end_time:
-                msg = "Hypervisor is not changed after live migration"
-                raise AssertionError(msg)
-            sleep(1)
-            inst = self.nova.servers.get(inst.id)
-        self.assertEqual(inst.status, 'ACTIVE')
-        ping.wait()
-        output = ping.stdout.read().split('\n')[-3].split()
-        packets = {'transmitted': int(output[0]), 'received': int(output[3])}
-        loss = packets['transmitted'] - packets['received']
-        if loss > 5:
-            msg = "Packets loss exceeds the limit, {} packets were lost"
-            raise AssertionError(msg.format(loss))
-        out = []
-        with SSHClient(host=floating_ip.ip, username="cirros", password=None,
-                       private_keys=[private_key]) as vm_r:
-            out.append(vm_r.execute("sudo -i cat /timestamp.txt"))
-            out.append(vm_r.execute("sudo -i cat /mnt/timestamp.txt"))
-
-        for i in out:
-            if i.get('stderr'):
-                raise Exception("ssh commands were executed with errors")
-
-        r_data = out[0]['stdout'][0]
-        ep_data = out[1]['stdout'][0]
-        self.assertEqual(root_data, r_data, "Data on root disk is changed")
-        self.assertEqual(ephem_data, ep_data, "Data on ephemeral disk is "
-                                              "changed")
+
+        def get_remote(server):
+            return SSHClient(host=floating_ip.ip, username="cirros",
+                             password=None, private_keys=[private_key])
+
+        harness = LiveMigrationHarness(self.os_conn, parallelism=1,
+                                       timeout_seconds=10 * 60)
+        report = harness.migrate([self.nova.servers.get(inst.id)],
+                                 ping_ips={inst.id: floating_ip.ip},
+                                 get_remote=get_remote,
+                                 data_paths=['/data.bin', '/mnt/data.bin'])
+        record = report.records[0]
+        self.assertIsNone(record.error, "Live migration failed")
+        self.assertEqual(record.status, 'ACTIVE')
+        if record.downtime is None or record.downtime > 5:
+            msg = "Network downtime exceeds the limit: {} seconds"
+            raise AssertionError(msg.format(record.downtime))
+        self.assertTrue(record.data_ok,
+                        "Data on root or ephemeral disk is changed")
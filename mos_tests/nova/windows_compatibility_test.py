@@ -19,8 +19,10 @@ import time
 
 import pytest
 
+from mos_tests.environment.provisioning import SSH_PING_RULES
 from mos_tests.functions.base import OpenStackTestCase
 from mos_tests.functions import common as common_functions
+from mos_tests.functions.image_cache import get_or_upload_image
 from mos_tests import settings
 
 logger = logging.getLogger(__name__)
@@ -44,33 +46,12 @@ class WindowCompatibilityIntegrationTests(OpenStackTestCase):
         self.ping_timeout = 3
         self.hypervisor_timeout = 10
 
-        self.amount_of_images_before = len(list(self.glance.images.list()))
-        self.image = None
         self.our_own_flavor_was_created = False
         self.expected_flavor_id = 3
         self.instance = None
-        self.security_group_name = "ms_compatibility"
-        # protect for multiple definition of the same group
-        for sg in self.nova.security_groups.list():
-            if sg.name == self.security_group_name:
-                self.nova.security_groups.delete(sg)
-        # adding required security group
-        self.the_security_group = self.nova.security_groups.create(
-            name=self.security_group_name,
-            description="Windows Compatibility")
-        # Add rules for ICMP, TCP/22
-        self.icmp_rule = self.nova.security_group_rules.create(
-            self.the_security_group.id,
-            ip_protocol="icmp",
-            from_port=-1,
-            to_port=-1,
-            cidr="0.0.0.0/0")
-        self.tcp_rule = self.nova.security_group_rules.create(
-            self.the_security_group.id,
-            ip_protocol="tcp",
-            from_port=22,
-            to_port=22,
-            cidr="0.0.0.0/0")
+        # Group with ICMP and TCP/22 rules is shared between tests
+        self.the_security_group = self.os_conn.get_or_create_sec_group(
+            SSH_PING_RULES, prefix='ms_compatibility')
         # Add both rules to default group
         self.default_security_group_id = 0
         for sg in self.nova.security_groups.list():
@@ -93,27 +74,13 @@ class WindowCompatibilityIntegrationTests(OpenStackTestCase):
         self.floating_ip = self.nova.floating_ips.create(
             self.nova.floating_ip_pools.list()[0].name)
 
-        # creating of the image
-        self.image = self.glance.images.create(
-            name='MyTestSystem',
-            disk_format='qcow2',
-            container_format='bare')
-        with open(self.image_name, 'rb') as win_image_file:
-            self.glance.images.upload(
-                self.image.id,
-                win_image_file)
-        # check that required image in active state
-        is_activated = False
-        while not is_activated:
-            for image_object in self.glance.images.list():
-                if image_object.id == self.image.id:
-                    self.image = image_object
-                    logger.info(
-                        "Image in the {} state".format(self.image.status))
-                    if self.image.status == 'active':
-                        is_activated = True
-                        break
-            time.sleep(1)
+        # creating of the image or reusing of image with the same content;
+        # it's kept after tests, so it's not counted in images amount
+        self.image = get_or_upload_image(self.glance, self.image_name,
+                                         name='MyTestSystem',
+                                         disk_format='qcow2',
+                                         container_format='bare')
+        self.amount_of_images_before = len(list(self.glance.images.list()))
 
         # Default - the first
         network_id = self.nova.networks.list()[0].id
@@ -168,16 +135,10 @@ class WindowCompatibilityIntegrationTests(OpenStackTestCase):
     def tearDown(self):
         if self.instance is not None:
             common_functions.delete_instance(self.nova, self.instance.id)
-        if self.image is not None:
-            common_functions.delete_image(self.glance, self.image.id)
         if self.our_own_flavor_was_created:
             common_functions.delete_flavor(self.nova, self.expected_flavor_id)
         # delete the floating ip
         self.nova.floating_ips.delete(self.floating_ip)
-        # delete the security group
-        self.nova.security_group_rules.delete(self.icmp_rule)
-        self.nova.security_group_rules.delete(self.tcp_rule)
-        self.nova.security_groups.delete(self.the_security_group.id)
         # delete security rules from the 'default' group
         self.nova.security_group_rules.delete(self.icmp_rule_default)
         self.nova.security_group_rules.delete(self.tcp_rule_default)
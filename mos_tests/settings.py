@@ -41,6 +41,23 @@ WIN_SERVER_QCOW2 = 'windows_server_2012_r2_standard_eval_kvm_20140607.qcow2'
 
 CONSOLE_LOG_LEVEL = os.environ.get('LOG_LEVEL', logging.DEBUG)
 
+#######################
+# Nova tests settings #
+#######################
+
+# Count of instances for massive spawn tests
+NOVA_MASSIVE_SPAWN_COUNT = int(os.environ.get('NOVA_MASSIVE_SPAWN_COUNT', 10))
+
+#############################
+# Ceilometer tests settings #
+#############################
+
+# Samples counts, loaded one after another for API benchmark
+CEILOMETER_BENCH_SAMPLES = [int(x) for x in os.environ.get(
+    'CEILOMETER_BENCH_SAMPLES', '1000,10000,100000').split(',')]
+CEILOMETER_BENCH_CONCURRENCY = [int(x) for x in os.environ.get(
+    'CEILOMETER_BENCH_CONCURRENCY', '1,5,10').split(',')]
+
 #########################
 # Glance tests settings #
 #########################
@@ -49,6 +66,12 @@ GLANCE_IMAGE_URL = os.environ.get(
     'GLANCE_IMAGE_URL',
     'http://download.cirros-cloud.net/0.3.4/cirros-0.3.4-x86_64-disk.img')
 
+# Images sizes (in MB) and counts of parallel clients for throughput tests
+GLANCE_BENCH_SIZES = [int(x) for x in os.environ.get(
+    'GLANCE_BENCH_SIZES', '10,100,1024').split(',')]
+GLANCE_BENCH_CONCURRENCY = [int(x) for x in os.environ.get(
+    'GLANCE_BENCH_CONCURRENCY', '1,4').split(',')]
+
 MURANO_PACKAGE_WITH_DEPS_URL = "http://storage.apps.openstack.org/apps/io.murano.apps.docker.DockerApp.zip"  # noqa
 MURANO_PACKAGE_WITH_DEPS_FQN = "io.murano.apps.docker.DockerApp"
 MURANO_PACKAGE_DEPS_NAMES = (
@@ -61,6 +84,16 @@ MURANO_PACKAGE_DEPS_NAMES = (
 MURANO_IMAGE_URL = 'http://storage.apps.openstack.org/images/debian-8-m-agent.qcow2'  # noqa
 MURANO_PACKAGE_URL = 'http://storage.apps.openstack.org/apps/io.murano.apps.apache.ApacheHttpServer.zip'  # noqa
 
+#######################
+# Heat tests settings #
+#######################
+
+# Stacks count, count of parallel API requests and templates for load tests
+HEAT_LOAD_STACKS = int(os.environ.get('HEAT_LOAD_STACKS', 50))
+HEAT_LOAD_CONCURRENCY = int(os.environ.get('HEAT_LOAD_CONCURRENCY', 10))
+HEAT_LOAD_TEMPLATES = os.environ.get(
+    'HEAT_LOAD_TEMPLATES', 'empty_heat_templ.yaml,random_str.yaml').split(',')
+
 ###################
 # Ironic settings #
 ###################